@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+'''
+Runs every engine of filtering with WAD calculation, and of resampling with
+EAF calculation, on the tutorial data and on synthetic data, checks each engine
+against the qSIP2 reference, and writes a tab-separated table of timings,
+speedups, and agreement. The 'feature-seeded' engine times resampling with
+`seeding='feature'`, which calls qSIP2 once per feature; its slowdown relative
+to run-level seeding is also reported on stderr. Exits with a nonzero status
+if any engine disagrees with its reference.
+
+Usage: python benchmarks/bench_engines.py [--features N] [--output FP]
+'''
+
+import biom
+import pandas as pd
+
+import argparse
+import importlib.resources
+import sys
+
+import qiime2
+
+from q2_qsip2._engines import compare_engines
+from q2_qsip2.workflow import create_qsip_data
+
+from synthetic import synthetic_study
+
+
+def tutorial_study():
+    data_dir = importlib.resources.files('q2_qsip2.types.tests') / 'data'
+
+    source_md = qiime2.Metadata(
+        pd.read_csv(data_dir / 'source.tsv', sep='\t', index_col=0)
+    )
+    sample_md = qiime2.Metadata(
+        pd.read_csv(data_dir / 'sample.tsv', sep='\t', index_col=0)
+    )
+    table_df = pd.read_csv(data_dir / 'feature.tsv', sep='\t', index_col=0)
+    table = biom.Table(
+        table_df.values,
+        observation_ids=table_df.index,
+        sample_ids=table_df.columns,
+    )
+
+    return (
+        create_qsip_data(table, sample_md, source_md),
+        ['S149', 'S150', 'S151', 'S152'],
+        ['S178', 'S179', 'S180'],
+    )
+
+
+def synthetic(args):
+    table, sample_md, source_md = synthetic_study(
+        args.sources, args.fractions, args.features
+    )
+    isotopes = source_md.get_column('isotope').to_series()
+
+    return (
+        create_qsip_data(table, sample_md, source_md),
+        list(isotopes.index[isotopes == '12C']),
+        list(isotopes.index[isotopes == '13C']),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--fractions', type=int, default=20)
+    parser.add_argument('--features', type=int, default=2000)
+    parser.add_argument('--resamples', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--output', default='-')
+    args = parser.parse_args()
+
+    results = []
+    for dataset, (qsip_object, unlabeled, labeled) in (
+        ('tutorial', tutorial_study()),
+        ('synthetic', synthetic(args)),
+    ):
+        result = compare_engines(
+            qsip_object, unlabeled, labeled,
+            resamples=args.resamples, repeats=args.repeats,
+        )
+        result.insert(0, 'dataset', dataset)
+        results.append(result)
+
+    results = pd.concat(results, ignore_index=True)
+
+    eaf_seconds = results[
+        results['stage'] == 'resample_and_calculate_EAF'
+    ].pivot(index='dataset', columns='engine', values='seconds')
+    for dataset, seconds in eaf_seconds.iterrows():
+        print(
+            f'{dataset}: feature seeding took '
+            f'{seconds["feature-seeded"] / seconds["qsip2"]:.1f}x as long as '
+            'run seeding',
+            file=sys.stderr,
+        )
+
+    results.to_csv(
+        sys.stdout if args.output == '-' else args.output,
+        sep='\t', index=False, float_format='%.6g',
+    )
+
+    return int(not results['agrees'].all())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
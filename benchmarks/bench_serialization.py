@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+'''
+Compares the write time, read time, and on-disk size of pickled and RDS
+qSIP2 objects across compression methods and levels.
+
+Usage: python benchmarks/bench_serialization.py [--features N] [--sources N]
+'''
+
+import argparse
+from pathlib import Path
+import pickle
+import tempfile
+import time
+
+from q2_qsip2._serialization import _load_rds, _save_rds, zstandard
+from q2_qsip2.workflow import create_qsip_data
+
+from synthetic import synthetic_study
+
+
+CONFIGURATIONS = [
+    ('pickle', None, None),
+    ('rds', 'none', 0),
+    ('rds', 'gzip', 1),
+    ('rds', 'gzip', 6),
+    ('rds', 'xz', 6),
+    ('rds', 'zstd', 3),
+    ('rds', 'zstd', 19),
+]
+
+
+def _time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sources', type=int, default=20)
+    parser.add_argument('--fractions', type=int, default=20)
+    parser.add_argument('--features', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    table, sample_md, source_md = synthetic_study(
+        args.sources, args.fractions, args.features
+    )
+    qsip_object = create_qsip_data(table, sample_md, source_md)
+
+    print(f'{"backend":<8}{"method":<8}{"level":>6}{"write (s)":>12}'
+          f'{"read (s)":>12}{"size (MB)":>12}')
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for backend, compression, level in CONFIGURATIONS:
+            if compression == 'zstd' and zstandard is None:
+                continue
+
+            fp = Path(tempdir) / f'{backend}-{compression}-{level}'
+
+            if backend == 'pickle':
+                def write():
+                    with open(fp, 'wb') as fh:
+                        pickle.dump(qsip_object, fh)
+
+                def read():
+                    with open(fp, 'rb') as fh:
+                        pickle.load(fh)
+            else:
+                def write():
+                    _save_rds(qsip_object, fp, compression, level)
+
+                def read():
+                    _load_rds(fp)
+
+            write_time = _time(write, args.repeats)
+            read_time = _time(read, args.repeats)
+            size = fp.stat().st_size / 1e6
+
+            print(f'{backend:<8}{str(compression or "-"):<8}'
+                  f'{str(level if level is not None else "-"):>6}'
+                  f'{write_time:>12.3f}{read_time:>12.3f}{size:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
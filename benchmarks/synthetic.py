@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+import numpy as np
+import pandas as pd
+
+import qiime2
+
+
+def synthetic_study(
+    n_sources: int = 20,
+    n_fractions: int = 20,
+    n_features: int = 10000,
+    density: float = 0.05,
+    seed: int = 0,
+) -> tuple[biom.Table, qiime2.Metadata, qiime2.Metadata]:
+    '''
+    Generates a qSIP study of the given size: half of the sources are
+    unlabeled (12C) and half labeled (13C), each fractionated into
+    `n_fractions` samples of increasing density, and the feature table has
+    roughly `density` nonzero entries.
+
+    Parameters
+    ----------
+    n_sources : int
+        The number of sources.
+    n_fractions : int
+        The number of fractions (samples) per source.
+    n_features : int
+        The number of features.
+    density : float
+        The expected fraction of nonzero abundances.
+    seed : int
+        The random seed.
+
+    Returns
+    -------
+    tuple[biom.Table, qiime2.Metadata, qiime2.Metadata]
+        The feature table, sample metadata, and source metadata, ready to be
+        passed to `create_qsip_data`.
+    '''
+    rng = np.random.default_rng(seed)
+
+    source_ids = [f'source{i}' for i in range(n_sources)]
+    source_df = pd.DataFrame({
+        'isotope': ['12C' if i % 2 == 0 else '13C' for i in range(n_sources)],
+        'isotopolog': 'glucose',
+    }, index=pd.Index(source_ids, name='id'))
+
+    sample_ids = [
+        f'{source}_f{fraction}'
+        for source in source_ids for fraction in range(n_fractions)
+    ]
+    sample_df = pd.DataFrame({
+        'source_mat_id': np.repeat(source_ids, n_fractions),
+        'gradient_position': np.tile(np.arange(1, n_fractions + 1), n_sources),
+        'gradient_pos_density': (
+            np.tile(np.linspace(1.66, 1.78, n_fractions), n_sources) +
+            rng.normal(0, 0.002, n_sources * n_fractions)
+        ),
+        'gradient_pos_amt': rng.lognormal(10, 1, n_sources * n_fractions),
+    }, index=pd.Index(sample_ids, name='sample-id'))
+
+    nnz = int(n_features * len(sample_ids) * density)
+    rows = rng.integers(0, n_features, nnz)
+    columns = rng.integers(0, len(sample_ids), nnz)
+    counts = rng.poisson(20, nnz) + 1
+    matrix = np.zeros((n_features, len(sample_ids)))
+    np.add.at(matrix, (rows, columns), counts)
+
+    table = biom.Table(
+        matrix,
+        observation_ids=[f'ASV{i}' for i in range(n_features)],
+        sample_ids=sample_ids,
+    )
+
+    return table, qiime2.Metadata(sample_df), qiime2.Metadata(source_df)
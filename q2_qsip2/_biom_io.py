@@ -0,0 +1,133 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+import h5py
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from pathlib import Path
+
+
+# the maximum number of samples whose abundances are read from disk at once
+BIOM_CHUNK_SIZE = 1000
+
+
+def _consecutive_runs(positions: np.ndarray, max_length: int) -> list:
+    '''
+    Splits sorted positions into runs of consecutive positions of at most
+    `max_length` positions each.
+
+    Returns
+    -------
+    list[slice]
+        The slice of `positions` spanned by each run.
+    '''
+    bounds = np.concatenate((
+        [0], np.flatnonzero(np.diff(positions) != 1) + 1, [len(positions)]
+    ))
+
+    return [
+        slice(start, min(start + max_length, run_stop))
+        for run_start, run_stop in zip(bounds[:-1], bounds[1:])
+        for start in range(run_start, run_stop, max_length)
+    ]
+
+
+def _biom_sample_ids(fp: Path) -> pd.Index:
+    '''
+    Reads only the sample ids of a BIOM v2.1 (HDF5) file.
+    '''
+    with h5py.File(fp, 'r') as fh:
+        return pd.Index(fh['sample/ids'].asstr()[:])
+
+
+def _read_biom_samples(
+    fp: Path, sample_ids: list, chunk_size: int = BIOM_CHUNK_SIZE
+) -> biom.Table:
+    '''
+    Reads only the given samples, and only the features observed in them,
+    from a BIOM v2.1 (HDF5) file. Abundances are read sample-wise from the
+    file's compressed sparse column matrix in runs of at most `chunk_size`
+    consecutive samples, so peak memory scales with the selected samples
+    rather than with the whole table.
+
+    Parameters
+    ----------
+    fp : Path
+        The path to the BIOM v2.1 file.
+    sample_ids : list[str]
+        The ids of the samples to read.
+    chunk_size : int
+        The maximum number of samples read from disk at once.
+
+    Returns
+    -------
+    biom.Table
+        The table restricted to `sample_ids`, in that order, and to the
+        features with a nonzero abundance in at least one of them.
+
+    Raises
+    ------
+    ValueError
+        If one or more of `sample_ids` are not in the file.
+    '''
+    sample_ids = pd.Index(sample_ids)
+
+    with h5py.File(fp, 'r') as fh:
+        file_sample_ids = pd.Index(fh['sample/ids'].asstr()[:])
+
+        positions = file_sample_ids.get_indexer(sample_ids)
+        if (positions == -1).any():
+            missing_ids = sample_ids[positions == -1]
+            error_msg = (
+                'The following samples in the sample metadata were not found '
+                f'in the feature table: {", ".join(map(str, missing_ids))}.'
+            )
+            raise ValueError(error_msg)
+
+        # samples are read in file order, and placed in the requested order
+        order = np.argsort(positions)
+        sorted_positions = positions[order]
+
+        indptr = fh['sample/matrix/indptr'][:]
+        data_ds = fh['sample/matrix/data']
+        indices_ds = fh['sample/matrix/indices']
+
+        data, rows, columns = [], [], []
+        for run in _consecutive_runs(sorted_positions, chunk_size):
+            first, last = sorted_positions[run][[0, -1]]
+            start, stop = indptr[first], indptr[last + 1]
+            data.append(data_ds[start:stop])
+            rows.append(indices_ds[start:stop])
+            columns.append(
+                np.repeat(order[run], np.diff(indptr[first:last + 2]))
+            )
+
+        data = np.concatenate(data) if data else np.empty(0)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        columns = (
+            np.concatenate(columns) if columns
+            else np.empty(0, dtype=np.int64)
+        )
+
+        nonzero = data != 0
+        data, rows, columns = data[nonzero], rows[nonzero], columns[nonzero]
+
+        observed, row_codes = np.unique(rows, return_inverse=True)
+        feature_ids = fh['observation/ids'].asstr()[:][observed]
+
+    matrix = sparse.csr_matrix(
+        (data, (row_codes, columns)),
+        shape=(len(feature_ids), len(sample_ids))
+    )
+
+    return biom.Table(
+        matrix, observation_ids=feature_ids, sample_ids=list(sample_ids)
+    )
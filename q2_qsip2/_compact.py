@@ -0,0 +1,347 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from pathlib import Path
+from typing import Optional
+
+from q2_qsip2._tracing import _traced
+
+
+class CompactFeatureTable:
+    '''
+    A feature table stored in long format as integer codes into feature- and
+    sample-id dictionaries, so that ids are stored once rather than on every
+    row. Only nonzero abundances are kept, so absent features take no space,
+    and they are kept as float64, so qSIP2 sees exactly the values of the
+    input table and EAF values do not change. The wide layout expected by
+    qSIP2 is only produced, with `to_wide_dataframe`, when the table is
+    handed to R.
+
+    Parameters
+    ----------
+    feature_ids : array-like of str
+        The feature-id dictionary.
+    sample_ids : array-like of str
+        The sample-id dictionary.
+    feature_codes : array-like of int
+        The position in `feature_ids` of each nonzero entry's feature.
+    sample_codes : array-like of int
+        The position in `sample_ids` of each nonzero entry's sample.
+    abundances : array-like of float
+        The abundance of each nonzero entry.
+    '''
+    ARRAYS = (
+        'feature_ids', 'sample_ids', 'feature_codes', 'sample_codes',
+        'abundances'
+    )
+
+    def __init__(
+        self, feature_ids, sample_ids, feature_codes, sample_codes, abundances
+    ):
+        self.feature_ids = np.asarray(feature_ids, dtype=str)
+        self.sample_ids = np.asarray(sample_ids, dtype=str)
+        self.feature_codes = np.asarray(feature_codes, dtype=np.int32)
+        self.sample_codes = np.asarray(sample_codes, dtype=np.int32)
+        self.abundances = np.asarray(abundances, dtype=np.float64)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.feature_ids), len(self.sample_ids)
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        The number of bytes used by the table's arrays.
+        '''
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    @classmethod
+    def from_sparse(
+        cls, matrix, feature_ids, sample_ids
+    ) -> 'CompactFeatureTable':
+        '''
+        Builds a compact table from a (sparse or dense) feature-by-sample
+        matrix.
+        '''
+        coo = sparse.coo_array(matrix)
+        nonzero = coo.data != 0
+
+        return cls(
+            feature_ids,
+            sample_ids,
+            coo.row[nonzero],
+            coo.col[nonzero],
+            coo.data[nonzero],
+        )
+
+    @classmethod
+    def from_biom(cls, table: biom.Table) -> 'CompactFeatureTable':
+        '''
+        Builds a compact table from a biom table without densifying it.
+        '''
+        return cls.from_sparse(
+            table.matrix_data,
+            table.ids('observation'),
+            table.ids('sample'),
+        )
+
+    @classmethod
+    @_traced('CompactFeatureTable.from_wide_dataframe')
+    def from_wide_dataframe(
+        cls, df: pd.DataFrame, id_column: str = 'feature_id'
+    ) -> 'CompactFeatureTable':
+        '''
+        Builds a compact table from qSIP2's wide layout, with feature ids in
+        `id_column` and one abundance column per sample.
+        '''
+        abundances = df.drop(columns=id_column)
+
+        return cls.from_sparse(
+            abundances.to_numpy(dtype=np.float64),
+            df[id_column].to_numpy(),
+            abundances.columns.to_numpy(),
+        )
+
+    def to_sparse(self) -> sparse.csr_array:
+        '''
+        The feature-by-sample abundance matrix.
+        '''
+        return sparse.csr_array(
+            (self.abundances, (self.feature_codes, self.sample_codes)),
+            shape=self.shape,
+        )
+
+    @_traced('CompactFeatureTable.to_wide_dataframe')
+    def to_wide_dataframe(self, id_column: str = 'feature_id') -> pd.DataFrame:
+        '''
+        Expands the table to qSIP2's wide layout, with feature ids in
+        `id_column` and one abundance column per sample.
+        '''
+        dense = np.zeros(self.shape, dtype=np.float64)
+        dense[self.feature_codes, self.sample_codes] = self.abundances
+
+        df = pd.DataFrame(dense, columns=self.sample_ids)
+        df.insert(0, id_column, self.feature_ids)
+
+        return df
+
+    def save(self, fp: Path) -> None:
+        '''
+        Writes the table's arrays to a compressed numpy archive.
+        '''
+        with open(fp, 'wb') as fh:
+            np.savez_compressed(
+                fh, **{name: getattr(self, name) for name in self.ARRAYS}
+            )
+
+    @classmethod
+    def load(cls, fp: Path) -> 'CompactFeatureTable':
+        '''
+        Reads a table written by `save`.
+        '''
+        with np.load(fp, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in cls.ARRAYS})
+
+
+def _subset_rows(
+    table: pd.DataFrame, upstream: pd.DataFrame
+) -> Optional[np.ndarray]:
+    '''
+    Finds the rows of `upstream` that `table` holds, if `table` holds only
+    rows of `upstream` restricted to some of its columns. Rows are matched
+    by their values, with repeated rows paired up in order.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        The table that may be a subset of `upstream`.
+    upstream : pd.DataFrame
+        The table that `table` may be a subset of.
+
+    Returns
+    -------
+    np.ndarray or None
+        The position in `upstream` of each row of `table`, or None if a
+        column or row of `table` is not found in `upstream`.
+    '''
+    columns = list(table.columns)
+    if not set(columns) <= set(upstream.columns) or len(table) > len(upstream):
+        return None
+
+    def keys(df):
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        occurrences = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+        return pd.MultiIndex.from_arrays([hashes, occurrences])
+
+    rows = keys(upstream[columns]).get_indexer(keys(table))
+    if (rows < 0).any():
+        return None
+
+    return rows
+
+
+class TableSubsets:
+    '''
+    Data frames of a qSIP data object that hold a subset of the rows and
+    columns of another ("upstream") data frame of the object, such as
+    feature data restricted to the features and samples retained by a
+    filter. Rather than the tables themselves, the positions of the
+    upstream rows and the names of the upstream columns they keep are
+    stored, and the tables are rebuilt from their upstream tables on load.
+
+    Parameters
+    ----------
+    paths : list[tuple[str, ...]]
+        The path of each table within the object: a property name, followed
+        by a property or element name for nested tables.
+    upstreams : list[tuple[str, ...]]
+        The path of each table's upstream table.
+    rows : list[array-like of int]
+        The zero-based positions of the upstream rows kept by each table, in
+        the table's row order.
+    columns : list[array-like of str]
+        The upstream columns kept by each table, in the table's column order.
+    '''
+    def __init__(self, paths, upstreams, rows, columns):
+        self.paths = [tuple(path) for path in paths]
+        self.upstreams = [tuple(upstream) for upstream in upstreams]
+        self.rows = [np.asarray(r, dtype=np.int32) for r in rows]
+        self.columns = [np.asarray(c, dtype=str) for c in columns]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def save(self, fp: Path) -> None:
+        '''
+        Writes the subsets to a compressed numpy archive.
+        '''
+        arrays = {
+            'paths': np.asarray(['/'.join(p) for p in self.paths], dtype=str),
+            'upstreams': np.asarray(
+                ['/'.join(p) for p in self.upstreams], dtype=str
+            ),
+        }
+        for index, (rows, columns) in enumerate(zip(self.rows, self.columns)):
+            arrays[f'rows_{index}'] = rows
+            arrays[f'columns_{index}'] = columns
+
+        with open(fp, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+
+    @classmethod
+    def load(cls, fp: Path) -> 'TableSubsets':
+        '''
+        Reads subsets written by `save`.
+        '''
+        with np.load(fp, allow_pickle=False) as arrays:
+            paths = [path.split('/') for path in arrays['paths']]
+            return cls(
+                paths,
+                [upstream.split('/') for upstream in arrays['upstreams']],
+                [arrays[f'rows_{index}'] for index in range(len(paths))],
+                [arrays[f'columns_{index}'] for index in range(len(paths))],
+            )
+
+
+class CompactTables:
+    '''
+    Data frames of a qSIP data object stored column by column, with
+    character and factor columns as integer codes into per-column
+    dictionaries, so that the ids repeated on every row of long-format
+    tables, such as qSIP2's tube relative abundances, are stored once. The
+    tables are rebuilt in R, with the column types and class they had, on
+    load.
+
+    Parameters
+    ----------
+    paths : list[tuple[str, ...]]
+        The path of each table within the object: a property name, followed
+        by an element name for tables held in list properties.
+    names : list[array-like of str]
+        The column names of each table.
+    kinds : list[array-like of str]
+        The kind of each column of each table: 'character', 'factor',
+        'logical', 'integer', or 'double'.
+    values : list[list[np.ndarray]]
+        The values of each column of each table: zero-based codes into the
+        column's dictionary, or -1 for missing values, for character and
+        factor columns, and the values themselves otherwise, with logical
+        values as integers.
+    dictionaries : list[list[np.ndarray]]
+        The dictionary of each column of each table: its distinct values for
+        character columns, its levels for factor columns, and empty
+        otherwise.
+    '''
+    def __init__(self, paths, names, kinds, values, dictionaries):
+        self.paths = [tuple(path) for path in paths]
+        self.names = [np.asarray(n, dtype=str) for n in names]
+        self.kinds = [np.asarray(k, dtype=str) for k in kinds]
+        self.values = [[np.asarray(v) for v in vs] for vs in values]
+        self.dictionaries = [
+            [np.asarray(d, dtype=str) for d in ds] for ds in dictionaries
+        ]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        The number of bytes used by the tables' arrays.
+        '''
+        return sum(
+            array.nbytes
+            for arrays in self.values + self.dictionaries for array in arrays
+        )
+
+    def save(self, fp: Path) -> None:
+        '''
+        Writes the tables to a compressed numpy archive.
+        '''
+        arrays = {
+            'paths': np.asarray(['/'.join(p) for p in self.paths], dtype=str)
+        }
+        for index in range(len(self)):
+            arrays[f'names_{index}'] = self.names[index]
+            arrays[f'kinds_{index}'] = self.kinds[index]
+            for column, (values, dictionary) in enumerate(
+                zip(self.values[index], self.dictionaries[index])
+            ):
+                arrays[f'values_{index}_{column}'] = values
+                arrays[f'dictionary_{index}_{column}'] = dictionary
+
+        with open(fp, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+
+    @classmethod
+    def load(cls, fp: Path) -> 'CompactTables':
+        '''
+        Reads tables written by `save`.
+        '''
+        with np.load(fp, allow_pickle=False) as arrays:
+            paths = [path.split('/') for path in arrays['paths']]
+            names = [arrays[f'names_{i}'] for i in range(len(paths))]
+
+            return cls(
+                paths,
+                names,
+                [arrays[f'kinds_{i}'] for i in range(len(paths))],
+                [
+                    [arrays[f'values_{i}_{j}'] for j in range(len(n))]
+                    for i, n in enumerate(names)
+                ],
+                [
+                    [arrays[f'dictionary_{i}_{j}'] for j in range(len(n))]
+                    for i, n in enumerate(names)
+                ],
+            )
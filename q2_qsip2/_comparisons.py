@@ -0,0 +1,547 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import pandas as pd
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import io
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+import re
+import sys
+import traceback
+from typing import Callable, NamedTuple, Optional
+
+import qiime2
+
+from q2_qsip2._progress import logger
+
+
+# optional manifest columns holding parameters of `subset_and_filter` and of
+# `resample_and_calculate_EAF`, and their types
+FILTER_PARAMETERS = {
+    'min_unlabeled_sources': int,
+    'min_labeled_sources': int,
+    'min_unlabeled_fractions': int,
+    'min_labeled_fractions': int,
+}
+EAF_PARAMETERS = {
+    'resamples': int,
+    'random_seed': int,
+    'deduplicate': bool,
+    'block_size': int,
+    'max_memory': str,
+    'seeding': str,
+}
+
+# the accepted spellings of boolean parameters in the manifest
+BOOLEAN_VALUES = {
+    'true': True, 'yes': True, '1': True,
+    'false': False, 'no': False, '0': False,
+}
+
+SUMMARY_FILENAME = 'comparisons.tsv'
+
+# the error recorded for a comparison whose worker process died
+WORKER_DIED_ERROR = (
+    'The worker process running this comparison terminated abruptly, e.g. '
+    'because it ran out of memory or R crashed.'
+)
+
+# the unfiltered qSIP2 data artifact, loaded once per worker process
+_worker_qsip_data = None
+
+
+class Comparison(NamedTuple):
+    comparison_id: str
+    unlabeled_sources: list[str]
+    labeled_sources: list[str]
+    filter_parameters: dict
+    eaf_parameters: dict
+
+
+class ComparisonResult(NamedTuple):
+    comparison_id: str
+    output_fp: Optional[Path]
+    error: Optional[str]
+
+
+def _split_ids(ids: str) -> list[str]:
+    '''
+    Splits a comma-separated list of source ids, ignoring blank entries.
+    '''
+    if isinstance(ids, float) and ids.is_integer():
+        # a single numeric-looking id in a column QIIME 2 inferred as numeric
+        ids = int(ids)
+
+    return [id_.strip() for id_ in str(ids).split(',') if id_.strip()]
+
+
+def _parse_parameter(
+    value: object, parameter_type: type, name: str = 'parameter'
+) -> object:
+    '''
+    Converts a manifest cell to the type of the parameter `name`. Booleans
+    must be spelled as one of `BOOLEAN_VALUES`, or be the number 0 or 1.
+
+    Raises
+    ------
+    ValueError
+        If `value` can not be converted.
+    '''
+    if parameter_type is bool:
+        token = str(value).strip().lower()
+        if token in BOOLEAN_VALUES:
+            return BOOLEAN_VALUES[token]
+
+        try:
+            number = float(token)
+        except ValueError:
+            number = None
+        if number in (0, 1):
+            return bool(number)
+
+        error_msg = (
+            f'Could not interpret "{value}" as a value of "{name}". Please '
+            'use true or false.'
+        )
+        raise ValueError(error_msg)
+
+    if parameter_type is int:
+        return int(float(value))
+
+    return parameter_type(value)
+
+
+def _read_manifest(fp: Path) -> pd.DataFrame:
+    '''
+    Reads a comparisons manifest, in QIIME 2's metadata file layout, with
+    every cell as a string, so that numeric-looking source ids such as
+    '0149' are kept verbatim. Comment and directive lines (starting with
+    '#') and blank lines are skipped, and the first column is the index.
+    '''
+    with open(fp) as fh:
+        lines = [
+            line for line in fh
+            if line.strip() and not line.lstrip().startswith('#')
+        ]
+
+    manifest_df = pd.read_csv(
+        io.StringIO(''.join(lines)), sep='\t', dtype=str,
+        keep_default_na=False, index_col=0,
+    )
+    manifest_df.index = manifest_df.index.str.strip()
+    manifest_df.columns = manifest_df.columns.str.strip()
+
+    return manifest_df
+
+
+def _parse_comparisons(manifest_df: pd.DataFrame) -> list[Comparison]:
+    '''
+    Parses a comparisons manifest with one row per comparison, indexed by
+    comparison id. The 'unlabeled_sources' and 'labeled_sources' columns hold
+    comma-separated source ids. Any of `FILTER_PARAMETERS` and
+    `EAF_PARAMETERS` may be given as further columns, with blank cells
+    falling back to the action's default. Hyphens in column names are read
+    as underscores.
+
+    Parameters
+    ----------
+    manifest_df : pd.DataFrame
+        The manifest.
+
+    Returns
+    -------
+    list[Comparison]
+        The comparisons, in manifest order.
+
+    Raises
+    ------
+    ValueError
+        If a source column is missing or empty, or if the manifest has
+        unrecognized columns.
+    '''
+    manifest_df = manifest_df.rename(
+        columns=lambda column: column.replace('-', '_')
+    )
+
+    source_columns = ['unlabeled_sources', 'labeled_sources']
+    missing = [
+        column for column in source_columns
+        if column not in manifest_df.columns
+    ]
+    unrecognized = set(manifest_df.columns) - set(source_columns) - set(
+        FILTER_PARAMETERS
+    ) - set(EAF_PARAMETERS)
+    if missing or unrecognized:
+        error_msg = (
+            'The comparisons manifest must have "unlabeled_sources" and '
+            '"labeled_sources" columns, and may only have the following '
+            'optional columns: '
+            f'{", ".join([*FILTER_PARAMETERS, *EAF_PARAMETERS])}.'
+        )
+        if missing:
+            error_msg += f' Missing columns: {", ".join(missing)}.'
+        if unrecognized:
+            error_msg += (
+                f' Unrecognized columns: {", ".join(sorted(unrecognized))}.'
+            )
+        raise ValueError(error_msg)
+
+    comparisons = []
+    for comparison_id, row in manifest_df.iterrows():
+        unlabeled_sources = _split_ids(row['unlabeled_sources'])
+        labeled_sources = _split_ids(row['labeled_sources'])
+        if not unlabeled_sources or not labeled_sources:
+            error_msg = (
+                f'Comparison "{comparison_id}" must list at least one '
+                'unlabeled and one labeled source.'
+            )
+            raise ValueError(error_msg)
+
+        parameters = [
+            {
+                name: _parse_parameter(row[name], parameter_type, name)
+                for name, parameter_type in parameter_types.items()
+                if name in row.index and pd.notna(row[name])
+                and str(row[name]).strip()
+            }
+            for parameter_types in (FILTER_PARAMETERS, EAF_PARAMETERS)
+        ]
+
+        comparisons.append(Comparison(
+            str(comparison_id), unlabeled_sources, labeled_sources,
+            *parameters
+        ))
+
+    return comparisons
+
+
+def _artifact_filename(comparison_id: str) -> str:
+    '''
+    The file name of a comparison's artifact. Characters other than letters,
+    digits, '.', '-', and '_' are replaced by '_', and a leading '.' is
+    escaped, so that metadata ids such as "soil/13C" can not write outside
+    the output directory or create hidden files.
+    '''
+    name = re.sub(r'[^\w.-]', '_', comparison_id, flags=re.ASCII)
+    if name.startswith('.') or not name:
+        name = '_' + name
+
+    return f'{name}.qza'
+
+
+def _check_artifact_filenames(comparisons: list[Comparison]) -> None:
+    '''
+    Raises a ValueError if two comparisons would be saved to the same file.
+    '''
+    comparison_ids = {}
+    for comparison in comparisons:
+        filename = _artifact_filename(comparison.comparison_id)
+        if filename in comparison_ids:
+            error_msg = (
+                f'Comparisons "{comparison_ids[filename]}" and '
+                f'"{comparison.comparison_id}" would both be saved as '
+                f'"{filename}". Please rename one of them.'
+            )
+            raise ValueError(error_msg)
+        comparison_ids[filename] = comparison.comparison_id
+
+
+def _configure_logging() -> None:
+    '''
+    Logs the plugin's progress messages to stderr. Only called by the
+    command line entry point and its worker processes; the library itself
+    leaves logging configuration to the application.
+    '''
+    logging.basicConfig(format='[q2-qsip2] %(message)s')
+    logging.getLogger('q2_qsip2').setLevel(logging.INFO)
+
+
+def _initialize_worker(qsip_data_fp: Path) -> None:
+    '''
+    Loads the plugin, and with it qSIP2 into the worker's embedded R
+    session, and the unfiltered qSIP2 data, once per worker process rather
+    than once per comparison.
+    '''
+    global _worker_qsip_data
+
+    _configure_logging()
+
+    import qiime2.plugins.qsip2.actions  # noqa: F401
+
+    _worker_qsip_data = qiime2.Artifact.load(str(qsip_data_fp))
+
+
+def _run_comparison(
+    comparison: Comparison, output_dir: Path
+) -> ComparisonResult:
+    '''
+    Filters and resamples one comparison and saves the resulting EAF
+    artifact to `output_dir`. The artifact is written under a temporary name
+    and renamed once complete, so the output directory never holds partial
+    artifacts. Errors are returned rather than raised, so that one failing
+    comparison does not stop the others.
+    '''
+    from qiime2.plugins.qsip2.actions import (
+        resample_and_calculate_EAF, subset_and_filter
+    )
+
+    filename = _artifact_filename(comparison.comparison_id)
+    output_fp = Path(output_dir) / filename
+    partial_fp = Path(output_dir) / f'.{filename}.partial'
+
+    try:
+        filtered_qsip_data, = subset_and_filter(
+            _worker_qsip_data,
+            unlabeled_sources=comparison.unlabeled_sources,
+            labeled_sources=comparison.labeled_sources,
+            **comparison.filter_parameters,
+        )
+        eaf_qsip_data, = resample_and_calculate_EAF(
+            filtered_qsip_data, **comparison.eaf_parameters
+        )
+        eaf_qsip_data.save(str(partial_fp))
+        os.replace(partial_fp, output_fp)
+    except Exception:
+        partial_fp.unlink(missing_ok=True)
+        return ComparisonResult(
+            comparison.comparison_id, None, traceback.format_exc()
+        )
+
+    return ComparisonResult(comparison.comparison_id, output_fp, None)
+
+
+def _run_in_pool(
+    comparisons: list[Comparison],
+    output_dir: Path,
+    max_workers: int,
+    record: Callable[[ComparisonResult], None],
+    initializer: Callable = _initialize_worker,
+    initargs: tuple = (),
+    run: Callable[..., ComparisonResult] = _run_comparison,
+) -> list[Comparison]:
+    '''
+    Runs comparisons in one process pool, passing each outcome to `record`
+    as it finishes. If a worker process dies, e.g. killed for running out of
+    memory, the pool can not be used anymore and every comparison that had
+    not finished is returned instead of recorded.
+
+    Returns
+    -------
+    list[Comparison]
+        The comparisons left unfinished by a broken pool, in input order.
+    '''
+    unfinished = set()
+    # workers are spawned rather than forked, as a forked embedded R session
+    # is not safe to use
+    with ProcessPoolExecutor(
+        max_workers=max(min(max_workers, len(comparisons)), 1),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer,
+        initargs=initargs,
+    ) as executor:
+        futures = {
+            executor.submit(run, comparison, output_dir): comparison
+            for comparison in comparisons
+        }
+        for future in as_completed(futures):
+            comparison = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                unfinished.add(comparison.comparison_id)
+                continue
+            except Exception:
+                result = ComparisonResult(
+                    comparison.comparison_id, None, traceback.format_exc()
+                )
+            record(result)
+
+    return [
+        comparison for comparison in comparisons
+        if comparison.comparison_id in unfinished
+    ]
+
+
+def _run_all(
+    comparisons: list[Comparison],
+    output_dir: Path,
+    max_workers: int,
+    record: Callable[[ComparisonResult], None],
+    **pool_kwargs,
+) -> None:
+    '''
+    Runs every comparison, recording each outcome exactly once. If a worker
+    process dies, the comparisons it left unfinished are retried one at a
+    time, each in a fresh single-worker pool, so that only the comparison
+    that kills its worker is recorded as failed.
+    '''
+    unfinished = _run_in_pool(
+        comparisons, output_dir, max_workers, record, **pool_kwargs
+    )
+    if unfinished:
+        logger.warning(
+            'A worker process terminated abruptly. Retrying the '
+            f'{len(unfinished)} unfinished comparisons one at a time.'
+        )
+
+    for comparison in unfinished:
+        if _run_in_pool([comparison], output_dir, 1, record, **pool_kwargs):
+            record(ComparisonResult(
+                comparison.comparison_id, None, WORKER_DIED_ERROR
+            ))
+
+
+def _write_summary(results: list[ComparisonResult], fp: Path) -> None:
+    pd.DataFrame({
+        'comparison_id': [result.comparison_id for result in results],
+        'status': [
+            'failed' if result.error else 'succeeded' for result in results
+        ],
+        'artifact': [result.output_fp or '' for result in results],
+        'error': [
+            result.error.strip().splitlines()[-1] if result.error else ''
+            for result in results
+        ],
+    }).to_csv(fp, sep='\t', index=False)
+
+
+def run_comparisons(
+    qsip_data_fp: Path,
+    manifest_fp: Path,
+    output_dir: Path,
+    max_workers: int = 1,
+) -> list[ComparisonResult]:
+    '''
+    Runs `subset_and_filter` followed by `resample_and_calculate_EAF` for
+    every comparison in a manifest, at most `max_workers` at a time. Each
+    worker process keeps its own R session, with qSIP2 and the input data
+    loaded once, for all the comparisons it runs. Artifacts are saved to
+    `output_dir` as their comparisons finish, and a summary of every
+    finished comparison's outcome is written to `SUMMARY_FILENAME` at the
+    end, even if the run is interrupted.
+
+    A comparison that fails, or whose worker process dies, is recorded as
+    failed without stopping the others (see `_run_all`).
+
+    Parameters
+    ----------
+    qsip_data_fp : Path
+        The path to the unfiltered qSIP2 data artifact.
+    manifest_fp : Path
+        The path to the comparisons manifest, a QIIME 2 metadata file (see
+        `_parse_comparisons`).
+    output_dir : Path
+        The directory to save each comparison's EAF artifact to, named after
+        the comparison id (see `_artifact_filename`).
+    max_workers : int
+        The maximum number of comparisons to run at once.
+
+    Returns
+    -------
+    list[ComparisonResult]
+        The outcome of each comparison, in the order they finished.
+
+    Raises
+    ------
+    ValueError
+        If two comparison ids map to the same artifact file name.
+    '''
+    comparisons = _parse_comparisons(_read_manifest(manifest_fp))
+    _check_artifact_filenames(comparisons)
+
+    # fail early on an unreadable artifact, which would otherwise make every
+    # worker fail to initialize
+    qiime2.Artifact.peek(str(qsip_data_fp))
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+
+    def record(result):
+        results.append(result)
+
+        progress = f'({len(results)}/{len(comparisons)})'
+        if result.error is None:
+            logger.info(
+                f'Comparison "{result.comparison_id}" finished {progress}: '
+                f'{result.output_fp}'
+            )
+        else:
+            logger.error(
+                f'Comparison "{result.comparison_id}" failed {progress}:\n'
+                f'{result.error}'
+            )
+
+    try:
+        _run_all(
+            comparisons,
+            output_dir,
+            max_workers,
+            record,
+            initargs=(qsip_data_fp,),
+        )
+    finally:
+        _write_summary(results, output_dir / SUMMARY_FILENAME)
+
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=(
+            'Run subset-and-filter and resample-and-calculate-EAF for every '
+            'comparison in a manifest, in parallel.'
+        )
+    )
+    parser.add_argument(
+        '--i-qsip-data', required=True, type=Path,
+        help='The unfiltered qSIP2 data artifact.'
+    )
+    parser.add_argument(
+        '--m-comparisons-file', required=True, type=Path,
+        help=(
+            'A metadata file with one row per comparison and '
+            '"unlabeled_sources" and "labeled_sources" columns of '
+            'comma-separated source ids, optionally followed by parameter '
+            'columns such as "resamples" or "min_labeled_sources".'
+        )
+    )
+    parser.add_argument(
+        '--output-dir', required=True, type=Path,
+        help='The directory to save the EAF artifacts to.'
+    )
+    parser.add_argument(
+        '--max-workers', type=int, default=1,
+        help='The maximum number of comparisons to run at once.'
+    )
+    args = parser.parse_args(argv)
+
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1.')
+
+    _configure_logging()
+
+    results = run_comparisons(
+        args.i_qsip_data,
+        args.m_comparisons_file,
+        args.output_dir,
+        args.max_workers,
+    )
+
+    return int(any(result.error for result in results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
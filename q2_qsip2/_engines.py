@@ -0,0 +1,358 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from rpy2.robjects.methods import RS4
+
+import time
+from typing import Callable, NamedTuple
+
+from q2_qsip2._qsip_object import (
+    _get_tube_abundances, _property_to_dataframe
+)
+from q2_qsip2._wads import _feature_wads, _source_indicator
+from q2_qsip2.workflow import resample_and_calculate_EAF, subset_and_filter
+
+
+# the number of standard errors by which the mean bootstrap EAF of a feature
+# may differ between two engines with different random streams
+EAF_MEAN_TOLERANCE = 5.0
+
+
+class Engine(NamedTuple):
+    '''
+    One implementation of a stage. `run` takes the stage's input object and
+    returns a table of its results in a layout shared by every engine of the
+    stage.
+    '''
+    name: str
+    run: Callable[..., pd.DataFrame]
+
+
+class Stage(NamedTuple):
+    '''
+    A pipeline stage and its engines, the first of which is the qSIP2
+    reference. `compare` returns the largest difference of an engine's
+    results from the reference's, and whether it is within tolerance.
+    '''
+    name: str
+    engines: list[Engine]
+    compare: Callable[[pd.DataFrame, pd.DataFrame], tuple[float, bool]]
+
+
+def _compare_wads(
+    reference: pd.DataFrame,
+    candidate: pd.DataFrame,
+    rtol: float = 1e-9,
+) -> tuple[float, bool]:
+    '''
+    Requires the candidate to hold a WAD for exactly the feature-source pairs
+    of the reference, and each of them to agree within a relative tolerance.
+    '''
+    merged = reference.merge(
+        candidate,
+        on=['feature_id', 'source_mat_id'],
+        how='inner',
+        suffixes=('_reference', '_candidate'),
+    )
+    if not len(merged) == len(reference) == len(candidate):
+        return np.inf, False
+
+    differences = (
+        merged['WAD_candidate'] - merged['WAD_reference']
+    ).abs()
+
+    max_difference = float(differences.to_numpy().max(initial=0.0))
+    agrees = bool(
+        (differences <= rtol * merged['WAD_reference'].abs()).all()
+    )
+
+    return max_difference, agrees
+
+
+def _compare_eaf(
+    reference: pd.DataFrame, candidate: pd.DataFrame
+) -> tuple[float, bool]:
+    '''
+    Compares EAF results of engines that draw different bootstrap
+    replicates. Observed EAF values do not depend on resampling and must
+    agree exactly; each feature's mean bootstrap EAF must agree within
+    `EAF_MEAN_TOLERANCE` standard errors of the difference of the means.
+    '''
+    def summarize(df):
+        return df.groupby('feature_id').agg(
+            observed=('observed_EAF', 'first'),
+            mean=('EAF', 'mean'),
+            sd=('EAF', 'std'),
+            n=('EAF', 'count'),
+        )
+
+    merged = summarize(reference).join(
+        summarize(candidate), how='left', rsuffix='_candidate'
+    )
+    if merged['mean_candidate'].isna().any():
+        return np.inf, False
+
+    observed_agree = np.allclose(
+        merged['observed'], merged['observed_candidate'],
+        rtol=0, atol=1e-12, equal_nan=True
+    )
+
+    differences = (merged['mean_candidate'] - merged['mean']).abs()
+    standard_errors = np.sqrt(
+        merged['sd'] ** 2 / merged['n'] +
+        merged['sd_candidate'] ** 2 / merged['n_candidate']
+    )
+    within_tolerance = (
+        (differences <= EAF_MEAN_TOLERANCE * standard_errors) |
+        (differences < 1e-12)
+    )
+
+    return (
+        float(differences.to_numpy().max(initial=0.0)),
+        bool(observed_agree and within_tolerance.all()),
+    )
+
+
+def _filtered_wads(filtered_qsip_object: RS4) -> pd.DataFrame:
+    wad_df = _property_to_dataframe(filtered_qsip_object, 'filtered_wad_data')
+
+    return (
+        wad_df.melt(
+            id_vars='feature_id', var_name='source_mat_id', value_name='WAD'
+        )
+        .dropna()
+        .sort_values(['feature_id', 'source_mat_id'])
+        .reset_index(drop=True)
+    )
+
+
+def _python_filtered_wads(
+    qsip_object: RS4,
+    unlabeled_sources: list[str],
+    labeled_sources: list[str],
+    min_unlabeled_sources: int = 1,
+    min_labeled_sources: int = 1,
+    min_unlabeled_fractions: int = 1,
+    min_labeled_fractions: int = 1,
+) -> pd.DataFrame:
+    '''
+    Filters features and calculates their WADs the way qSIP2's feature filter
+    does, from the same unfiltered object and with the same defaults as
+    `subset_and_filter`: a feature is present in a source if it is found in
+    at least the minimum number of the source's fractions, and is retained
+    if it is present in at least the minimum numbers of unlabeled and of
+    labeled sources. The WADs of retained features in the sources they are
+    present in are returned in the layout of `_filtered_wads`.
+    '''
+    tube_abundances, feature_ids, sample_ids = _get_tube_abundances(
+        qsip_object
+    )
+    sample_df = _property_to_dataframe(qsip_object, 'sample_data', 'data')
+    sample_df = sample_df.set_index('sample_id').loc[sample_ids]
+
+    in_comparison = sample_df['source_mat_id'].isin(
+        list(unlabeled_sources) + list(labeled_sources)
+    ).to_numpy()
+    tube_abundances = tube_abundances[:, in_comparison]
+    sample_df = sample_df[in_comparison]
+
+    indicator, source_ids = _source_indicator(sample_df['source_mat_id'])
+    presence = tube_abundances.copy()
+    presence.data[:] = 1.0
+    fraction_counts = (presence @ indicator).toarray()
+
+    unlabeled = source_ids.isin(unlabeled_sources)
+    min_fractions = np.where(
+        unlabeled, min_unlabeled_fractions, min_labeled_fractions
+    )
+    present = (fraction_counts > 0) & (fraction_counts >= min_fractions)
+    retained = (
+        (present[:, unlabeled].sum(axis=1) >= min_unlabeled_sources) &
+        (present[:, ~unlabeled].sum(axis=1) >= min_labeled_sources)
+    )
+
+    wads = _feature_wads(
+        tube_abundances[retained],
+        np.asarray(feature_ids)[retained],
+        sample_df['source_mat_id'],
+        sample_df['gradient_pos_density'],
+        None,
+    )
+    feature_idx, source_idx = np.nonzero(present[retained])
+    present_cells = pd.DataFrame({
+        'feature_id': np.asarray(feature_ids)[retained][feature_idx],
+        'source_mat_id': source_ids[source_idx],
+    })
+
+    return (
+        wads.merge(present_cells, on=['feature_id', 'source_mat_id'])
+        .sort_values(['feature_id', 'source_mat_id'])
+        .reset_index(drop=True)
+    )
+
+
+def _eaf_table(eaf_qsip_object: RS4) -> pd.DataFrame:
+    return _property_to_dataframe(eaf_qsip_object, 'EAF')[
+        ['feature_id', 'resample', 'EAF', 'observed_EAF']
+    ]
+
+
+def _stages(
+    unlabeled_sources: list[str],
+    labeled_sources: list[str],
+    resamples: int,
+    random_seed: int,
+) -> list[Stage]:
+    '''
+    The stages compared by `compare_engines`, and their engines.
+    '''
+    def filter_qsip2(qsip_object):
+        return subset_and_filter(
+            qsip_object,
+            unlabeled_sources=unlabeled_sources,
+            labeled_sources=labeled_sources,
+        )
+
+    def eaf_engine(**kwargs):
+        def run(filtered_qsip_object):
+            return _eaf_table(resample_and_calculate_EAF(
+                filtered_qsip_object,
+                resamples=resamples,
+                random_seed=random_seed,
+                **kwargs,
+            ))
+
+        return run
+
+    def block_size(filtered_qsip_object):
+        n_features = len(
+            _property_to_dataframe(filtered_qsip_object, 'filtered_wad_data')
+        )
+        return max(n_features // 4, 1)
+
+    def filter_python(qsip_object):
+        return _python_filtered_wads(
+            qsip_object, unlabeled_sources, labeled_sources
+        )
+
+    return [
+        Stage(
+            'filter',
+            [
+                Engine(
+                    'qsip2',
+                    lambda qsip_object: _filtered_wads(
+                        filter_qsip2(qsip_object)
+                    ),
+                ),
+                Engine('python', filter_python),
+            ],
+            _compare_wads,
+        ),
+        Stage(
+            'resample_and_calculate_EAF',
+            [
+                Engine('qsip2', eaf_engine()),
+                Engine(
+                    'blocked',
+                    lambda filtered_qsip_object: eaf_engine(
+                        block_size=block_size(filtered_qsip_object)
+                    )(filtered_qsip_object),
+                ),
+                Engine('feature-seeded', eaf_engine(seeding='feature')),
+            ],
+            _compare_eaf,
+        ),
+    ]
+
+
+def _time_engine(engine: Engine, qsip_object: RS4, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = engine.run(qsip_object)
+        timings.append(time.perf_counter() - start)
+
+    return result, min(timings)
+
+
+def compare_engines(
+    qsip_object: RS4,
+    unlabeled_sources: list[str],
+    labeled_sources: list[str],
+    resamples: int = 100,
+    random_seed: int = 1,
+    repeats: int = 1,
+) -> pd.DataFrame:
+    '''
+    Runs every engine of every stage (filtering with WAD calculation, and
+    resampling with EAF calculation) on the same data, checks each engine's
+    results against the qSIP2 reference engine of its stage, and times them.
+    Every engine of a stage starts from the same input and produces the same
+    table, so their timings cover equivalent work.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The unfiltered "qsip_data" object.
+    unlabeled_sources : list[str]
+        The unlabeled sources of the comparison.
+    labeled_sources : list[str]
+        The labeled sources of the comparison.
+    resamples : int
+        The number of bootstrap resamplings.
+    random_seed : int
+        The random seed.
+    repeats : int
+        The number of times each engine is run; the fastest run is reported.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per stage and engine, with 'stage', 'engine', 'seconds',
+        'speedup' (relative to the reference), 'max_difference', and
+        'agrees' columns.
+    '''
+    filtered_qsip_object = subset_and_filter(
+        qsip_object,
+        unlabeled_sources=unlabeled_sources,
+        labeled_sources=labeled_sources,
+    )
+    stage_inputs = {
+        'filter': qsip_object,
+        'resample_and_calculate_EAF': filtered_qsip_object,
+    }
+
+    rows = []
+    for stage in _stages(
+        unlabeled_sources, labeled_sources, resamples, random_seed
+    ):
+        reference_engine, *engines = stage.engines
+        reference, reference_seconds = _time_engine(
+            reference_engine, stage_inputs[stage.name], repeats
+        )
+        rows.append((
+            stage.name, reference_engine.name, reference_seconds, 1.0, 0.0,
+            True
+        ))
+
+        for engine in engines:
+            result, seconds = _time_engine(
+                engine, stage_inputs[stage.name], repeats
+            )
+            max_difference, agrees = stage.compare(reference, result)
+            rows.append((
+                stage.name, engine.name, seconds, reference_seconds / seconds,
+                max_difference, agrees
+            ))
+
+    return pd.DataFrame(rows, columns=[
+        'stage', 'engine', 'seconds', 'speedup', 'max_difference', 'agrees'
+    ])
@@ -0,0 +1,322 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from pathlib import Path
+from typing import Optional
+
+from q2_qsip2._wads import _source_relative_abundances
+
+
+GROWTH_MODELS = ('exponential', 'linear')
+
+# isotopes whose sources are considered labeled, unless the labeled sources
+# are given explicitly
+LABELED_ISOTOPES = ('13C', '15N', '18O')
+
+# the replicate number of the rows calculated from the observed EAF values
+OBSERVED_REPLICATE = 0
+
+# the per-row columns of a growth table, besides its feature ids
+GROWTH_COLUMNS = (
+    'resample', 'EAF', 'N_total_i0', 'N_total_it', 'N_light_it',
+    'birth_rate', 'death_rate', 'net_growth_rate',
+)
+
+
+def _eaf_matrix(eaf_df: pd.DataFrame) -> tuple[pd.Index, np.ndarray]:
+    '''
+    Pivots qSIP2's long-format EAF table into a feature-by-replicate matrix.
+
+    Parameters
+    ----------
+    eaf_df : pd.DataFrame
+        The EAF table, with 'feature_id', 'resample', 'EAF', and
+        'observed_EAF' columns and one row per feature and resample.
+
+    Returns
+    -------
+    tuple[pd.Index, np.ndarray]
+        The feature id of each row, and the matrix of EAF values. Its first
+        column (`OBSERVED_REPLICATE`) holds the observed EAF values and the
+        rest hold the bootstrap replicates in numeric order. Missing
+        replicates are NaN.
+    '''
+    feature_codes, feature_ids = pd.factorize(eaf_df['feature_id'])
+    # resample ids may be stored as strings, which must not sort as '10' <
+    # '2'
+    resample_codes, _ = pd.factorize(
+        pd.to_numeric(eaf_df['resample']), sort=True
+    )
+
+    matrix = np.full(
+        (len(feature_ids), resample_codes.max(initial=-1) + 2), np.nan
+    )
+    matrix[feature_codes, resample_codes + 1] = eaf_df['EAF'].to_numpy(float)
+    matrix[feature_codes, OBSERVED_REPLICATE] = (
+        eaf_df['observed_EAF'].to_numpy(float)
+    )
+
+    return pd.Index(feature_ids), matrix
+
+
+def _labeled_sources(
+    source_df: pd.DataFrame,
+    retained_sources: pd.Index,
+    labeled_sources: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    '''
+    Selects the source-level data of the labeled sources retained in a
+    comparison.
+
+    Parameters
+    ----------
+    source_df : pd.DataFrame
+        The source-level data, with 'source_mat_id' and 'isotope' columns.
+    retained_sources : pd.Index
+        The ids of the sources retained by filtering.
+    labeled_sources : list[str] or None
+        The ids of the labeled sources. If None, the retained sources whose
+        isotope is one of `LABELED_ISOTOPES` are used.
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows of `source_df` of the labeled sources.
+
+    Raises
+    ------
+    ValueError
+        If any of `labeled_sources` was not retained, or if no labeled
+        source was retained.
+    '''
+    if labeled_sources is not None:
+        missing_sources = pd.Index(labeled_sources).difference(
+            retained_sources
+        )
+        if len(missing_sources):
+            error_msg = (
+                'The following labeled sources are not retained in the qSIP2 '
+                f'data: {", ".join(map(str, missing_sources))}.'
+            )
+            raise ValueError(error_msg)
+
+        labeled = source_df['source_mat_id'].isin(labeled_sources)
+    else:
+        labeled = (
+            source_df['source_mat_id'].isin(retained_sources) &
+            source_df['isotope'].isin(LABELED_ISOTOPES)
+        )
+
+    if not labeled.any():
+        error_msg = (
+            'None of the sources retained in the qSIP2 data are labeled, so '
+            'growth rates can not be calculated.'
+        )
+        raise ValueError(error_msg)
+
+    return source_df[labeled]
+
+
+def _labeled_abundances(
+    tube_abundances: sparse.csc_array,
+    feature_ids: pd.Index,
+    sample_ids: pd.Index,
+    sample_df: pd.DataFrame,
+    source_df: pd.DataFrame,
+    total_abundance_column: str,
+) -> pd.Series:
+    '''
+    Calculates the total abundance of each feature at the end of the
+    incubation, averaged across labeled sources. A feature's abundance in a
+    source is its relative abundance in the source, summed across fractions,
+    times the source's total abundance.
+
+    Parameters
+    ----------
+    tube_abundances : sparse.csc_array
+        The feature-by-sample matrix of relative abundances scaled by DNA
+        amount, as returned by `_get_tube_abundances`.
+    feature_ids : pd.Index
+        The feature id of each row of `tube_abundances`.
+    sample_ids : pd.Index
+        The sample id of each column of `tube_abundances`.
+    sample_df : pd.DataFrame
+        The sample-level data, with 'sample_id' and 'source_mat_id' columns.
+    source_df : pd.DataFrame
+        The labeled sources' data, with 'source_mat_id' and
+        `total_abundance_column` columns.
+    total_abundance_column : str
+        The column of `source_df` holding each source's total abundance.
+
+    Returns
+    -------
+    pd.Series
+        The mean labeled abundance of each feature, indexed by feature id.
+    '''
+    sources = sample_df.set_index('sample_id').loc[
+        sample_ids, 'source_mat_id'
+    ]
+    labeled = sources.isin(source_df['source_mat_id']).to_numpy()
+
+    relative_abundances, source_ids = _source_relative_abundances(
+        tube_abundances[:, np.flatnonzero(labeled)],
+        sources[labeled],
+        None,
+    )
+    total_abundances = (
+        source_df.set_index('source_mat_id')[total_abundance_column]
+        .loc[source_ids]
+        .to_numpy(float)
+    )
+
+    abundances = relative_abundances @ total_abundances
+
+    return pd.Series(
+        abundances / len(source_ids), index=pd.Index(feature_ids)
+    )
+
+
+def _growth_rates(
+    eaf: np.ndarray,
+    n_total_i0: np.ndarray,
+    n_total_it: np.ndarray,
+    timepoint: float,
+    growth_model: str = 'exponential',
+    label_proportion: float = 1.0,
+) -> dict[str, np.ndarray]:
+    '''
+    Calculates per-capita (exponential) or absolute (linear) birth, death,
+    and net growth rates following Koch et al. (2018). The share of a
+    feature's copies that remained unlabeled at time t, and so existed at
+    time zero, is `1 - EAF / label_proportion`.
+
+    All arrays are broadcast against each other, so every feature and every
+    bootstrap replicate is calculated at once. Rates that are undefined,
+    e.g. for features absent at time zero, are NaN.
+
+    Parameters
+    ----------
+    eaf : np.ndarray
+        The feature-by-replicate matrix of EAF values.
+    n_total_i0 : np.ndarray
+        The total abundance of each feature at time zero.
+    n_total_it : np.ndarray
+        The total abundance of each feature at time t.
+    timepoint : float
+        The length of the incubation, t.
+    growth_model : str
+        One of `GROWTH_MODELS`.
+    label_proportion : float
+        The EAF of a copy built entirely from the labeled substrate.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The 'N_light_it', 'birth_rate', 'death_rate', and 'net_growth_rate'
+        matrices, each shaped like `eaf`.
+    '''
+    n_total_i0 = np.asarray(n_total_i0, dtype=float)[:, np.newaxis]
+    n_total_it = np.asarray(n_total_it, dtype=float)[:, np.newaxis]
+
+    n_light_it = n_total_it * (1 - eaf / label_proportion)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if growth_model == 'exponential':
+            birth_rate = np.log(n_total_it / n_light_it) / timepoint
+            death_rate = np.log(n_light_it / n_total_i0) / timepoint
+        else:
+            birth_rate = (n_total_it - n_light_it) / timepoint
+            death_rate = (n_light_it - n_total_i0) / timepoint
+
+        net_growth_rate = birth_rate + death_rate
+
+    rates = {
+        'N_light_it': n_light_it,
+        'birth_rate': birth_rate,
+        'death_rate': death_rate,
+        'net_growth_rate': net_growth_rate,
+    }
+
+    return {
+        name: np.where(np.isfinite(values), values, np.nan)
+        for name, values in rates.items()
+    }
+
+
+def _growth_table(
+    feature_ids: pd.Index,
+    eaf: np.ndarray,
+    n_total_i0: np.ndarray,
+    n_total_it: np.ndarray,
+    rates: dict[str, np.ndarray],
+) -> pd.DataFrame:
+    '''
+    Flattens feature-by-replicate matrices into a long, columnar growth
+    table with one row per feature and replicate.
+    '''
+    n_features, n_replicates = eaf.shape
+
+    columns = {
+        'feature_id': np.repeat(np.asarray(feature_ids), n_replicates),
+        'resample': np.tile(np.arange(n_replicates), n_features),
+        'EAF': eaf.ravel(),
+        'N_total_i0': np.repeat(n_total_i0, n_replicates),
+        'N_total_it': np.repeat(n_total_it, n_replicates),
+    }
+    columns.update({name: values.ravel() for name, values in rates.items()})
+
+    return pd.DataFrame(columns)
+
+
+def _save_growth_table(df: pd.DataFrame, fp: Path) -> None:
+    '''
+    Writes a growth table column by column to a compressed numpy archive.
+    Feature ids are stored once, as a dictionary, with an integer code per
+    row.
+    '''
+    feature_codes, feature_ids = pd.factorize(df['feature_id'])
+
+    with open(fp, 'wb') as fh:
+        np.savez_compressed(
+            fh,
+            feature_ids=np.asarray(feature_ids, dtype=str),
+            feature_codes=feature_codes.astype(np.int32),
+            **{name: df[name].to_numpy() for name in GROWTH_COLUMNS},
+        )
+
+
+def _load_growth_table(fp: Path) -> pd.DataFrame:
+    '''
+    Reads a growth table written by `_save_growth_table`.
+    '''
+    with np.load(fp, allow_pickle=False) as arrays:
+        columns = {
+            'feature_id': arrays['feature_ids'][arrays['feature_codes']],
+        }
+        columns.update({name: arrays[name] for name in GROWTH_COLUMNS})
+
+    return pd.DataFrame(columns)
+
+
+def _growth_metadata(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Indexes a growth table by a unique id per row, '<feature id>-<resample>',
+    for viewing as QIIME 2 metadata. Resamples are integers, so the id is
+    split unambiguously at its last hyphen.
+    '''
+    df = df.copy()
+    df.index = pd.Index(
+        df['feature_id'].astype(str) + '-' + df['resample'].astype(str),
+        name='id',
+    )
+
+    return df
@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+
+def _density_outliers(
+    sample_df: pd.DataFrame, sensitivity: float = 4
+) -> pd.DataFrame:
+    '''
+    Fits a linear model of density on gradient position for every source and
+    calculates the Cook's distance of each sample (fraction). All sources are
+    fit at once with the closed-form least squares solution, using per-source
+    sums instead of one model per source.
+
+    A sample is flagged as an outlier if its Cook's distance exceeds
+    `sensitivity` divided by the number of samples in its source, matching
+    the criterion used by qSIP2's `plot_density_outliers`.
+
+    Parameters
+    ----------
+    sample_df : pd.DataFrame
+        The sample-level data, with 'sample_id', 'source_mat_id',
+        'gradient_position', and 'gradient_pos_density' columns.
+    sensitivity : float
+        Scales the Cook's distance threshold above which a sample is
+        considered an outlier.
+
+    Returns
+    -------
+    pd.DataFrame
+        A per-sample table, indexed by sample id, with the fitted densities,
+        residuals, leverages, Cook's distances, and outlier calls. Sources
+        with fewer than three samples have undefined Cook's distances and are
+        never flagged.
+    '''
+    codes, _ = pd.factorize(sample_df['source_mat_id'])
+    x = sample_df['gradient_position'].to_numpy(dtype=float)
+    y = sample_df['gradient_pos_density'].to_numpy(dtype=float)
+
+    n = np.bincount(codes)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_centered = x - (np.bincount(codes, x) / n)[codes]
+        y_centered = y - (np.bincount(codes, y) / n)[codes]
+
+        sxx = np.bincount(codes, x_centered * x_centered)
+        sxy = np.bincount(codes, x_centered * y_centered)
+        slopes = sxy / sxx
+
+        residuals = y_centered - slopes[codes] * x_centered
+        mse = np.bincount(codes, residuals * residuals) / (n - 2)
+        leverages = 1 / n[codes] + x_centered ** 2 / sxx[codes]
+
+        cooks_distances = (
+            residuals ** 2 / (2 * mse[codes]) *
+            leverages / (1 - leverages) ** 2
+        )
+        cooks_distances[n[codes] < 3] = np.nan
+
+    outliers = cooks_distances > sensitivity / n[codes]
+
+    outlier_df = pd.DataFrame({
+        'id': sample_df['sample_id'].to_numpy(),
+        'source_mat_id': sample_df['source_mat_id'].to_numpy(),
+        'gradient_position': x,
+        'gradient_pos_density': y,
+        'fitted_density': y - residuals,
+        'residual': residuals,
+        'leverage': leverages,
+        'cooks_distance': cooks_distances,
+        'outlier': np.where(outliers, 'True', 'False'),
+    })
+    outlier_df.set_index('id', inplace=True)
+
+    return outlier_df
@@ -0,0 +1,197 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import rpy2.robjects as ro
+
+from collections import Counter
+from contextlib import contextmanager
+import datetime
+import functools
+import os
+from pathlib import Path
+import shlex
+import shutil
+import tempfile
+import threading
+from typing import Callable, Optional
+
+from q2_qsip2._progress import _inform, logger
+
+
+# if set, R is profiled while actions run and the profiles are written to
+# this directory
+RPROF_ENV = 'Q2_QSIP2_RPROF_DIR'
+
+# the R sampling interval, in seconds
+RPROF_INTERVAL_ENV = 'Q2_QSIP2_RPROF_INTERVAL'
+DEFAULT_RPROF_INTERVAL = 0.01
+
+# R allows only one profiler at a time, so actions called while another is
+# being profiled, from the same thread or another one, are profiled as part
+# of it
+_profiling_lock = threading.Lock()
+
+
+def _parse_rprof(lines: list[str]) -> tuple[Counter, Counter]:
+    '''
+    Collapses the samples of an `Rprof` output file written with memory
+    profiling into call stacks.
+
+    Each sample line starts with four colon-delimited memory counters (small
+    and large vector heap in bytes, cons cells, duplications) followed by
+    the quoted call stack, innermost call first.
+
+    Parameters
+    ----------
+    lines : list[str]
+        The lines of the `Rprof` output.
+
+    Returns
+    -------
+    tuple[Counter, Counter]
+        For each call stack, outermost call first and joined by ';', the
+        number of samples in which it was running, and the number of bytes
+        of vector heap growth observed while it was running.
+    '''
+    samples = Counter()
+    memory = Counter()
+    previous_heap = None
+
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.startswith(':'):
+            # the header, e.g. "memory profiling: sample.interval=10000"
+            continue
+
+        _, small_heap, large_heap, _, _, calls = line.split(':', 5)
+        heap = int(small_heap) + int(large_heap)
+
+        frames = shlex.split(calls)
+        if not frames:
+            previous_heap = heap
+            continue
+
+        stack = ';'.join(reversed(frames))
+        samples[stack] += 1
+        if previous_heap is not None and heap > previous_heap:
+            memory[stack] += heap - previous_heap
+        previous_heap = heap
+
+    return samples, memory
+
+
+def _write_collapsed(stacks: Counter, fp: Path) -> None:
+    '''
+    Writes call stacks in the collapsed format read by flamegraph.pl,
+    speedscope, and similar tools: one "stack count" line per stack.
+    '''
+    with open(fp, 'w') as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f'{stack} {count}\n')
+
+
+@contextmanager
+def _rprof(name: str, output_dir: Optional[str] = None):
+    '''
+    Profiles R, including its memory use, for the duration of the block.
+    Nothing is profiled unless `output_dir` or the `RPROF_ENV` environment
+    variable is set. Three files are then written to that directory, named
+    after `name` and the start time: the raw `Rprof` output ('.Rprof'),
+    time-weighted collapsed stacks ('.collapsed'), and collapsed stacks
+    weighted by vector heap growth in bytes ('.memory.collapsed'). A failure
+    to write them is logged rather than raised.
+
+    Only the calling process is profiled: worker processes it spawns, e.g.
+    those of `qc_report` with `n_jobs` greater than one, are not.
+
+    Parameters
+    ----------
+    name : str
+        The name of the profiled step, used in the file names.
+    output_dir : str or None
+        The directory to write the profiles to. Defaults to the value of
+        `RPROF_ENV`.
+    '''
+    output_dir = output_dir or os.environ.get(RPROF_ENV)
+    if not output_dir or not _profiling_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        prefix = output_dir / f'{name}-{timestamp}-{os.getpid()}'
+        interval = float(
+            os.environ.get(RPROF_INTERVAL_ENV, DEFAULT_RPROF_INTERVAL)
+        )
+
+        with tempfile.NamedTemporaryFile(
+            suffix='.Rprof', delete=False
+        ) as fh:
+            rprof_fp = Path(fh.name)
+
+        ro.r['Rprof'](
+            str(rprof_fp), interval=interval, append=False,
+            **{'memory.profiling': True}
+        )
+    except BaseException:
+        _profiling_lock.release()
+        raise
+
+    try:
+        yield
+    finally:
+        try:
+            ro.r['Rprof'](ro.NULL)
+        finally:
+            _profiling_lock.release()
+
+        # a failure to write the profile must neither fail the action nor
+        # mask its own error
+        try:
+            _write_profiles(rprof_fp, prefix, name)
+        except Exception as error:
+            logger.warning(
+                f'Could not write the R profile of {name} to {prefix}.*: '
+                f'{error}'
+            )
+            rprof_fp.unlink(missing_ok=True)
+
+
+def _write_profiles(rprof_fp: Path, prefix: Path, name: str) -> None:
+    '''
+    Moves the raw `Rprof` output of `_rprof` to `prefix` and writes its
+    collapsed stacks next to it.
+    '''
+    raw_fp = Path(f'{prefix}.Rprof')
+    shutil.move(rprof_fp, raw_fp)
+    with open(raw_fp) as fh:
+        samples, memory = _parse_rprof(fh.readlines())
+
+    _write_collapsed(samples, Path(f'{prefix}.collapsed'))
+    _write_collapsed(memory, Path(f'{prefix}.memory.collapsed'))
+
+    _inform(
+        f'Wrote an R profile of {name} ({sum(samples.values())} '
+        f'samples) to {prefix}.*'
+    )
+
+
+def _r_profiled(function: Callable) -> Callable:
+    '''
+    Runs an action under `_rprof`, named after the action, when R profiling
+    is enabled through `RPROF_ENV`.
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _rprof(function.__name__):
+            return function(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,269 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+import datetime
+import logging
+import signal
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from q2_qsip2._tracing import _trace
+
+
+logger = logging.getLogger(__name__)
+
+# the minimum number of seconds between two logged progress reports
+PROGRESS_LOG_INTERVAL = 30.0
+
+
+@dataclass(frozen=True)
+class ProgressReport:
+    '''
+    A snapshot of the progress of a chunked computation over features.
+    '''
+    stage: str
+    features_done: int
+    total_features: int
+    replicates_done: int
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        '''
+        The number of features completed per second.
+        '''
+        return self.features_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        '''
+        The estimated number of seconds remaining, if it can be estimated.
+        '''
+        if self.features_done == 0:
+            return None
+
+        remaining = self.total_features - self.features_done
+        return remaining / self.throughput if self.throughput > 0 else 0.0
+
+    def __str__(self) -> str:
+        def _format_seconds(seconds):
+            return str(datetime.timedelta(seconds=round(seconds)))
+
+        eta = 'unknown' if self.eta is None else _format_seconds(self.eta)
+
+        return (
+            f'{self.stage}: {self.features_done}/{self.total_features} '
+            f'features ({self.replicates_done} replicates) | '
+            f'{self.throughput:.1f} features/s | '
+            f'elapsed {_format_seconds(self.elapsed)} | ETA {eta}'
+        )
+
+
+def _inform(message: str) -> None:
+    '''
+    Reports an informational message, such as progress. Applications that
+    configure logging, like the q2-qsip2 entry point, receive it from
+    `logger`. Without any configured handler (as under the QIIME 2 command
+    line interface, which shows stderr with --verbose) the message is
+    written to stderr instead of being dropped by logging's default
+    WARNING level.
+    '''
+    if logger.hasHandlers():
+        logger.info(message)
+    else:
+        print(f'[q2-qsip2] {message}', file=sys.stderr, flush=True)
+
+
+def _log_progress(report: ProgressReport) -> None:
+    _inform(str(report))
+
+
+class _Progress:
+    '''
+    Tracks the progress of a computation performed in chunks of features and
+    passes a `ProgressReport` to `callback` after the first chunk, after the
+    last chunk, and otherwise at most once every `interval` seconds.
+
+    Parameters
+    ----------
+    stage : str
+        A short description of the computation, used in reports.
+    total_features : int
+        The number of features to be processed.
+    replicates_per_feature : int
+        The number of replicates (e.g. resamples) computed per feature.
+    callback : Callable[[ProgressReport], None]
+        Receives each report. By default reports are logged.
+    interval : float
+        The minimum number of seconds between two reports.
+    '''
+    def __init__(
+        self,
+        stage: str,
+        total_features: int,
+        replicates_per_feature: int = 1,
+        callback: Callable[[ProgressReport], None] = _log_progress,
+        interval: float = PROGRESS_LOG_INTERVAL,
+    ):
+        self.stage = stage
+        self.total_features = total_features
+        self.replicates_per_feature = replicates_per_feature
+        self.callback = callback
+        self.interval = interval
+
+        self.features_done = 0
+        self._start = time.monotonic()
+        self._last_report = None
+
+    def update(self, features: int) -> ProgressReport:
+        '''
+        Records that another chunk of `features` features has completed.
+
+        Parameters
+        ----------
+        features : int
+            The number of features in the completed chunk.
+
+        Returns
+        -------
+        ProgressReport
+            The progress so far.
+        '''
+        self.features_done += features
+        now = time.monotonic()
+
+        report = ProgressReport(
+            stage=self.stage,
+            features_done=self.features_done,
+            total_features=self.total_features,
+            replicates_done=self.features_done * self.replicates_per_feature,
+            elapsed=now - self._start,
+        )
+
+        finished = self.features_done >= self.total_features
+        if (
+            self._last_report is None or finished or
+            now - self._last_report >= self.interval
+        ):
+            self._last_report = now
+            self.callback(report)
+
+        return report
+
+
+class _CancellationToken:
+    '''
+    Records whether cancellation was requested. Long computations check it
+    between chunks with `raise_if_cancelled`.
+    '''
+    def __init__(self):
+        self.cancelled = False
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise KeyboardInterrupt(
+                'The computation was cancelled between chunks.'
+            )
+
+
+@contextmanager
+def _cooperative_cancellation():
+    '''
+    Defers SIGINT (Ctrl-C) while embedded R code is running. Instead of
+    interrupting R mid-call, which can leave the embedded R session in a bad
+    state, an interrupt marks the yielded `_CancellationToken` as cancelled
+    so that the computation can stop cleanly at the next chunk boundary.
+
+    Python signal handlers only run once control returns from R, so neither
+    interrupt takes effect during an R call. A second interrupt raises
+    KeyboardInterrupt as soon as the running R call returns, without waiting
+    for the chunk to be saved or reported. Signal handling is only changed on
+    the main thread.
+
+    Yields
+    ------
+    _CancellationToken
+        The token to check between chunks.
+    '''
+    token = _CancellationToken()
+
+    if threading.current_thread() is not threading.main_thread():
+        yield token
+        return
+
+    def _handler(signum, frame):
+        if token.cancelled:
+            raise KeyboardInterrupt
+
+        token.cancelled = True
+        _inform(
+            'Cancellation requested; stopping after the current chunk. '
+            'Press Ctrl-C again to stop as soon as the running R call '
+            'returns, discarding its results.'
+        )
+
+    previous_handler = signal.signal(signal.SIGINT, _handler)
+    try:
+        yield token
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+
+def _run_as_single_chunk(
+    stage: str,
+    total_features: int,
+    replicates_per_feature: int,
+    func: Callable[..., Any],
+    *args,
+    progress_callback: Callable[[ProgressReport], None] = _log_progress,
+    **kwargs,
+) -> Any:
+    '''
+    Runs a blocking R call as a single chunk: Ctrl-C is deferred until the
+    call returns, and progress is reported once it completes. Only used for
+    calls that can not be split into chunks of features, such as qSIP2's
+    feature filter.
+
+    Parameters
+    ----------
+    stage : str
+        A short description of the computation, used in reports.
+    total_features : int
+        The number of features processed by the call.
+    replicates_per_feature : int
+        The number of replicates computed per feature.
+    func : Callable
+        The function to call with `args` and `kwargs`.
+    progress_callback : Callable[[ProgressReport], None]
+        Receives the progress report. By default it is logged.
+
+    Returns
+    -------
+    Any
+        The return value of `func`.
+
+    Raises
+    ------
+    KeyboardInterrupt
+        If cancellation was requested while `func` was running.
+    '''
+    progress = _Progress(
+        stage, total_features, replicates_per_feature, progress_callback
+    )
+
+    with _cooperative_cancellation() as token:
+        with _trace(f'R: {stage}'):
+            result = func(*args, **kwargs)
+        progress.update(total_features)
+        token.raise_if_cancelled()
+
+    return result
@@ -0,0 +1,793 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import rpy2.robjects as ro
+from rpy2.robjects.packages import importr
+from rpy2.robjects.methods import RS4
+from rpy2.robjects import numpy2ri, pandas2ri
+from scipy import sparse
+
+from typing import Optional
+
+from q2_qsip2._compact import CompactTables, TableSubsets, _subset_rows
+from q2_qsip2._tracing import _nbytes, _traced
+from q2_qsip2._wads import _tube_abundances
+
+qsip2 = importr('qSIP2')
+S7 = importr('S7')
+
+PLACEHOLDER_FEATURE_ID = 'q2-qsip2-placeholder'
+
+# the R attribute holding the tube abundance matrix precomputed by
+# `create_qsip_data`. Attributes are not S7 properties, so qSIP2 ignores them,
+# but they are kept by qSIP2's functions, and the feature and sample data the
+# matrix is derived from never change once the object is created
+TUBE_ABUNDANCES_ATTRIBUTE = 'q2_qsip2_tube_abundances'
+
+_set_attribute_R = ro.r('''
+    function(object, name, value) {
+        attr(object, name) <- value
+        object
+    }
+''')
+
+_tube_abundances_R = ro.r('''
+    function(data, indices, indptr, shape, feature_ids, sample_ids) {
+        list(
+            data = data, indices = indices, indptr = indptr, shape = shape,
+            feature_ids = feature_ids, sample_ids = sample_ids
+        )
+    }
+''')
+
+# the tables of a "qsip_data" object that its other tables may hold subsets
+# of: the input feature data, stored compactly by the directory formats, and
+# the tube relative abundances that qSIP2 calculates from it
+UPSTREAM_TABLES = (('feature_data', 'data'), ('tube_rel_abundance',))
+
+_table_paths_R = ro.r('''
+    function(qsip_data_object) {
+        paths <- list()
+        for (name in S7::prop_names(qsip_data_object)) {
+            value <- S7::prop(qsip_data_object, name)
+            if (is.data.frame(value)) {
+                paths[[length(paths) + 1]] <- name
+            } else if (is.list(value)) {
+                for (element in names(value)) {
+                    if (nzchar(element) && is.data.frame(value[[element]])) {
+                        paths[[length(paths) + 1]] <- c(name, element)
+                    }
+                }
+            }
+        }
+        paths
+    }
+''')
+
+_get_table_R = ro.r('''
+    function(qsip_data_object, path) {
+        value <- qsip_data_object
+        for (name in path) {
+            if (S7::S7_inherits(value)) {
+                if (!(name %in% S7::prop_names(value))) return(NULL)
+                value <- S7::prop(value, name)
+            } else {
+                value <- value[[name]]
+            }
+        }
+        value
+    }
+''')
+
+_set_table_R = ro.r('''
+    function(qsip_data_object, path, table) {
+        if (length(path) == 1) {
+            S7::prop(qsip_data_object, path, check = FALSE) <- table
+        } else {
+            value <- S7::prop(qsip_data_object, path[1])
+            value[[path[2]]] <- table
+            S7::prop(qsip_data_object, path[1], check = FALSE) <- value
+        }
+        qsip_data_object
+    }
+''')
+
+_subset_table_R = ro.r('''
+    function(upstream, rows, columns, template) {
+        table <- upstream[rows, columns, drop = FALSE]
+        rownames(table) <- NULL
+        class(table) <- class(template)
+        table
+    }
+''')
+
+_identical_tables_R = ro.r('''
+    function(table, other) identical(as.list(table), as.list(other))
+''')
+
+_encode_table_R = ro.r('''
+    function(table) {
+        compact_class <- list("data.frame", c("tbl_df", "tbl", "data.frame"))
+        if (!any(vapply(compact_class, identical, NA, class(table)))) {
+            return(NULL)
+        }
+        kinds <- character(0)
+        values <- list()
+        dictionaries <- list()
+        for (name in names(table)) {
+            column <- table[[name]]
+            dictionary <- character(0)
+            if (identical(class(column), "factor")) {
+                kind <- "factor"
+                dictionary <- levels(column)
+                value <- as.integer(column) - 1L
+            } else if (!is.null(attributes(column))) {
+                return(NULL)
+            } else if (is.character(column)) {
+                kind <- "character"
+                dictionary <- unique(column[!is.na(column)])
+                value <- match(column, dictionary) - 1L
+            } else if (is.logical(column)) {
+                kind <- "logical"
+                value <- as.integer(column)
+            } else if (is.integer(column) || is.double(column)) {
+                kind <- typeof(column)
+                value <- column
+            } else {
+                return(NULL)
+            }
+            if (kind %in% c("factor", "character")) {
+                value[is.na(value)] <- -1L
+            }
+            kinds <- c(kinds, kind)
+            values[[length(values) + 1]] <- value
+            dictionaries[[length(dictionaries) + 1]] <- dictionary
+        }
+        list(kinds = kinds, values = values, dictionaries = dictionaries)
+    }
+''')
+
+_decode_table_R = ro.r('''
+    function(template, names, kinds, values, dictionaries) {
+        table <- lapply(seq_along(kinds), function(index) {
+            value <- values[[index]]
+            dictionary <- dictionaries[[index]]
+            switch(kinds[index],
+                factor = factor(
+                    dictionary[replace(value, value < 0L, NA) + 1L],
+                    levels = dictionary
+                ),
+                character = dictionary[replace(value, value < 0L, NA) + 1L],
+                logical = as.logical(value),
+                integer = as.integer(value),
+                double = as.double(value)
+            )
+        })
+        names(table) <- names
+        attr(table, "row.names") <- .set_row_names(length(table[[1]]))
+        class(table) <- class(template)
+        table
+    }
+''')
+
+_replace_feature_data_R = ro.r('''
+    function(qsip_data_object, feature_df) {
+        feature_data <- S7::prop(qsip_data_object, "feature_data")
+        S7::prop(feature_data, "data") <- feature_df
+        S7::prop(qsip_data_object, "feature_data") <- feature_data
+        qsip_data_object
+    }
+''')
+
+
+def _get_property(qsip_object: RS4, *path: str) -> object:
+    '''
+    Retrieves a (possibly nested) S7 property from a qSIP2 object.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        A qSIP2 S7 object, e.g. "qsip_data" or "qsip_sample_data".
+    *path : str
+        The property names to follow, outermost first. For example
+        `('sample_data', 'data')` retrieves the sample-level data frame of a
+        "qsip_data" object.
+
+    Returns
+    -------
+    object
+        The unconverted R value of the property.
+    '''
+    value = qsip_object
+    for name in path:
+        value = S7.prop(value, name)
+
+    return value
+
+
+def _property_nrow(qsip_object: RS4, *path: str) -> int:
+    '''
+    Counts the rows of a (possibly nested) data frame property of a qSIP2
+    object without converting it.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        A qSIP2 S7 object.
+    *path : str
+        The property names to follow, outermost first.
+
+    Returns
+    -------
+    int
+        The number of rows.
+    '''
+    return int(ro.r['nrow'](_get_property(qsip_object, *path))[0])
+
+
+@_traced()
+def _property_to_dataframe(qsip_object: RS4, *path: str) -> pd.DataFrame:
+    '''
+    Retrieves a (possibly nested) data frame property from a qSIP2 object and
+    converts it to a pandas dataframe.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        A qSIP2 S7 object.
+    *path : str
+        The property names to follow, outermost first.
+
+    Returns
+    -------
+    pd.DataFrame
+        The converted data frame.
+    '''
+    return _r_to_dataframe(_get_property(qsip_object, *path))
+
+
+def _r_to_dataframe(r_df: object) -> pd.DataFrame:
+    '''
+    Converts an R data frame to a pandas dataframe with a default index.
+    '''
+    with (ro.default_converter + pandas2ri.converter).context():
+        df = ro.conversion.get_conversion().rpy2py(r_df)
+
+    return df.reset_index(drop=True)
+
+
+@_traced(
+    measure=lambda result, *dfs: sum(_nbytes(df) for df in dfs)
+)
+def _build_qsip_object(
+    source_df: pd.DataFrame, sample_df: pd.DataFrame, feature_df: object
+) -> RS4:
+    '''
+    Builds a "qsip_data" object from source, sample, and feature data that
+    already use qSIP2's standard column names, such as those extracted from
+    an existing object.
+
+    Parameters
+    ----------
+    source_df : pd.DataFrame
+        The source-level data, with a 'source_mat_id' column.
+    sample_df : pd.DataFrame
+        The sample-level data, with a 'sample_id' column.
+    feature_df : pd.DataFrame or R data frame
+        The wide feature data, with a 'feature_id' column and one column per
+        sample.
+
+    Returns
+    -------
+    RS4
+        The "qsip_data" object.
+    '''
+    # relative amounts are per source, so they are always recalculated by
+    # qSIP2 rather than carried over
+    sample_df = sample_df.drop(columns='gradient_pos_rel_amt', errors='ignore')
+
+    with (ro.default_converter + pandas2ri.converter).context():
+        R_source_obj = qsip2.qsip_source_data(
+            source_df, source_mat_id='source_mat_id'
+        )
+        R_sample_obj = qsip2.qsip_sample_data(
+            sample_df, sample_id='sample_id'
+        )
+        R_feature_obj = qsip2.qsip_feature_data(
+            feature_df, feature_id='feature_id'
+        )
+        R_qsip_obj = qsip2.qsip_data(
+            source_data=R_source_obj,
+            sample_data=R_sample_obj,
+            feature_data=R_feature_obj
+        )
+
+    return R_qsip_obj
+
+
+def _placeholder_feature_data(sample_ids: pd.Series) -> pd.DataFrame:
+    '''
+    Builds wide feature data holding a single placeholder feature with an
+    abundance of one in every sample.
+    '''
+    sample_ids = list(sample_ids)
+
+    return pd.DataFrame(
+        [[PLACEHOLDER_FEATURE_ID] + [1] * len(sample_ids)],
+        columns=['feature_id'] + sample_ids,
+    )
+
+
+def _metadata_only_qsip_object(
+    source_df: pd.DataFrame, sample_df: pd.DataFrame
+) -> RS4:
+    '''
+    Builds a "qsip_data" object from source- and sample-level data alone, for
+    use with qSIP2 functions that never look at feature data. A single
+    placeholder feature present in every sample stands in for the feature
+    table, so the cost of building the object does not depend on the number
+    of features in the original data.
+
+    The object is rebuilt, and so validated again by qSIP2, every time this
+    is called. When the data comes from the metadata tables of an artifact
+    (see `QSIP2DataMetadataView`) the column types are re-inferred from the
+    TSV files rather than carried over from the original object: ids are
+    always read as strings and numeric columns as numbers, but e.g. a
+    numeric-looking text column of the user's becomes numeric.
+
+    Parameters
+    ----------
+    source_df : pd.DataFrame
+        The source-level data, with a 'source_mat_id' column.
+    sample_df : pd.DataFrame
+        The sample-level data, with a 'sample_id' column.
+
+    Returns
+    -------
+    RS4
+        The metadata-only "qsip_data" object.
+    '''
+    feature_df = _placeholder_feature_data(sample_df['sample_id'])
+
+    return _build_qsip_object(source_df, sample_df, feature_df)
+
+
+def _replace_feature_data(
+    qsip_object: RS4, feature_df: pd.DataFrame
+) -> RS4:
+    '''
+    Replaces the feature data of a "qsip_data" object, keeping everything
+    else about the object, including its R attributes.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+    feature_df : pd.DataFrame
+        The wide feature data, with a 'feature_id' column and one column per
+        sample of `qsip_object`.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` with the new feature data.
+    '''
+    with (ro.default_converter + pandas2ri.converter).context():
+        return _replace_feature_data_R(qsip_object, feature_df)
+
+
+def _without_feature_data(qsip_object: RS4) -> RS4:
+    '''
+    Replaces the feature data of a "qsip_data" object with a single
+    placeholder feature present in every sample, so that the object can be
+    stored without its feature table.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` holding only the placeholder feature.
+    '''
+    sample_df = _property_to_dataframe(qsip_object, 'sample_data', 'data')
+    feature_df = _placeholder_feature_data(sample_df['sample_id'])
+
+    return _replace_feature_data(qsip_object, feature_df)
+
+
+def _attach_tube_abundances(
+    qsip_object: RS4,
+    tube_abundances: sparse.csc_array,
+    feature_ids: pd.Index,
+    sample_ids: pd.Index,
+) -> RS4:
+    '''
+    Stores a tube abundance matrix with a "qsip_data" object, as the arrays
+    of its compressed sparse column (CSC) representation and its row and
+    column ids, so that `_get_tube_abundances` reads it instead of scaling
+    the feature data again.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+    tube_abundances : sparse.csc_array
+        The feature-by-sample tube abundance matrix (see `_tube_abundances`).
+    feature_ids : pd.Index
+        The feature id of each row of `tube_abundances`.
+    sample_ids : pd.Index
+        The sample id of each column of `tube_abundances`.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` holding the matrix.
+    '''
+    matrix = sparse.csc_array(tube_abundances, dtype=float)
+
+    with (ro.default_converter + numpy2ri.converter).context():
+        r_matrix = _tube_abundances_R(
+            matrix.data,
+            matrix.indices.astype(np.int32),
+            matrix.indptr.astype(np.int32),
+            np.asarray(matrix.shape, dtype=np.int32),
+            ro.StrVector(list(map(str, feature_ids))),
+            ro.StrVector(list(map(str, sample_ids))),
+        )
+
+    return _set_attribute_R(qsip_object, TUBE_ABUNDANCES_ATTRIBUTE, r_matrix)
+
+
+def _without_tube_abundances(qsip_object: RS4) -> RS4:
+    '''
+    Removes the tube abundance matrix stored with `_attach_tube_abundances`,
+    if any.
+    '''
+    return _set_attribute_R(qsip_object, TUBE_ABUNDANCES_ATTRIBUTE, ro.NULL)
+
+
+def _attached_tube_abundances(
+    qsip_object: RS4
+) -> Optional[tuple[sparse.csc_array, pd.Index, pd.Index]]:
+    '''
+    Reads the tube abundance matrix stored with `_attach_tube_abundances`.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+
+    Returns
+    -------
+    tuple[sparse.csc_array, pd.Index, pd.Index] or None
+        The tube abundance matrix and the ids of its rows and columns, or
+        None if no matrix is stored with `qsip_object`.
+    '''
+    r_matrix = ro.r['attr'](
+        qsip_object, TUBE_ABUNDANCES_ATTRIBUTE, exact=True
+    )
+    if ro.r['is.null'](r_matrix)[0]:
+        return None
+
+    def _array(name):
+        return np.asarray(r_matrix.rx2(name))
+
+    tube_abundances = sparse.csc_array(
+        (_array('data'), _array('indices'), _array('indptr')),
+        shape=tuple(int(n) for n in _array('shape')),
+    )
+
+    return (
+        tube_abundances,
+        pd.Index(list(r_matrix.rx2('feature_ids'))),
+        pd.Index(list(r_matrix.rx2('sample_ids'))),
+    )
+
+
+def _get_tube_abundances(
+    qsip_object: RS4
+) -> tuple[sparse.csc_array, pd.Index, pd.Index]:
+    '''
+    Retrieves the feature-by-sample matrix of relative abundances scaled by
+    each sample's DNA amount (see `_tube_abundances`). The matrix stored by
+    `create_qsip_data` with `precompute_tube_abundances` is reused if
+    present, otherwise it is calculated from the object's sample and feature
+    data.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        A "qsip_data" object.
+
+    Returns
+    -------
+    tuple[sparse.csc_array, pd.Index, pd.Index]
+        The tube abundance matrix, and the feature id of each of its rows and
+        the sample id of each of its columns.
+    '''
+    attached = _attached_tube_abundances(qsip_object)
+    if attached is not None:
+        return attached
+
+    sample_df = _property_to_dataframe(qsip_object, 'sample_data', 'data')
+    sample_df.set_index('sample_id', inplace=True)
+    feature_df = _property_to_dataframe(qsip_object, 'feature_data', 'data')
+    feature_df.set_index('feature_id', inplace=True)
+
+    tube_abundances = _tube_abundances(
+        feature_df.to_numpy(),
+        sample_df.loc[feature_df.columns, 'gradient_pos_amt'],
+    )
+
+    return tube_abundances, feature_df.index, feature_df.columns
+
+
+def _table_paths(qsip_object: RS4) -> list[tuple[str, ...]]:
+    '''
+    Lists the data frames of a "qsip_data" object: its data frame properties
+    and the named data frames held in its list properties, such as the
+    tables of its filter results.
+    '''
+    return [tuple(path) for path in _table_paths_R(qsip_object)]
+
+
+@_traced()
+def _find_table_subsets(qsip_object: RS4) -> TableSubsets:
+    '''
+    Finds the data frames of a "qsip_data" object that hold only rows and
+    columns of one of its `UPSTREAM_TABLES`, such as feature data filtered
+    to the retained features and the samples of a comparison. A table is
+    only reported if rebuilding it from its upstream table reproduces it
+    exactly.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+
+    Returns
+    -------
+    TableSubsets
+        The tables found and the upstream rows and columns they keep.
+    '''
+    upstreams = []
+    for upstream_path in UPSTREAM_TABLES:
+        r_upstream = _get_table_R(qsip_object, ro.StrVector(upstream_path))
+        if ro.r['is.data.frame'](r_upstream)[0]:
+            upstreams.append(
+                (upstream_path, r_upstream, _r_to_dataframe(r_upstream))
+            )
+
+    paths, upstream_paths, rows, columns = [], [], [], []
+    for path in _table_paths(qsip_object):
+        if path in UPSTREAM_TABLES:
+            continue
+
+        r_table = _get_table_R(qsip_object, ro.StrVector(path))
+        table_columns = set(ro.r['names'](r_table))
+        candidates = [
+            upstream for upstream in upstreams
+            if table_columns <= set(upstream[2].columns)
+        ]
+        # only tables that may be subsets are converted, as some of the
+        # others, such as the resampled WADs, are large
+        if not candidates or ro.r['nrow'](r_table)[0] == 0:
+            continue
+        table = _r_to_dataframe(r_table)
+
+        for upstream_path, r_upstream, upstream in candidates:
+            table_rows = _subset_rows(table, upstream)
+            if table_rows is None:
+                continue
+
+            r_subset = _subset_table_R(
+                r_upstream,
+                ro.IntVector((table_rows + 1).tolist()),
+                ro.StrVector(list(table.columns)),
+                r_table,
+            )
+            if _identical_tables_R(r_subset, r_table)[0]:
+                paths.append(path)
+                upstream_paths.append(upstream_path)
+                rows.append(table_rows)
+                columns.append(list(table.columns))
+                break
+
+    return TableSubsets(paths, upstream_paths, rows, columns)
+
+
+def _without_tables(
+    qsip_object: RS4, paths: list[tuple[str, ...]]
+) -> RS4:
+    '''
+    Empties tables of a "qsip_data" object, keeping their columns and
+    class, so that the object can be stored without them.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+    paths : list[tuple[str, ...]]
+        The paths of the tables to empty (see `_table_paths`).
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` with the tables emptied.
+    '''
+    for path in paths:
+        r_path = ro.StrVector(path)
+        r_table = _get_table_R(qsip_object, r_path)
+        qsip_object = _set_table_R(
+            qsip_object, r_path, _subset_table_R(
+                r_table, ro.IntVector([]), ro.r['names'](r_table), r_table
+            )
+        )
+
+    return qsip_object
+
+
+def _with_table_subsets(qsip_object: RS4, subsets: TableSubsets) -> RS4:
+    '''
+    Rebuilds the tables of `subsets`, emptied by `_without_tables`, from
+    their upstream tables, which must already be restored.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object with the tables emptied.
+    subsets : TableSubsets
+        The tables to rebuild.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` with the tables rebuilt.
+    '''
+    for path, upstream_path, rows, columns in zip(
+        subsets.paths, subsets.upstreams, subsets.rows, subsets.columns
+    ):
+        r_path = ro.StrVector(path)
+        r_table = _subset_table_R(
+            _get_table_R(qsip_object, ro.StrVector(upstream_path)),
+            ro.IntVector((rows + 1).tolist()),
+            ro.StrVector(list(columns)),
+            _get_table_R(qsip_object, r_path),
+        )
+        qsip_object = _set_table_R(qsip_object, r_path, r_table)
+
+    return qsip_object
+
+
+def _decode_compact_table(
+    template: object,
+    names: np.ndarray,
+    kinds: np.ndarray,
+    values: list[np.ndarray],
+    dictionaries: list[np.ndarray],
+) -> object:
+    '''
+    Rebuilds an R data frame stored column by column (see `CompactTables`),
+    with the class of `template`.
+    '''
+    with (ro.default_converter + numpy2ri.converter).context():
+        py2rpy = ro.conversion.get_conversion().py2rpy
+        r_values = [py2rpy(value) for value in values]
+        r_dictionaries = [
+            py2rpy(np.asarray(dictionary, dtype=str))
+            for dictionary in dictionaries
+        ]
+
+    return _decode_table_R(
+        template,
+        ro.StrVector(list(names)),
+        ro.StrVector(list(kinds)),
+        ro.r['list'](*r_values),
+        ro.r['list'](*r_dictionaries),
+    )
+
+
+@_traced()
+def _find_compact_tables(
+    qsip_object: RS4, exclude: list[tuple[str, ...]] = ()
+) -> CompactTables:
+    '''
+    Stores the data frames of a "qsip_data" object column by column, with
+    character and factor columns as integer codes (see `CompactTables`).
+    Tables with columns of other types, tables of other classes than plain
+    data frames and tibbles, and tables that would not be rebuilt exactly
+    are left out.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object.
+    exclude : list[tuple[str, ...]]
+        The paths of tables to leave out, e.g. those stored as subsets of
+        other tables.
+
+    Returns
+    -------
+    CompactTables
+        The compacted tables.
+    '''
+    paths, names, kinds, values, dictionaries = [], [], [], [], []
+    for path in _table_paths(qsip_object):
+        if path in exclude:
+            continue
+
+        r_table = _get_table_R(qsip_object, ro.StrVector(path))
+        if ro.r['nrow'](r_table)[0] == 0:
+            continue
+
+        encoded = _encode_table_R(r_table)
+        if ro.r['is.null'](encoded)[0]:
+            continue
+
+        table_names = np.asarray(list(ro.r['names'](r_table)), dtype=str)
+        table_kinds = np.asarray(list(encoded.rx2('kinds')), dtype=str)
+        with (ro.default_converter + numpy2ri.converter).context():
+            rpy2py = ro.conversion.get_conversion().rpy2py
+            table_values = [
+                np.asarray(rpy2py(value)) for value in encoded.rx2('values')
+            ]
+        table_dictionaries = [
+            np.asarray(list(dictionary), dtype=str)
+            for dictionary in encoded.rx2('dictionaries')
+        ]
+
+        decoded = _decode_compact_table(
+            r_table, table_names, table_kinds, table_values,
+            table_dictionaries
+        )
+        if not _identical_tables_R(decoded, r_table)[0]:
+            continue
+
+        paths.append(path)
+        names.append(table_names)
+        kinds.append(table_kinds)
+        values.append(table_values)
+        dictionaries.append(table_dictionaries)
+
+    return CompactTables(paths, names, kinds, values, dictionaries)
+
+
+def _with_compact_tables(qsip_object: RS4, tables: CompactTables) -> RS4:
+    '''
+    Rebuilds the tables of `tables`, emptied by `_without_tables`, keeping
+    the class of each emptied table.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The "qsip_data" object with the tables emptied.
+    tables : CompactTables
+        The tables to rebuild.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` with the tables rebuilt.
+    '''
+    for path, names, kinds, values, dictionaries in zip(
+        tables.paths, tables.names, tables.kinds, tables.values,
+        tables.dictionaries
+    ):
+        r_path = ro.StrVector(path)
+        r_table = _decode_compact_table(
+            _get_table_R(qsip_object, r_path), names, kinds, values,
+            dictionaries
+        )
+        qsip_object = _set_table_R(qsip_object, r_path, r_table)
+
+    return qsip_object
@@ -0,0 +1,1038 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import rpy2.robjects as ro
+from rpy2.robjects.packages import importr
+from rpy2.robjects.methods import RS4
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+from q2_qsip2._progress import (
+    ProgressReport, _Progress, _cooperative_cancellation, _inform,
+    _log_progress, logger
+)
+from q2_qsip2._qsip_object import _property_to_dataframe
+from q2_qsip2._tracing import _traced
+
+qsip2 = importr('qSIP2')
+
+CHECKPOINT_MANIFEST = 'manifest.json'
+
+SEEDING_MODES = ('run', 'feature')
+
+# the block size of runs given neither a block size nor a memory budget, so
+# that progress is reported, interrupts take effect, and checkpoints are
+# written at least every this many features
+DEFAULT_BLOCK_SIZE = 500
+
+# the first element of R's `.Random.seed` for the Mersenne-Twister generator
+# with inversion and rejection sampling (R's defaults), and the size of the
+# generator's state
+MT_RNG_KIND = 10403
+MT_STATE_SIZE = 624
+
+# the generator of per-feature streams, part of the checkpoint fingerprint of
+# runs with 'feature' seeding
+FEATURE_GENERATOR = 'philox'
+
+# the size of each resampled WAD value, and the number of copies of the
+# resampled values that qSIP2 holds at once while calculating EAF (the
+# resampled WADs, their long-format table, and the per-resample EAF values)
+BYTES_PER_VALUE = 8
+RESAMPLING_MEMORY_OVERHEAD = 4
+
+MEMORY_UNITS = {
+    '': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4
+}
+
+
+_subset_features_R = ro.r('''
+    function(qsip_data_object, feature_ids) {
+        keep <- function(df) df[df$feature_id %in% feature_ids, , drop = FALSE]
+        S7::props(qsip_data_object) <- list(
+            filtered_feature_data = keep(
+                S7::prop(qsip_data_object, "filtered_feature_data")
+            ),
+            filtered_wad_data = keep(
+                S7::prop(qsip_data_object, "filtered_wad_data")
+            )
+        )
+        qsip_data_object
+    }
+''')
+
+_subset_eaf_features_R = ro.r('''
+    function(eaf_qsip_data_object, feature_ids) {
+        keep <- function(df) df[df$feature_id %in% feature_ids, , drop = FALSE]
+        resamples <- S7::prop(eaf_qsip_data_object, "resamples")
+        resamples$data <- keep(resamples$data)
+        S7::props(eaf_qsip_data_object) <- list(
+            filtered_feature_data = keep(
+                S7::prop(eaf_qsip_data_object, "filtered_feature_data")
+            ),
+            filtered_wad_data = keep(
+                S7::prop(eaf_qsip_data_object, "filtered_wad_data")
+            ),
+            resamples = resamples,
+            EAF = keep(S7::prop(eaf_qsip_data_object, "EAF"))
+        )
+        eaf_qsip_data_object
+    }
+''')
+
+_expand_features_R = ro.r('''
+    function(qsip_data_object, eaf_qsip_data_object, representatives,
+             feature_ids) {
+        expand <- function(df) {
+            rows <- split(seq_len(nrow(df)), df$feature_id)[representatives]
+            expanded <- df[unlist(rows), , drop = FALSE]
+            expanded$feature_id <- rep(feature_ids, lengths(rows))
+            expanded
+        }
+        resamples <- S7::prop(eaf_qsip_data_object, "resamples")
+        resamples$data <- expand(resamples$data)
+        S7::props(qsip_data_object) <- list(
+            resamples = resamples,
+            EAF = expand(S7::prop(eaf_qsip_data_object, "EAF"))
+        )
+        qsip_data_object
+    }
+''')
+
+_block_results_R = ro.r('''
+    function(eaf_qsip_data_object) {
+        list(
+            resamples = S7::prop(eaf_qsip_data_object, "resamples"),
+            EAF = S7::prop(eaf_qsip_data_object, "EAF")
+        )
+    }
+''')
+
+_merge_block_results_R = ro.r('''
+    function(blocks) {
+        resamples <- blocks[[1]]$resamples
+        resamples$data <- dplyr::bind_rows(
+            lapply(blocks, function(block) block$resamples$data)
+        )
+        list(
+            resamples = resamples,
+            EAF = dplyr::bind_rows(lapply(blocks, function(block) block$EAF))
+        )
+    }
+''')
+
+_resample_features_R = ro.r('''
+    function(qsip_data_object, feature_ids, rng_states, resamples,
+             subset_features, block_results, merge_block_results) {
+        # the caller's random state is restored (or removed, if it had none)
+        # however the loop exits
+        env <- globalenv()
+        had_seed <- exists(".Random.seed", envir = env, inherits = FALSE)
+        if (had_seed) {
+            saved_seed <- get(".Random.seed", envir = env, inherits = FALSE)
+        }
+        on.exit({
+            if (had_seed) {
+                assign(".Random.seed", saved_seed, envir = env)
+            } else if (exists(".Random.seed", envir = env, inherits = FALSE)) {
+                rm(".Random.seed", envir = env)
+            }
+        })
+
+        merge_block_results(lapply(seq_along(feature_ids), function(i) {
+            assign(".Random.seed", rng_states[[i]], envir = env)
+            resampled <- qSIP2::run_resampling(
+                subset_features(qsip_data_object, feature_ids[[i]]),
+                resamples = resamples
+            )
+            block_results(qSIP2::run_EAF_calculations(resampled))
+        }))
+    }
+''')
+
+_combine_block_results_R = ro.r('''
+    function(qsip_data_object, merged) {
+        S7::props(qsip_data_object) <- list(
+            resamples = merged$resamples,
+            EAF = merged$EAF
+        )
+        qsip_data_object
+    }
+''')
+
+_merge_shards_R = ro.r('''
+    function(eaf_qsip_data_objects) {
+        bind <- function(name) {
+            dplyr::bind_rows(lapply(
+                eaf_qsip_data_objects, function(object) S7::prop(object, name)
+            ))
+        }
+        merged <- eaf_qsip_data_objects[[1]]
+        resamples <- S7::prop(merged, "resamples")
+        resamples$data <- dplyr::bind_rows(lapply(
+            eaf_qsip_data_objects,
+            function(object) S7::prop(object, "resamples")$data
+        ))
+        S7::props(merged) <- list(
+            filtered_feature_data = bind("filtered_feature_data"),
+            filtered_wad_data = bind("filtered_wad_data"),
+            resamples = resamples,
+            EAF = bind("EAF")
+        )
+        merged
+    }
+''')
+
+_shard_mismatches_R = ro.r('''
+    function(eaf_qsip_data_objects) {
+        merged_properties <- c(
+            "filtered_feature_data", "filtered_wad_data", "resamples", "EAF"
+        )
+        first <- eaf_qsip_data_objects[[1]]
+        shared_properties <- setdiff(
+            names(S7::props(first)), merged_properties
+        )
+        Filter(function(name) {
+            !all(vapply(eaf_qsip_data_objects[-1], function(object) {
+                identical(S7::prop(object, name), S7::prop(first, name))
+            }, logical(1)))
+        }, shared_properties)
+    }
+''')
+
+
+def _feature_representatives(wad_df: pd.DataFrame) -> pd.Series:
+    '''
+    Groups features whose weighted average density (WAD) profiles across the
+    retained sources are identical, and picks the first feature of each group
+    as its representative. Resampling and EAF calculation only depend on a
+    feature's WAD profile, so features with identical abundance profiles (for
+    example a single count in one fraction of one source) always end up in
+    the same group.
+
+    Profiles are grouped by a vectorised row hash and then compared with
+    their representative's profile, so a hash collision can never merge two
+    different profiles.
+
+    Parameters
+    ----------
+    wad_df : pd.DataFrame
+        The filtered WAD data, with a 'feature_id' column and one WAD column
+        per retained source.
+
+    Returns
+    -------
+    pd.Series
+        The representative feature id of each feature, indexed by feature id.
+    '''
+    profiles = wad_df.drop(columns='feature_id')
+    feature_ids = wad_df['feature_id'].to_numpy()
+
+    hashes = pd.util.hash_pandas_object(profiles, index=False).to_numpy()
+    _, first_idx, inverse = np.unique(
+        hashes, return_index=True, return_inverse=True
+    )
+    representative_idx = first_idx[inverse]
+
+    values = profiles.to_numpy(dtype=float)
+    representative_values = values[representative_idx]
+    identical = (
+        (values == representative_values) |
+        (np.isnan(values) & np.isnan(representative_values))
+    ).all(axis=1)
+    representative_idx[~identical] = np.flatnonzero(~identical)
+
+    return pd.Series(
+        feature_ids[representative_idx], index=feature_ids, name='feature_id'
+    )
+
+
+def _subset_features(qsip_object: RS4, feature_ids: list) -> RS4:
+    '''
+    Restricts a filtered "qsip_data" object to a subset of its features.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The filtered "qsip_data" object.
+    feature_ids : list[str]
+        The ids of the features to retain.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` whose filtered feature and WAD data contain
+        only `feature_ids`.
+    '''
+    return _subset_features_R(qsip_object, ro.StrVector(feature_ids))
+
+
+def _deduplicated_features(qsip_object: RS4) -> pd.Series:
+    '''
+    Finds the representative feature of each feature in a filtered
+    "qsip_data" object. See `_feature_representatives`.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The filtered "qsip_data" object.
+
+    Returns
+    -------
+    pd.Series
+        The representative feature id of each feature, indexed by feature id.
+    '''
+    wad_df = _property_to_dataframe(qsip_object, 'filtered_wad_data')
+
+    return _feature_representatives(wad_df)
+
+
+def _expand_features(
+    qsip_object: RS4, eaf_qsip_object: RS4, representatives: pd.Series
+) -> RS4:
+    '''
+    Copies the resamples and EAF values calculated for representative
+    features back out to every feature they represent.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The full filtered "qsip_data" object.
+    eaf_qsip_object : RS4
+        The EAF-calculated "qsip_data" object restricted to the
+        representative features.
+    representatives : pd.Series
+        The representative feature id of each feature, indexed by feature id.
+
+    Returns
+    -------
+    RS4
+        A copy of `qsip_object` with resamples and EAF values for every
+        feature.
+    '''
+    return _expand_features_R(
+        qsip_object,
+        eaf_qsip_object,
+        ro.StrVector(representatives.to_numpy()),
+        ro.StrVector(representatives.index.to_numpy()),
+    )
+
+
+def _shard_features(
+    feature_ids: pd.Index, shard_index: int, shard_count: int
+) -> pd.Index:
+    '''
+    Selects the features of one shard: the `shard_index`-th of `shard_count`
+    contiguous, near-equal slices of `feature_ids`. Shards past the number of
+    features are empty.
+
+    Parameters
+    ----------
+    feature_ids : pd.Index
+        The ids of the features being sharded, in the order of the filtered
+        WAD data.
+    shard_index : int
+        The zero-based position of the shard.
+    shard_count : int
+        The number of shards.
+
+    Returns
+    -------
+    pd.Index
+        The ids of the shard's features.
+
+    Raises
+    ------
+    ValueError
+        If `shard_index` is not less than `shard_count`.
+    '''
+    if not 0 <= shard_index < shard_count:
+        error_msg = (
+            f'Shard {shard_index} was requested, but only {shard_count} '
+            'shards are available. Shards are numbered from zero.'
+        )
+        raise ValueError(error_msg)
+
+    positions = np.array_split(np.arange(len(feature_ids)), shard_count)
+
+    return feature_ids[positions[shard_index]]
+
+
+def _empty_shard(
+    filtered_qsip_object: RS4, resamples: int, random_seed: int
+) -> RS4:
+    '''
+    Builds the result of a shard without features: an EAF-calculated copy of
+    `filtered_qsip_object` whose filtered data, resamples, and EAF tables
+    have all of their columns but no rows, so that it can be saved and merged
+    like any other shard. qSIP2 can not resample zero features, so the first
+    feature is resampled and its rows are then dropped.
+
+    Parameters
+    ----------
+    filtered_qsip_object : RS4
+        The filtered "qsip_data" object being sharded.
+    resamples : int
+        The number of bootstrap resamplings of the run.
+    random_seed : int
+        The random seed of the run.
+
+    Returns
+    -------
+    RS4
+        The EAF-calculated "qsip_data" object without features.
+    '''
+    first_feature_id = _property_to_dataframe(
+        filtered_qsip_object, 'filtered_wad_data'
+    )['feature_id'].iloc[:1]
+    resampled_qsip_object = qsip2.run_resampling(
+        _subset_features(filtered_qsip_object, list(first_feature_id)),
+        resamples=resamples,
+        with_seed=random_seed,
+    )
+    eaf_qsip_object = qsip2.run_EAF_calculations(resampled_qsip_object)
+
+    return _subset_eaf_features_R(eaf_qsip_object, ro.StrVector([]))
+
+
+def _merge_shards(eaf_qsip_objects: list[RS4]) -> RS4:
+    '''
+    Merges EAF-calculated "qsip_data" objects that were each restricted to a
+    disjoint subset (shard) of the features of the same filtered object.
+    Shards without features are skipped.
+
+    Parameters
+    ----------
+    eaf_qsip_objects : list[RS4]
+        The EAF-calculated shards.
+
+    Returns
+    -------
+    RS4
+        A copy of the first non-empty shard holding the filtered data,
+        resamples, and EAF values of every shard's features.
+
+    Raises
+    ------
+    ValueError
+        If a feature is present in more than one shard, or if the shards
+        were not all derived from the same filtered object, e.g. they retain
+        different sources or were filtered with different parameters.
+    '''
+    shard_feature_ids = [
+        _property_to_dataframe(eaf_qsip_object, 'filtered_wad_data')[
+            'feature_id'
+        ]
+        for eaf_qsip_object in eaf_qsip_objects
+    ]
+    feature_ids = pd.concat(shard_feature_ids)
+    duplicated_ids = feature_ids[feature_ids.duplicated()].unique()
+    if len(duplicated_ids):
+        error_msg = (
+            'The following features are present in more than one of the '
+            'shards being merged: '
+            f'{", ".join(map(str, duplicated_ids))}. Each feature must be '
+            'resampled in exactly one shard.'
+        )
+        raise ValueError(error_msg)
+
+    nonempty_objects = [
+        eaf_qsip_object
+        for eaf_qsip_object, ids in zip(eaf_qsip_objects, shard_feature_ids)
+        if len(ids)
+    ] or eaf_qsip_objects[:1]
+    eaf_qsip_objects_R = ro.r['list'](*nonempty_objects)
+
+    mismatched_properties = list(_shard_mismatches_R(eaf_qsip_objects_R))
+    if mismatched_properties:
+        error_msg = (
+            'The shards being merged differ in the following properties: '
+            f'{", ".join(map(str, mismatched_properties))}. Only shards '
+            'resampled from the same filtered qSIP2 data, i.e. with the same '
+            'sources and filtering parameters, can be merged.'
+        )
+        raise ValueError(error_msg)
+
+    return _merge_shards_R(eaf_qsip_objects_R)
+
+
+def _check_seed(random_seed: int) -> None:
+    '''
+    Rejects seeds outside the signed 64-bit range, the range within which
+    `_block_seed` and `_feature_seed` map every seed to its own streams.
+
+    Raises
+    ------
+    ValueError
+        If `random_seed` is not a signed 64-bit integer.
+    '''
+    if not -2 ** 63 <= random_seed < 2 ** 63:
+        error_msg = (
+            f'The random seed {random_seed} is out of range. The seed must '
+            'be at least -2**63 and less than 2**63.'
+        )
+        raise ValueError(error_msg)
+
+
+def _block_seed(random_seed: int, block_index: int) -> int:
+    '''
+    Derives the R random seed of one block of features from the run's seed.
+    Each block's seed depends only on `random_seed` and the block's position,
+    so a block can be (re)run in isolation and still produce the same
+    resamples.
+
+    `np.random.SeedSequence` only takes non-negative entropy, so negative
+    seeds are mapped past 2**64, beyond every non-negative seed, leaving the
+    seeds of non-negative runs unchanged.
+
+    Parameters
+    ----------
+    random_seed : int
+        The random seed of the whole run.
+    block_index : int
+        The zero-based position of the block.
+
+    Returns
+    -------
+    int
+        A seed in the range accepted by R's `set.seed`.
+
+    Raises
+    ------
+    ValueError
+        If `random_seed` is not a signed 64-bit integer.
+    '''
+    return _spawned_seed(random_seed, (block_index,))
+
+
+def _shard_seed(random_seed: int, shard_index: int, shard_count: int) -> int:
+    '''
+    Derives the R random seed of one shard of a run with 'run' seeding from
+    the run's seed. Each shard's seed depends only on `random_seed`, the
+    number of shards, and the shard's position, so shards can be resampled
+    independently and the merged results are reproducible for a given number
+    of shards. The seeds differ from those of `_block_seed`, so a blocked
+    shard does not reuse the streams of an unsharded run's blocks.
+
+    Parameters
+    ----------
+    random_seed : int
+        The random seed of the whole run.
+    shard_index : int
+        The zero-based position of the shard.
+    shard_count : int
+        The number of shards.
+
+    Returns
+    -------
+    int
+        A seed in the range accepted by R's `set.seed`.
+
+    Raises
+    ------
+    ValueError
+        If `random_seed` is not a signed 64-bit integer.
+    '''
+    return _spawned_seed(random_seed, (shard_count, shard_index))
+
+
+def _spawned_seed(random_seed: int, spawn_key: tuple[int, ...]) -> int:
+    '''
+    Derives an R random seed from a run's seed and a spawn key, see
+    `_block_seed` and `_shard_seed`.
+    '''
+    _check_seed(random_seed)
+    entropy = random_seed if random_seed >= 0 else 2 ** 64 - random_seed - 1
+
+    seed_sequence = np.random.SeedSequence(entropy, spawn_key=spawn_key)
+
+    return int(seed_sequence.generate_state(1)[0] % (2 ** 31 - 1))
+
+
+def _feature_seed(random_seed: int) -> int:
+    '''
+    Maps a run's seed onto the 64-bit word of the Philox key reserved for
+    it, one-to-one: non-negative seeds to even words and negative seeds to
+    odd ones (zigzag encoding), so that no two seeds share their streams.
+
+    Parameters
+    ----------
+    random_seed : int
+        The random seed of the whole run.
+
+    Returns
+    -------
+    int
+        The seed's key word, in [0, 2 ** 64).
+
+    Raises
+    ------
+    ValueError
+        If `random_seed` is not a signed 64-bit integer.
+    '''
+    _check_seed(random_seed)
+
+    return 2 * random_seed if random_seed >= 0 else -2 * random_seed - 1
+
+
+def _feature_key(random_seed: int, feature_id: str) -> np.ndarray:
+    '''
+    The 128-bit Philox key of a feature's random stream: the feature id's
+    hash and the run's seed (see `_feature_seed`), one 64-bit word each.
+    '''
+    feature_hash = int.from_bytes(
+        hashlib.sha256(str(feature_id).encode()).digest()[:8], 'little'
+    )
+
+    return np.array(
+        [feature_hash, _feature_seed(random_seed)], dtype=np.uint64
+    )
+
+
+def _feature_rng_state(random_seed: int, feature_id: str) -> np.ndarray:
+    '''
+    Derives the R random number generator state of a single feature from the
+    run's seed and the feature's id, through the counter-based Philox
+    generator keyed by both. Each feature's stream is the start of its own
+    Philox stream, so it does not depend on which other features are
+    resampled, in what order, or in which process, and unlike seeds passed
+    to R's `set.seed`, which are limited to 32 bits, distinct features
+    practically never share a stream.
+
+    Parameters
+    ----------
+    random_seed : int
+        The random seed of the whole run.
+    feature_id : str
+        The id of the feature.
+
+    Returns
+    -------
+    np.ndarray
+        A value for R's `.Random.seed`: the Mersenne-Twister generator (with
+        inversion and rejection sampling) and its full state.
+    '''
+    generator = np.random.Generator(
+        np.random.Philox(key=_feature_key(random_seed, feature_id))
+    )
+    state = generator.integers(
+        0, 2 ** 32, size=MT_STATE_SIZE, dtype=np.uint32
+    ).view(np.int32)
+    # the smallest 32-bit integer is NA in R
+    state[state == np.iinfo(np.int32).min] = 0
+
+    # the position is set past the end of the state, so that R generates
+    # its next values from the state rather than returning it
+    return np.concatenate([[MT_RNG_KIND, MT_STATE_SIZE], state]).astype(
+        np.int32
+    )
+
+
+def _parse_memory(memory: str) -> int:
+    '''
+    Parses a memory size such as '512M' or '4G' (binary units, with an
+    optional trailing 'B' or 'iB') or a plain number of bytes.
+
+    Parameters
+    ----------
+    memory : str
+        The memory size.
+
+    Returns
+    -------
+    int
+        The number of bytes.
+
+    Raises
+    ------
+    ValueError
+        If `memory` can not be parsed or is not positive.
+    '''
+    value = memory.strip().upper().removesuffix('IB').removesuffix('B')
+    unit = value[-1:] if value[-1:] in MEMORY_UNITS else ''
+    number = value.removesuffix(unit).strip()
+
+    try:
+        n_bytes = int(float(number) * MEMORY_UNITS[unit])
+    except (ValueError, OverflowError):
+        n_bytes = 0
+
+    if n_bytes <= 0:
+        error_msg = (
+            f'Could not interpret "{memory}" as a memory size. Please give '
+            'a positive number of bytes, optionally followed by K, M, G, or '
+            'T, e.g. "4G".'
+        )
+        raise ValueError(error_msg)
+
+    return n_bytes
+
+
+def _feature_memory(n_sources: int, resamples: int) -> int:
+    '''
+    Estimates the peak memory, in bytes, needed to resample one feature and
+    calculate its EAF values.
+    '''
+    return (
+        n_sources * resamples * BYTES_PER_VALUE * RESAMPLING_MEMORY_OVERHEAD
+    )
+
+
+def _object_memory(qsip_object: RS4) -> int:
+    '''
+    Estimates the memory, in bytes, held by `qsip_object` in R, which stays
+    resident while its features are resampled.
+    '''
+    return int(ro.r['object.size'](qsip_object)[0])
+
+
+def _memory_block_size(
+    qsip_object: RS4, resamples: int, max_memory: int
+) -> int:
+    '''
+    Chooses the largest block of features whose resampling is estimated to
+    fit in `max_memory` bytes, given the number of sources and resamples and
+    the memory already held by the filtered object itself. The estimates
+    and the chosen block size are logged.
+
+    Parameters
+    ----------
+    qsip_object : RS4
+        The filtered "qsip_data" object.
+    resamples : int
+        The number of bootstrap resamplings.
+    max_memory : int
+        The memory budget, in bytes.
+
+    Returns
+    -------
+    int
+        The number of features per block, at least one.
+    '''
+    wad_df = _property_to_dataframe(qsip_object, 'filtered_wad_data')
+    n_features = len(wad_df)
+    n_sources = wad_df.shape[1] - 1
+
+    resident_memory = _object_memory(qsip_object)
+    available_memory = max_memory - resident_memory
+    feature_memory = _feature_memory(n_sources, resamples)
+    block_size = min(
+        max(available_memory // feature_memory, 1), max(n_features, 1)
+    )
+
+    _inform(
+        f'Estimated {resident_memory / 1024 ** 2:.2f} MiB for the filtered '
+        f'data and {feature_memory / 1024 ** 2:.2f} MiB per feature '
+        f'({n_sources} sources x {resamples} resamples); processing '
+        f'{block_size} of {n_features} features per block to stay under '
+        f'{max_memory / 1024 ** 2:.0f} MiB.'
+    )
+    if feature_memory > available_memory:
+        logger.warning(
+            'The filtered data and a single feature are estimated to exceed '
+            'the memory budget, so features are processed one at a time.'
+        )
+
+    return int(block_size)
+
+
+def _run_fingerprint(
+    wad_df: pd.DataFrame,
+    resamples: int,
+    random_seed: int,
+    block_size: int,
+    seeding: str = 'run',
+) -> str:
+    '''
+    Fingerprints the inputs of a blocked resampling run, so that checkpoints
+    are only ever resumed by a run that would recompute identical blocks.
+
+    Parameters
+    ----------
+    wad_df : pd.DataFrame
+        The filtered WAD data of the features being resampled.
+    resamples : int
+        The number of bootstrap resamplings.
+    random_seed : int
+        The random seed of the run.
+    block_size : int
+        The number of features per block.
+    seeding : str
+        The seeding mode of the run, one of `SEEDING_MODES`.
+
+    Returns
+    -------
+    str
+        A hex digest identifying the run.
+    '''
+    digest = hashlib.sha256()
+    digest.update(
+        pd.util.hash_pandas_object(wad_df, index=False).to_numpy().tobytes()
+    )
+    parameters = [resamples, random_seed, block_size, seeding]
+    if seeding == 'feature':
+        parameters.append(FEATURE_GENERATOR)
+    digest.update(json.dumps(parameters).encode())
+
+    return digest.hexdigest()
+
+
+def _prepare_checkpoint_dir(
+    checkpoint_dir: Path, fingerprint: str, block_seeds: list[int]
+) -> None:
+    '''
+    Creates a checkpoint directory, or checks that an existing one belongs to
+    the same run. The manifest records the run's fingerprint and the seed of
+    every block, which is all of the random state needed to resume.
+
+    Parameters
+    ----------
+    checkpoint_dir : Path
+        The checkpoint directory.
+    fingerprint : str
+        The fingerprint of the run, see `_run_fingerprint`.
+    block_seeds : list[int]
+        The R random seed of each block. Empty if features are seeded
+        individually.
+
+    Raises
+    ------
+    ValueError
+        If `checkpoint_dir` holds checkpoints from a different run.
+    '''
+    manifest_fp = checkpoint_dir / CHECKPOINT_MANIFEST
+
+    if manifest_fp.exists():
+        with open(manifest_fp) as fh:
+            manifest = json.load(fh)
+
+        if manifest['fingerprint'] != fingerprint:
+            error_msg = (
+                f'The checkpoint directory "{checkpoint_dir}" contains '
+                'checkpoints from a run with different inputs or parameters. '
+                'Please provide an empty directory or the directory of an '
+                'interrupted run with the same inputs and parameters.'
+            )
+            raise ValueError(error_msg)
+
+        return
+
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    with open(manifest_fp, 'w') as fh:
+        json.dump(
+            {'fingerprint': fingerprint, 'block_seeds': block_seeds}, fh
+        )
+
+
+def _block_fp(checkpoint_dir: Path, block_index: int) -> Path:
+    return checkpoint_dir / f'block-{block_index:06d}.rds'
+
+
+def _load_block(checkpoint_dir: Path, block_index: int) -> Optional[object]:
+    '''
+    Loads the results of a completed block, if they were checkpointed.
+    '''
+    block_fp = _block_fp(checkpoint_dir, block_index)
+    if not block_fp.exists():
+        return None
+
+    return ro.r['readRDS'](str(block_fp))
+
+
+def _save_block(
+    checkpoint_dir: Path, block_index: int, block: object
+) -> None:
+    '''
+    Checkpoints the results of a completed block. The results are written to
+    a temporary file that is then renamed, so an interrupted write never
+    leaves a truncated checkpoint behind.
+    '''
+    block_fp = _block_fp(checkpoint_dir, block_index)
+    partial_fp = block_fp.with_suffix('.partial')
+
+    ro.r['saveRDS'](block, str(partial_fp))
+    os.replace(partial_fp, block_fp)
+
+
+@_traced('R: Resampling and calculating EAF')
+def _resample_block(
+    filtered_qsip_data: RS4,
+    block_ids: np.ndarray,
+    resamples: int,
+    random_seed: int,
+    block_index: int,
+    seeding: str = 'run',
+) -> object:
+    '''
+    Resamples and calculates EAF for one block of features.
+
+    Parameters
+    ----------
+    filtered_qsip_data : RS4
+        The filtered "qsip_data" object.
+    block_ids : np.ndarray
+        The ids of the features in the block.
+    resamples : int
+        The number of bootstrap resamplings to perform.
+    random_seed : int
+        The random seed of the whole run.
+    block_index : int
+        The zero-based position of the block.
+    seeding : str
+        With 'run', the block is resampled in one call seeded by
+        `_block_seed`. With 'feature', each feature is resampled separately,
+        from the random stream given by `_feature_rng_state`.
+
+    Returns
+    -------
+    object
+        An R list holding the block's resamples and EAF values.
+    '''
+    def _resample(feature_ids, seed):
+        resampled = qsip2.run_resampling(
+            _subset_features(filtered_qsip_data, feature_ids),
+            resamples=resamples,
+            with_seed=seed
+        )
+        return _block_results_R(qsip2.run_EAF_calculations(resampled))
+
+    if seeding == 'run':
+        return _resample(block_ids, _block_seed(random_seed, block_index))
+
+    # the features are looped over in R, to avoid a round trip per feature
+    return _resample_features_R(
+        filtered_qsip_data,
+        ro.StrVector(list(block_ids)),
+        ro.r['list'](*(
+            ro.IntVector(
+                _feature_rng_state(random_seed, feature_id).tolist()
+            )
+            for feature_id in block_ids
+        )),
+        resamples,
+        _subset_features_R,
+        _block_results_R,
+        _merge_block_results_R,
+    )
+
+
+def _resample_in_blocks(
+    filtered_qsip_data: RS4,
+    resamples: int,
+    random_seed: int,
+    block_size: int,
+    checkpoint_dir: Optional[str] = None,
+    seeding: str = 'run',
+    progress_callback: Callable[[ProgressReport], None] = _log_progress,
+) -> RS4:
+    '''
+    Resamples and calculates EAF in consecutive blocks of features, each with
+    its own seed derived from `random_seed` (or, with 'feature' seeding, with
+    one random stream per feature, which makes the results independent of
+    the block size and of which other features are resampled). If
+    `checkpoint_dir` is given the results of each block are persisted as
+    soon as it completes, and blocks already persisted by an interrupted run
+    with the same inputs are loaded instead of recomputed. Because every
+    block is seeded independently, the results are identical whether or not
+    the run was interrupted.
+
+    Progress is reported after each block. A Ctrl-C while a block is running
+    takes effect once that block completes (and is checkpointed), so the
+    embedded R session is never interrupted mid-call.
+
+    Parameters
+    ----------
+    filtered_qsip_data : RS4
+        The filtered "qsip_data" object.
+    resamples : int
+        The number of bootstrap resamplings to perform.
+    random_seed : int
+        The random seed from which each block's seed is derived.
+    block_size : int
+        The number of features per block.
+    checkpoint_dir : str or None
+        The directory in which to persist completed blocks.
+    seeding : str
+        One of `SEEDING_MODES`, see `_resample_block`.
+    progress_callback : Callable[[ProgressReport], None]
+        Receives progress reports. By default they are logged at intervals.
+
+    Returns
+    -------
+    RS4
+        The filtered "qsip_data" object with resamples and EAF values for
+        every feature.
+
+    Raises
+    ------
+    KeyboardInterrupt
+        If cancellation was requested, once the running block completes.
+    '''
+    wad_df = _property_to_dataframe(filtered_qsip_data, 'filtered_wad_data')
+    feature_ids = wad_df['feature_id'].to_numpy()
+
+    blocks = [
+        feature_ids[start:start + block_size]
+        for start in range(0, len(feature_ids), block_size)
+    ]
+    block_seeds = []
+    if seeding == 'run':
+        block_seeds = [
+            _block_seed(random_seed, i) for i in range(len(blocks))
+        ]
+    else:
+        # out-of-range seeds are rejected before any block is resampled
+        _check_seed(random_seed)
+
+    if checkpoint_dir is not None:
+        checkpoint_dir = Path(checkpoint_dir)
+        fingerprint = _run_fingerprint(
+            wad_df, resamples, random_seed, block_size, seeding
+        )
+        _prepare_checkpoint_dir(checkpoint_dir, fingerprint, block_seeds)
+
+    progress = _Progress(
+        'Resampling and calculating EAF',
+        len(feature_ids),
+        resamples,
+        progress_callback,
+    )
+
+    block_results = []
+    with _cooperative_cancellation() as token:
+        for block_index, block_ids in enumerate(blocks):
+            block = None
+            if checkpoint_dir is not None:
+                block = _load_block(checkpoint_dir, block_index)
+
+            if block is None:
+                block = _resample_block(
+                    filtered_qsip_data,
+                    block_ids,
+                    resamples,
+                    random_seed,
+                    block_index,
+                    seeding,
+                )
+
+                if checkpoint_dir is not None:
+                    _save_block(checkpoint_dir, block_index, block)
+
+            block_results.append(block)
+            progress.update(len(block_ids))
+            token.raise_if_cancelled()
+
+    merged = _merge_block_results_R(ro.r['list'](*block_results))
+
+    return _combine_block_results_R(filtered_qsip_data, merged)
@@ -0,0 +1,185 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import rpy2.robjects as ro
+
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from q2_qsip2._tracing import _file_nbytes, _traced
+
+
+# environment variables selecting how qSIP2 objects are written to artifacts
+SERIALIZATION_ENV = 'Q2_QSIP2_SERIALIZATION'
+COMPRESSION_ENV = 'Q2_QSIP2_RDS_COMPRESSION'
+COMPRESSION_LEVEL_ENV = 'Q2_QSIP2_RDS_COMPRESSION_LEVEL'
+
+SERIALIZATION_BACKENDS = ('pickle', 'rds')
+
+# compression method -> (default level, minimum level, maximum level)
+COMPRESSION_METHODS = {
+    'none': (0, 0, 0),
+    'gzip': (6, 1, 9),
+    'xz': (6, 0, 9),
+    'zstd': (3, 1, 22),
+}
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_save_rds_R = ro.r('''
+    function(object, file, compression, level) {
+        con <- switch(
+            compression,
+            none = file(file, "wb"),
+            gzip = gzfile(file, "wb", compression = level),
+            xz = xzfile(file, "wb", compression = level)
+        )
+        on.exit(close(con))
+        saveRDS(object, con)
+    }
+''')
+
+
+class SerializationSettings(NamedTuple):
+    backend: str
+    compression: str
+    level: int
+
+
+def _serialization_settings() -> SerializationSettings:
+    '''
+    Reads the serialization backend, RDS compression method, and compression
+    level from the environment. The pickle backend is used by default.
+
+    Returns
+    -------
+    SerializationSettings
+        The selected backend, compression method, and compression level.
+
+    Raises
+    ------
+    ValueError
+        If any of the settings is not recognized or out of range.
+    '''
+    backend = os.environ.get(SERIALIZATION_ENV, 'pickle')
+    if backend not in SERIALIZATION_BACKENDS:
+        error_msg = (
+            f'Unrecognized serialization backend "{backend}" in '
+            f'{SERIALIZATION_ENV}. Please use one of: '
+            f'{", ".join(SERIALIZATION_BACKENDS)}.'
+        )
+        raise ValueError(error_msg)
+
+    compression = os.environ.get(COMPRESSION_ENV, 'gzip')
+    if compression not in COMPRESSION_METHODS:
+        error_msg = (
+            f'Unrecognized compression method "{compression}" in '
+            f'{COMPRESSION_ENV}. Please use one of: '
+            f'{", ".join(COMPRESSION_METHODS)}.'
+        )
+        raise ValueError(error_msg)
+
+    default_level, min_level, max_level = COMPRESSION_METHODS[compression]
+    level = int(os.environ.get(COMPRESSION_LEVEL_ENV, default_level))
+    if compression != 'none' and not min_level <= level <= max_level:
+        error_msg = (
+            f'The {compression} compression level must be between '
+            f'{min_level} and {max_level}, but {level} was given in '
+            f'{COMPRESSION_LEVEL_ENV}.'
+        )
+        raise ValueError(error_msg)
+
+    return SerializationSettings(backend, compression, level)
+
+
+@_traced(measure=_file_nbytes(1))
+def _save_rds(
+    r_object: object, fp: Path, compression: str = 'gzip', level: int = 6
+) -> None:
+    '''
+    Writes an R object in R's native RDS format, without going through
+    Python's pickle. gzip and xz compression are performed by R; zstd
+    compression of the uncompressed RDS stream is performed in Python with
+    the optional `zstandard` package, as base R does not support it.
+
+    Parameters
+    ----------
+    r_object : object
+        The R object, e.g. a "qsip_data" object.
+    fp : Path
+        The path of the RDS file.
+    compression : str
+        One of `COMPRESSION_METHODS`.
+    level : int
+        The compression level.
+
+    Raises
+    ------
+    ValueError
+        If zstd compression is requested but `zstandard` is not installed.
+    '''
+    if compression != 'zstd':
+        _save_rds_R(r_object, str(fp), compression, level)
+        return
+
+    if zstandard is None:
+        error_msg = (
+            'zstd compression requires the zstandard python package. Please '
+            'install it, or choose gzip or xz compression.'
+        )
+        raise ValueError(error_msg)
+
+    serialized = bytes(ro.r['serialize'](r_object, ro.NULL))
+    with open(fp, 'wb') as fh:
+        fh.write(zstandard.ZstdCompressor(level=level).compress(serialized))
+
+
+@_traced(measure=_file_nbytes(0))
+def _load_rds(fp: Path) -> object:
+    '''
+    Reads an R object written by `_save_rds` with any compression method.
+
+    Parameters
+    ----------
+    fp : Path
+        The path of the RDS file.
+
+    Returns
+    -------
+    object
+        The R object.
+
+    Raises
+    ------
+    ValueError
+        If the file is zstd compressed but `zstandard` is not installed.
+    '''
+    with open(fp, 'rb') as fh:
+        magic = fh.read(len(ZSTD_MAGIC))
+
+    # readRDS detects gzip, bzip2, xz, and uncompressed files by itself
+    if magic != ZSTD_MAGIC:
+        return ro.r['readRDS'](str(fp))
+
+    if zstandard is None:
+        error_msg = (
+            f'{fp} is zstd compressed, which requires the zstandard python '
+            'package to read. Please install it.'
+        )
+        raise ValueError(error_msg)
+
+    with open(fp, 'rb') as fh:
+        serialized = zstandard.ZstdDecompressor().decompress(fh.read())
+
+    return ro.r['unserialize'](ro.vectors.ByteVector(serialized))
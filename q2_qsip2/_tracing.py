@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import pandas as pd
+from scipy import sparse
+
+import atexit
+from contextlib import contextmanager
+from dataclasses import dataclass
+import datetime
+import functools
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Optional
+
+
+# if set, a JSON summary of the traced calls is written to this directory
+# when the process exits
+TRACE_ENV = 'Q2_QSIP2_TRACE_DIR'
+
+
+@dataclass
+class TraceStats:
+    '''
+    The aggregated calls of one traced function or block.
+    '''
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    nbytes: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'mean_seconds': self.seconds / self.calls if self.calls else 0.0,
+            'max_seconds': self.max_seconds,
+            'bytes': self.nbytes,
+        }
+
+
+_traces: dict[str, TraceStats] = {}
+_traces_lock = threading.Lock()
+_started = datetime.datetime.now()
+_started_counter = time.perf_counter()
+
+
+def _record(name: str, seconds: float, nbytes: int = 0) -> None:
+    with _traces_lock:
+        stats = _traces.setdefault(name, TraceStats())
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        stats.nbytes += nbytes
+
+
+def _nbytes(value: object) -> int:
+    '''
+    The in-memory size of the tables and arrays passed through the
+    conversion layer, without walking python objects, so it stays cheap.
+    Other values count as zero bytes.
+    '''
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False).sum())
+    if sparse.issparse(value):
+        return int(sum(
+            getattr(value, name).nbytes
+            for name in ('data', 'indices', 'indptr', 'row', 'col')
+            if hasattr(value, name)
+        ))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_nbytes(item) for item in value)
+
+    # numpy arrays, pandas series, and compact feature tables
+    return int(getattr(value, 'nbytes', 0))
+
+
+def _file_nbytes(position: int) -> Callable[..., int]:
+    '''
+    A `measure` for `_traced` functions that read or write a file: the size
+    of the file whose path (or file format) is the positional argument at
+    `position`, once the function returns.
+    '''
+    def measure(result, *args, **kwargs):
+        try:
+            return os.path.getsize(str(args[position]))
+        except (IndexError, OSError):
+            return 0
+
+    return measure
+
+
+@contextmanager
+def _trace(name: str, nbytes: int = 0):
+    '''
+    Records the duration of the block under `name`, along with `nbytes`
+    bytes converted.
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start, nbytes)
+
+
+def _traced(
+    name: Optional[str] = None,
+    measure: Optional[Callable[..., int]] = None,
+) -> Callable:
+    '''
+    Records the call count and duration of a function, and the number of
+    bytes it converted, under `name` (by default the function's name). The
+    bytes are measured by `measure`, called with the function's result,
+    positional arguments, and keyword arguments; by default the size of the
+    result is used (see `_nbytes`).
+
+    Tracing only takes two clock reads and a dictionary update per call, so
+    it is always on; the summary is only written if `TRACE_ENV` is set.
+    '''
+    def decorator(function):
+        trace_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+
+            if measure is None:
+                nbytes = _nbytes(result)
+            else:
+                nbytes = measure(result, *args, **kwargs)
+            _record(trace_name, seconds, nbytes)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _trace_summary() -> dict:
+    '''
+    The traced calls of this process so far, slowest first.
+
+    Returns
+    -------
+    dict
+        The process id, start time, and wall time of the process, and the
+        aggregated statistics of every traced function or block.
+    '''
+    with _traces_lock:
+        traces = sorted(
+            _traces.items(), key=lambda item: item[1].seconds, reverse=True
+        )
+        traces = {name: stats.to_dict() for name, stats in traces}
+
+    return {
+        'pid': os.getpid(),
+        'started': _started.isoformat(timespec='seconds'),
+        'wall_seconds': time.perf_counter() - _started_counter,
+        'traces': traces,
+    }
+
+
+def _write_trace_summary(output_dir: Optional[str] = None) -> Optional[Path]:
+    '''
+    Writes `_trace_summary` as JSON to `output_dir`, by default the value of
+    `TRACE_ENV`, if any calls were traced.
+
+    Returns
+    -------
+    Path or None
+        The path of the summary, or None if nothing was written.
+    '''
+    output_dir = output_dir or os.environ.get(TRACE_ENV)
+    if not output_dir or not _traces:
+        return None
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    timestamp = _started.strftime('%Y%m%d-%H%M%S')
+    fp = output_dir / f'trace-{timestamp}-{os.getpid()}.json'
+    with open(fp, 'w') as fh:
+        json.dump(_trace_summary(), fh, indent=2)
+
+    return fp
+
+
+# artifacts are read before and written after an action runs, so the
+# summary covers the whole process rather than the action call alone
+atexit.register(_write_trace_summary)
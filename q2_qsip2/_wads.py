@@ -0,0 +1,222 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from typing import Optional, Union
+
+
+def _source_wads(
+    sources: np.ndarray, densities: np.ndarray, amounts: np.ndarray
+) -> pd.DataFrame:
+    '''
+    Calculates the weighted average density (WAD) of each source, that is,
+    the mean density of its samples (fractions) weighted by their DNA amounts.
+
+    Parameters
+    ----------
+    sources : np.ndarray
+        The source id of each sample.
+    densities : np.ndarray
+        The density of each sample.
+    amounts : np.ndarray
+        The DNA amount of each sample.
+
+    Returns
+    -------
+    pd.DataFrame
+        A table with 'source_mat_id' and 'WAD' columns, one row per source.
+    '''
+    codes, source_ids = pd.factorize(np.asarray(sources))
+    densities = np.asarray(densities, dtype=float)
+    amounts = np.asarray(amounts, dtype=float)
+
+    wads = (
+        np.bincount(codes, densities * amounts) / np.bincount(codes, amounts)
+    )
+
+    return pd.DataFrame({'source_mat_id': source_ids, 'WAD': wads})
+
+
+def _tube_abundances(
+    abundances: Union[sparse.sparray, np.ndarray], amounts: np.ndarray
+) -> sparse.csc_array:
+    '''
+    Scales each sample's relative abundances by the sample's DNA amount,
+    giving the amount of each feature's DNA in each sample (fraction), i.e.
+    qSIP2's "tube relative abundance" up to a per-source constant. Only the
+    stored nonzero values are scaled, column by column, so the result keeps
+    the sparsity structure of `abundances`.
+
+    Parameters
+    ----------
+    abundances : sparse array or np.ndarray
+        The feature-by-sample abundance matrix.
+    amounts : np.ndarray
+        The DNA amount of each column (sample) of `abundances`.
+
+    Returns
+    -------
+    sparse.csc_array
+        The feature-by-sample matrix of amount-scaled relative abundances.
+    '''
+    abundances = sparse.csc_array(abundances, dtype=float)
+    amounts = np.asarray(amounts, dtype=float)
+
+    sample_totals = abundances.sum(axis=0)
+    sample_scale = np.divide(
+        amounts, sample_totals,
+        out=np.zeros_like(amounts), where=sample_totals > 0
+    )
+
+    tube_abundances = abundances.copy()
+    tube_abundances.data *= np.repeat(
+        sample_scale, np.diff(tube_abundances.indptr)
+    )
+    tube_abundances.eliminate_zeros()
+
+    return tube_abundances
+
+
+def _source_indicator(
+    sources: np.ndarray
+) -> tuple[sparse.csr_array, pd.Index]:
+    '''
+    Builds a sample-by-source indicator matrix, so that multiplying a
+    feature-by-sample matrix by it sums each feature over each source's
+    samples.
+
+    Parameters
+    ----------
+    sources : np.ndarray
+        The source id of each sample.
+
+    Returns
+    -------
+    tuple[sparse.csr_array, pd.Index]
+        The indicator matrix and the source id of each of its columns.
+    '''
+    codes, source_ids = pd.factorize(np.asarray(sources))
+    indicator = sparse.csr_array(
+        (np.ones(len(codes)), (np.arange(len(codes)), codes)),
+        shape=(len(codes), len(source_ids))
+    )
+
+    return indicator, pd.Index(source_ids)
+
+
+def _feature_wads(
+    abundances: Union[sparse.sparray, np.ndarray],
+    feature_ids: np.ndarray,
+    sources: np.ndarray,
+    densities: np.ndarray,
+    amounts: Optional[np.ndarray],
+) -> pd.DataFrame:
+    '''
+    Calculates the weighted average density (WAD) of every feature in every
+    source. Each sample's density is weighted by the feature's relative
+    abundance in that sample scaled by the sample's DNA amount, which is the
+    "tube relative abundance" used by qSIP2 up to a per-source constant that
+    cancels out of the weighted mean.
+
+    The weights are kept sparse and summed per source with a single sparse
+    product against a sample-by-source indicator matrix. Tube abundances
+    precomputed with `_tube_abundances` can be passed in place of raw
+    abundances, with `amounts` set to None, to skip the scaling step.
+
+    Parameters
+    ----------
+    abundances : sparse array or np.ndarray
+        The feature-by-sample abundance matrix.
+    feature_ids : np.ndarray
+        The feature id of each row of `abundances`.
+    sources : np.ndarray
+        The source id of each column (sample) of `abundances`.
+    densities : np.ndarray
+        The density of each column (sample) of `abundances`.
+    amounts : np.ndarray or None
+        The DNA amount of each column (sample) of `abundances`, or None if
+        `abundances` are already tube abundances.
+
+    Returns
+    -------
+    pd.DataFrame
+        A long-format table with 'feature_id', 'source_mat_id', and 'WAD'
+        columns. Features that are absent from a source have no row for that
+        source.
+    '''
+    densities = np.asarray(densities, dtype=float)
+
+    if amounts is None:
+        weights = sparse.csc_array(abundances, dtype=float)
+    else:
+        weights = _tube_abundances(abundances, amounts)
+    indicator, source_ids = _source_indicator(sources)
+
+    weighted_densities = weights.copy()
+    weighted_densities.data *= np.repeat(densities, np.diff(weights.indptr))
+
+    denominators = (weights @ indicator).toarray()
+    numerators = (weighted_densities @ indicator).toarray()
+
+    feature_idx, source_idx = np.nonzero(denominators)
+
+    return pd.DataFrame({
+        'feature_id': np.asarray(feature_ids)[feature_idx],
+        'source_mat_id': source_ids[source_idx],
+        'WAD': (
+            numerators[feature_idx, source_idx] /
+            denominators[feature_idx, source_idx]
+        ),
+    })
+
+
+def _source_relative_abundances(
+    abundances: Union[sparse.sparray, np.ndarray],
+    sources: np.ndarray,
+    amounts: Optional[np.ndarray],
+) -> tuple[sparse.csr_array, pd.Index]:
+    '''
+    Calculates the relative abundance of every feature in every source, that
+    is, the share of the source's sequenced DNA, summed across its fractions,
+    that belongs to the feature.
+
+    Parameters
+    ----------
+    abundances : sparse array or np.ndarray
+        The feature-by-sample abundance matrix, or precomputed tube
+        abundances (see `_tube_abundances`).
+    sources : np.ndarray
+        The source id of each column (sample) of `abundances`.
+    amounts : np.ndarray or None
+        The DNA amount of each column (sample) of `abundances`, or None if
+        `abundances` are already tube abundances.
+
+    Returns
+    -------
+    tuple[sparse.csr_array, pd.Index]
+        The feature-by-source relative abundance matrix and the source id of
+        each of its columns.
+    '''
+    if amounts is None:
+        weights = sparse.csc_array(abundances, dtype=float)
+    else:
+        weights = _tube_abundances(abundances, amounts)
+    indicator, source_ids = _source_indicator(sources)
+
+    source_abundances = (weights @ indicator).tocsr()
+    source_totals = source_abundances.sum(axis=0)
+    source_scale = np.divide(
+        1.0, source_totals,
+        out=np.zeros_like(source_totals), where=source_totals > 0
+    )
+    source_abundances.data *= source_scale[source_abundances.indices]
+
+    return source_abundances, source_ids
@@ -6,10 +6,17 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import biom
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
 from typing import Optional
 
 import qiime2
 
+from q2_qsip2._tracing import _traced
+
 
 SOURCE_COLUMNS = (
     'isotope',
@@ -58,6 +65,7 @@ def _construct_column_mapping(arguments: dict) -> dict:
     return column_mapping
 
 
+@_traced()
 def _extract_source_metadata(
     sample_md: qiime2.Metadata,
     source_column: str,
@@ -173,6 +181,7 @@ def _handle_metadata(
     return (source_metadata, sample_metadata)
 
 
+@_traced()
 def _validate_metadata_columns(
     metadata: qiime2.Metadata,
     column_mapping: dict,
@@ -268,3 +277,372 @@ def _validate_metadata_columns(
     md_df.set_index(index_name, inplace=True)
 
     return qiime2.Metadata(md_df)
+
+
+def _merge_metadata(
+    dfs: list[pd.DataFrame],
+    id_column: str,
+    metadata_type: str,
+) -> pd.DataFrame:
+    '''
+    Merges several metadata dataframes by taking the union of their rows and
+    columns. Rows that share an id across dataframes are collapsed into a
+    single row, provided that their values agree in every column they have in
+    common.
+
+    Parameters
+    ----------
+    dfs : list[pd.DataFrame]
+        The metadata dataframes to merge. Ids are stored in a regular column
+        rather than in the index.
+    id_column : str
+        The name of the id column shared by each of `dfs`.
+    metadata_type : str
+        One of 'source', 'sample'. Used only to clarify the error message.
+
+    Returns
+    -------
+    pd.DataFrame
+        The merged metadata, with ids in `id_column` and rows ordered by first
+        appearance.
+
+    Raises
+    ------
+    ValueError
+        If one or more ids have conflicting values across `dfs`.
+    '''
+    combined = pd.concat(dfs, ignore_index=True)
+    grouped = combined.groupby(id_column, sort=False)
+
+    # missing values are ignored so that a column absent from one input does
+    # not conflict with the values provided by another
+    conflicting = (grouped.nunique(dropna=True) > 1).any(axis=1)
+
+    if conflicting.any():
+        conflicting_ids = ', '.join(map(str, conflicting.index[conflicting]))
+        error_msg = (
+            f'The following {metadata_type} ids have conflicting metadata '
+            f'values across the qSIP2 data being merged: {conflicting_ids}. '
+            'Please make sure that shared ids are described identically in '
+            'each input.'
+        )
+        raise ValueError(error_msg)
+
+    return grouped.first().reset_index()
+
+
+def _collapse_table(
+    table: biom.Table, taxonomy: pd.DataFrame, level: int
+) -> biom.Table:
+    '''
+    Collapses the features of `table` to the given taxonomic level by summing
+    the abundances of all features that share a taxonomy truncated to that
+    level. The sums are computed with a single sparse product against a
+    taxon-by-feature indicator matrix, so the table is never densified.
+
+    Parameters
+    ----------
+    table : biom.Table
+        The feature table.
+    taxonomy : pd.DataFrame
+        The feature taxonomy, indexed by feature id, with semicolon-delimited
+        taxonomies in a 'Taxon' column.
+    level : int
+        The taxonomic level to collapse to, where 1 is the first (e.g.
+        kingdom) rank. Taxonomies with fewer ranks are kept in full.
+
+    Returns
+    -------
+    biom.Table
+        The collapsed table, whose feature ids are the truncated taxonomies.
+
+    Raises
+    ------
+    ValueError
+        If one or more features in `table` are not present in `taxonomy`.
+    '''
+    feature_ids = pd.Index(table.ids('observation'))
+
+    missing_ids = feature_ids.difference(taxonomy.index)
+    if len(missing_ids):
+        error_msg = (
+            'The following features in the feature table were not found in '
+            f'the taxonomy: {", ".join(map(str, missing_ids))}. Please '
+            'provide a taxonomy that describes every feature.'
+        )
+        raise ValueError(error_msg)
+
+    taxa = (
+        taxonomy['Taxon']
+        .reindex(feature_ids)
+        .str.replace(r'\s*;\s*', ';', regex=True)
+        .str.strip()
+        .str.split(';')
+        .str[:level]
+        .str.join(';')
+    )
+    codes, collapsed_ids = pd.factorize(taxa)
+
+    indicator = sparse.csr_matrix(
+        (np.ones(len(codes)), (codes, np.arange(len(codes)))),
+        shape=(len(collapsed_ids), len(codes))
+    )
+
+    return biom.Table(
+        indicator @ table.matrix_data,
+        observation_ids=collapsed_ids,
+        sample_ids=table.ids('sample'),
+    )
+
+
+def _select_features(
+    available_ids: pd.Index,
+    feature_ids: Optional[list[str]] = None,
+    feature_metadata: Optional[qiime2.Metadata] = None,
+    feature_metadata_where: Optional[str] = None,
+) -> Optional[pd.Index]:
+    '''
+    Resolves a subset of features of interest from explicit ids and/or a
+    feature metadata query. The subset is the union of `feature_ids` and the
+    ids in `feature_metadata` (optionally restricted by
+    `feature_metadata_where`), in the order of `available_ids`.
+
+    Parameters
+    ----------
+    available_ids : pd.Index
+        The ids of the features available for selection.
+    feature_ids : list[str] or None
+        Ids of features to select. Each must be in `available_ids`.
+    feature_metadata : qiime2.Metadata or None
+        Feature metadata whose ids select features. Ids not in
+        `available_ids`, e.g. features removed by filtering, are ignored.
+    feature_metadata_where : str or None
+        A SQLite WHERE clause restricting the ids taken from
+        `feature_metadata`.
+
+    Returns
+    -------
+    pd.Index or None
+        The selected feature ids, or None if no selection was requested.
+
+    Raises
+    ------
+    ValueError
+        If `feature_metadata_where` is given without `feature_metadata`, if
+        any of `feature_ids` is unavailable, or if the selection is empty.
+    '''
+    if feature_metadata_where is not None and feature_metadata is None:
+        error_msg = (
+            'A feature metadata query was provided without feature metadata. '
+            'Please provide the feature metadata to query.'
+        )
+        raise ValueError(error_msg)
+
+    if feature_ids is None and feature_metadata is None:
+        return None
+
+    selected = pd.Index([], dtype=object)
+
+    if feature_ids is not None:
+        requested = pd.Index(feature_ids)
+        missing_ids = requested.difference(available_ids)
+        if len(missing_ids):
+            error_msg = (
+                'The following requested features are not among the features '
+                'retained in the filtered qSIP2 data: '
+                f'{", ".join(map(str, missing_ids))}.'
+            )
+            raise ValueError(error_msg)
+
+        selected = selected.union(requested)
+
+    if feature_metadata is not None:
+        metadata_ids = pd.Index(
+            sorted(feature_metadata.get_ids(where=feature_metadata_where))
+        )
+        selected = selected.union(metadata_ids.intersection(available_ids))
+
+    selected = available_ids[available_ids.isin(selected)]
+
+    if selected.empty:
+        error_msg = (
+            'None of the selected features are among the features retained '
+            'in the filtered qSIP2 data.'
+        )
+        raise ValueError(error_msg)
+
+    return selected
+
+
+def _format_ids(ids: pd.Index, limit: int = 10) -> str:
+    '''
+    Formats ids for an error message, listing at most `limit` of them.
+    '''
+    formatted = ', '.join(map(str, ids[:limit]))
+    if len(ids) > limit:
+        formatted += f', ... ({len(ids) - limit} more)'
+
+    return formatted
+
+
+def _reconcile_ids(
+    table_sample_ids: pd.Index,
+    sample_sources: pd.Series,
+    source_ids: pd.Index,
+    ignore_extra_table_samples: bool = False,
+    auto_subset: bool = False,
+) -> tuple[pd.Index, pd.Index]:
+    '''
+    Checks that the feature table, sample metadata, and source metadata
+    describe the same samples and sources, using hashed index set operations
+    only, so that mismatches are found before any expensive conversion.
+    Every kind of mismatch is reported at once.
+
+    Parameters
+    ----------
+    table_sample_ids : pd.Index
+        The sample ids of the feature table.
+    sample_sources : pd.Series
+        The source id of each sample, indexed by sample id.
+    source_ids : pd.Index
+        The source ids of the source metadata.
+    ignore_extra_table_samples : bool
+        Whether samples in the feature table but not in the sample metadata
+        are expected, e.g. because only the metadata's samples will be read.
+    auto_subset : bool
+        Whether to resolve mismatches by keeping only the samples present in
+        the table and both metadata, and only the sources with at least one
+        such sample, instead of raising an error.
+
+    Returns
+    -------
+    tuple[pd.Index, pd.Index]
+        The sample ids, in sample metadata order, and the source ids, in
+        source metadata order, to keep.
+
+    Raises
+    ------
+    ValueError
+        If the ids do not agree and `auto_subset` is False, or if no samples
+        remain after subsetting.
+    '''
+    sample_ids = sample_sources.index
+    referenced_source_ids = pd.Index(sample_sources.unique())
+
+    missing_from_table = sample_ids.difference(table_sample_ids, sort=False)
+    missing_from_samples = table_sample_ids.difference(sample_ids, sort=False)
+    missing_from_sources = referenced_source_ids.difference(
+        source_ids, sort=False
+    )
+    sources_without_samples = source_ids.difference(
+        referenced_source_ids, sort=False
+    )
+
+    if ignore_extra_table_samples:
+        missing_from_samples = missing_from_samples[:0]
+
+    problems = [
+        (
+            missing_from_table,
+            'sample(s) in the sample metadata are missing from the feature '
+            'table'
+        ),
+        (
+            missing_from_samples,
+            'sample(s) in the feature table are missing from the sample '
+            'metadata'
+        ),
+        (
+            missing_from_sources,
+            'source(s) referenced by the sample metadata are missing from '
+            'the source metadata'
+        ),
+        (
+            sources_without_samples,
+            'source(s) in the source metadata have no samples'
+        ),
+    ]
+    problems = [(ids, message) for ids, message in problems if len(ids)]
+
+    if problems and not auto_subset:
+        details = '\n'.join(
+            f'  - {len(ids)} {message}: {_format_ids(ids)}'
+            for ids, message in problems
+        )
+        error_msg = (
+            'The feature table, sample metadata, and source metadata do not '
+            f'describe the same samples and sources:\n{details}\n'
+            'Please correct the inputs, or enable automatic subsetting to '
+            'keep only the matching samples and sources.'
+        )
+        raise ValueError(error_msg)
+
+    keep = (
+        sample_ids.isin(table_sample_ids) &
+        sample_sources.isin(source_ids).to_numpy()
+    )
+    kept_sample_ids = sample_ids[keep]
+    kept_source_ids = source_ids[
+        source_ids.isin(sample_sources[keep].unique())
+    ]
+
+    if kept_sample_ids.empty:
+        error_msg = (
+            'No samples are shared by the feature table, sample metadata, '
+            'and source metadata.'
+        )
+        raise ValueError(error_msg)
+
+    return kept_sample_ids, kept_source_ids
+
+
+def _comparison_groups(
+    source_df: pd.DataFrame, groups: list[str]
+) -> pd.DataFrame:
+    '''
+    Groups source ids by isotope and by the values of one or more
+    source-level metadata columns, as shown by qSIP2's
+    `show_comparison_groups`, with a single pandas groupby.
+
+    Parameters
+    ----------
+    source_df : pd.DataFrame
+        The source-level data, with 'source_mat_id' and 'isotope' columns.
+    groups : list[str]
+        The names of the source-level columns to group by.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per combination of `groups` values, with one column per
+        group followed by one column per isotope listing the comma-separated
+        ids of the matching sources.
+
+    Raises
+    ------
+    ValueError
+        If one or more of `groups` are not columns of `source_df`.
+    '''
+    missing_columns = [
+        group for group in groups if group not in source_df.columns
+    ]
+    if missing_columns:
+        error_msg = (
+            'The following grouping columns were not found in the source '
+            f'metadata: {", ".join(missing_columns)}. Available columns are: '
+            f'{", ".join(source_df.columns)}.'
+        )
+        raise ValueError(error_msg)
+
+    grouped = (
+        source_df
+        .assign(source_mat_id=source_df['source_mat_id'].astype(str))
+        .groupby(list(groups) + ['isotope'], sort=False, dropna=False)
+        ['source_mat_id']
+        .agg(', '.join)
+    )
+
+    comparison_df = grouped.unstack('isotope')
+    comparison_df.columns.name = None
+
+    return comparison_df.reset_index()
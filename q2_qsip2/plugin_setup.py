@@ -8,17 +8,27 @@
 
 import importlib
 
-from qiime2.plugin import Citations, Float, Int, List, Metadata, Plugin, Str
+from qiime2.plugin import (
+    Bool, Choices, Citations, Collection, Float, Int, List, Metadata, Plugin,
+    Range, Str
+)
+from q2_types.feature_data import FeatureData, Taxonomy
 from q2_types.feature_table import FeatureTable, Frequency
+from q2_types.metadata import ImmutableMetadata
 
 from q2_qsip2 import __version__
-from q2_qsip2.types import QSIP2Data, Unfiltered, Filtered, EAF
+from q2_qsip2.types import (
+    QSIP2Data, Unfiltered, Filtered, EAF, QSIP2GrowthRates
+)
 from q2_qsip2.workflow import (
-    create_qsip_data, subset_and_filter, resample_and_calculate_EAF
+    create_qsip_data, merge_qsip_data, detect_density_outliers,
+    subset_and_filter, resample_and_calculate_EAF, calculate_growth,
+    merge_eaf_shards, run_comparisons
 )
 from q2_qsip2.visualizers._visualizers import (
     plot_weighted_average_densities, plot_sample_curves, plot_density_outliers,
-    show_comparison_groups, plot_filtered_features, plot_excess_atom_fractions
+    show_comparison_groups, plot_filtered_features, plot_excess_atom_fractions,
+    qc_report
 )
 
 
@@ -40,7 +50,8 @@ plugin = Plugin(
 plugin.methods.register_function(
     function=create_qsip_data,
     inputs={
-        'table': FeatureTable[Frequency]
+        'table': FeatureTable[Frequency],
+        'taxonomy': FeatureData[Taxonomy],
     },
     parameters={
         'sample_metadata': Metadata,
@@ -51,12 +62,20 @@ plugin.methods.register_function(
         'gradient_position_column': Str,
         'gradient_pos_density_column': Str,
         'gradient_pos_amt_column': Str,
+        'precompute_tube_abundances': Bool,
+        'collapse_level': Int % Range(1, None),
+        'subset_samples': Bool,
+        'auto_subset': Bool,
     },
     outputs=[
         ('qsip_data', QSIP2Data[Unfiltered])
     ],
     input_descriptions={
-        'table': 'The qSIP feature table.'
+        'table': 'The qSIP feature table.',
+        'taxonomy': (
+            'The taxonomy of the features in `table`. Required if '
+            '`collapse_level` is provided.'
+        ),
     },
     parameter_descriptions={
         'sample_metadata': 'The sample-level metadata.',
@@ -67,6 +86,35 @@ plugin.methods.register_function(
         'gradient_position_column': 'The name of the gradient position column.',
         'gradient_pos_density_column': 'The name of the density column.',
         'gradient_pos_amt_column': 'The name of the amount column.',
+        'precompute_tube_abundances': (
+            'Whether to scale each fraction\'s relative abundances by its DNA '
+            'amount (`gradient_pos_amt`) up front, as a sparse matrix, and '
+            'store it with the qSIP2 data and every artifact derived from '
+            'it, so that python-side WAD and growth calculations reuse it '
+            'instead of recomputing it from the feature data.'
+        ),
+        'collapse_level': (
+            'The taxonomic level to collapse features to before building the '
+            'qSIP2 data, e.g. 6 for genus or 5 for family in a seven-rank '
+            'taxonomy. Reduces the number of features carried through '
+            'filtering, resampling, and EAF calculation when feature-level '
+            'resolution is not needed. Requires `taxonomy`.'
+        ),
+        'subset_samples': (
+            'Whether to read only the samples listed in the sample metadata, '
+            'and the features observed in them, from the feature table. '
+            'Useful when the qSIP samples are a small part of a larger '
+            'sequencing table, as the full table is never loaded into '
+            'memory. Samples in the table but not in the sample metadata are '
+            'ignored.'
+        ),
+        'auto_subset': (
+            'Whether to keep only the samples present in the feature table '
+            'and the sample metadata whose sources are in the source '
+            'metadata, and only the sources with at least one such sample. '
+            'By default any mismatch between these ids is an error, which is '
+            'reported before the feature table is loaded.'
+        ),
     },
     output_descriptions={
         'qsip_data': 'Placeholder.'
@@ -78,6 +126,73 @@ plugin.methods.register_function(
     citations=[]
 )
 
+plugin.methods.register_function(
+    function=merge_qsip_data,
+    inputs={
+        'qsip_data': List[QSIP2Data[Unfiltered]]
+    },
+    parameters={},
+    outputs=[
+        ('merged_qsip_data', QSIP2Data[Unfiltered])
+    ],
+    input_descriptions={
+        'qsip_data': (
+            'The unfiltered qSIP2 data to merge, e.g. one artifact per '
+            'sequencing run.'
+        )
+    },
+    parameter_descriptions={},
+    output_descriptions={
+        'merged_qsip_data': 'The merged unfiltered qSIP2 data.'
+    },
+    name='Merge unfiltered qSIP2 data.',
+    description=(
+        'Combines several unfiltered qSIP2 data artifacts by taking the union '
+        'of their sources, samples, and features. Sources may be shared '
+        'between inputs if their metadata agree, but each sample must be '
+        'present in exactly one input. Features absent from an input are '
+        'given zero abundance in its samples.'
+    ),
+    citations=[]
+)
+
+plugin.methods.register_function(
+    function=detect_density_outliers,
+    inputs={
+        'qsip_data': QSIP2Data[Unfiltered]
+    },
+    parameters={
+        'sensitivity': Float
+    },
+    outputs=[
+        ('outliers', ImmutableMetadata)
+    ],
+    input_descriptions={
+        'qsip_data': 'Your unfiltered qSIP2 data.'
+    },
+    parameter_descriptions={
+        'sensitivity': (
+            'Scales the Cook\'s distance threshold above which a sample is '
+            'called an outlier. The threshold is this value divided by the '
+            'number of samples in the source.'
+        )
+    },
+    output_descriptions={
+        'outliers': (
+            'A per-sample table of fitted densities, Cook\'s distances, and '
+            'outlier calls.'
+        )
+    },
+    name='Detect per-source density outliers.',
+    description=(
+        'Fits a linear model of density on gradient position for every '
+        'source and calculates each sample\'s Cook\'s distance. This is the '
+        'outlier detection performed by `plot-density-outliers`, without '
+        'rendering a plot.'
+    ),
+    citations=[]
+)
+
 plugin.methods.register_function(
     function=subset_and_filter,
     inputs={
@@ -135,6 +250,16 @@ plugin.methods.register_function(
     parameters={
         'resamples': Int,
         'random_seed': Int,
+        'deduplicate': Bool,
+        'block_size': Int % Range(1, None),
+        'max_memory': Str,
+        'checkpoint_dir': Str,
+        'feature_ids': List[Str],
+        'feature_metadata': Metadata,
+        'feature_metadata_where': Str,
+        'seeding': Str % Choices('run', 'feature'),
+        'shard_index': Int % Range(0, None),
+        'shard_count': Int % Range(1, None),
     },
     outputs=[
         ('eaf_qsip_data', QSIP2Data[EAF])
@@ -144,7 +269,87 @@ plugin.methods.register_function(
     },
     parameter_descriptions={
         'resamples': 'The number of bootstrap resamplings to perform.',
-        'random_seed': 'The random seed to use during resampling.',
+        'random_seed': (
+            'The random seed to use during resampling. With "feature" '
+            'seeding it must be a signed 64-bit integer.'
+        ),
+        'deduplicate': (
+            'Whether to resample and calculate EAF only once per group of '
+            'features with identical weighted average density profiles, '
+            'e.g. rare features with identical abundance patterns, and copy '
+            'the results to every feature in the group. Features in a group '
+            'share bootstrap replicates, so results differ from a run '
+            'without deduplication.'
+        ),
+        'block_size': (
+            'Features are resampled and have EAF calculated in blocks of '
+            'this many features (500 if neither this nor `max-memory` is '
+            'provided), each seeded independently from `random-seed`. '
+            'Results depend on the block size unless `seeding` is "feature". '
+            'Progress is reported after every block, and an interrupt '
+            '(Ctrl-C) stops the run once the current block has completed.'
+        ),
+        'max_memory': (
+            'A memory budget for resampling and EAF calculation, e.g. "4G" '
+            'or "512M". Peak memory grows with the number of features, '
+            'sources, and resamples, so features are processed in blocks '
+            'sized to stay under the budget, and the results are merged at '
+            'the end. The memory held by the filtered data itself counts '
+            'against the budget. The estimates and the chosen block size are '
+            'logged. With "run" seeding each block is seeded by its position, '
+            'so the results depend on the block size chosen from the budget; '
+            'use "feature" seeding for results that do not depend on it. Can '
+            'not be combined with `block-size`.'
+        ),
+        'checkpoint_dir': (
+            'A directory in which to save each completed block of features, '
+            'along with the seed of every block. If a run is interrupted, '
+            'rerunning it with the same inputs, parameters, and checkpoint '
+            'directory resumes from the last completed block and gives '
+            'results identical to an uninterrupted run.'
+        ),
+        'feature_ids': (
+            'If provided, only these features are resampled and have EAF '
+            'calculated, e.g. a few taxa of interest while tuning an '
+            'analysis. Each must be retained in the filtered qSIP2 data.'
+        ),
+        'feature_metadata': (
+            'If provided, only the features listed in this metadata (in '
+            'addition to any `feature-ids`) are resampled and have EAF '
+            'calculated. Features not retained by filtering are ignored.'
+        ),
+        'feature_metadata_where': (
+            'A SQLite WHERE clause selecting the features of '
+            '`feature-metadata` to use, e.g. "[Genus]=\'g__Nitrospira\'".'
+        ),
+        'seeding': (
+            'With "run", one seed is used for each block of features (and '
+            'shard), so a feature\'s bootstrap replicates depend on '
+            'the other features being resampled, the block size, and the '
+            'number of shards. With "feature", every feature draws '
+            'from its own random stream, keyed by `random-seed` and its id, '
+            'so results for a subset of features, in any order or split '
+            'across blocks or shards, are identical to those of the same '
+            'features in a full run. Features sharing a representative under '
+            '`deduplicate` use the representative\'s stream. "feature" '
+            'seeding resamples and calculates EAF for each feature with its '
+            'own qSIP2 calls, paying their fixed overhead once per feature, '
+            'so it is markedly slower than "run" seeding for many features.'
+        ),
+        'shard_index': (
+            'The zero-based position of the shard of features to resample, '
+            'see `shard-count`.'
+        ),
+        'shard_count': (
+            'The number of contiguous, near-equal shards the selected '
+            'features are split into. Only the features of shard '
+            '`shard-index` are resampled, so shards can be resampled '
+            'independently and combined with `merge-eaf-shards`. With "run" '
+            'seeding each shard is seeded from `random-seed` and its '
+            'position, so merged results are reproducible for a given number '
+            'of shards. Shards past the number of features hold no features. '
+            'Sharded runs can not be deduplicated.'
+        ),
     },
     output_descriptions={
         'eaf_qsip_data': (
@@ -159,6 +364,162 @@ plugin.methods.register_function(
     citations=[]
 )
 
+plugin.methods.register_function(
+    function=merge_eaf_shards,
+    inputs={
+        'eaf_qsip_data': List[QSIP2Data[EAF]]
+    },
+    parameters={},
+    outputs=[
+        ('merged_eaf_qsip_data', QSIP2Data[EAF])
+    ],
+    input_descriptions={
+        'eaf_qsip_data': (
+            'The EAF-calculated qSIP2 data of each shard, i.e. of disjoint '
+            'subsets of the features of one filtered qSIP2 data.'
+        )
+    },
+    parameter_descriptions={},
+    output_descriptions={
+        'merged_eaf_qsip_data': (
+            'The EAF-calculated qSIP2 data holding every shard\'s features.'
+        )
+    },
+    name='Merge EAF shards.',
+    description=(
+        'Merges EAF-calculated qSIP2 data that were resampled separately for '
+        'disjoint subsets of the features of one filtered qSIP2 data, e.g. '
+        'with the `shard-index` and `shard-count` parameters of '
+        'resample-and-calculate-EAF. Shards must share their sources and '
+        'filtering, and shards without features are skipped.'
+    ),
+    citations=[]
+)
+
+plugin.pipelines.register_function(
+    function=run_comparisons,
+    inputs={
+        'qsip_data': QSIP2Data[Unfiltered]
+    },
+    parameters={
+        'comparisons': Metadata,
+        'resamples': Int % Range(1, None),
+        'random_seed': Int,
+        'shards': Int % Range(1, None),
+    },
+    outputs=[
+        ('eaf_qsip_data', Collection[QSIP2Data[EAF]])
+    ],
+    input_descriptions={
+        'qsip_data': 'Your unfiltered qSIP2 data.'
+    },
+    parameter_descriptions={
+        'comparisons': (
+            'One row per comparison, with "unlabeled_sources" and '
+            '"labeled_sources" columns of comma-separated source ids. '
+            'Optional columns named after parameters of subset-and-filter '
+            'and resample-and-calculate-EAF, e.g. "min_labeled_sources" or '
+            '"resamples", override those parameters per comparison.'
+        ),
+        'resamples': (
+            'The number of bootstrap resamplings, unless set per comparison.'
+        ),
+        'random_seed': 'The random seed, unless set per comparison.',
+        'shards': (
+            'The number of independent resample-and-calculate-EAF actions '
+            'each comparison\'s features are split across. Sharded '
+            'comparisons can not be deduplicated. With "run" seeding their '
+            'results are reproducible for a given number of shards; set '
+            '"feature" seeding in a comparison for results that do not depend '
+            'on the number of shards, at a higher cost.'
+        ),
+    },
+    output_descriptions={
+        'eaf_qsip_data': (
+            'The EAF-calculated qSIP2 data of each comparison, keyed by '
+            'comparison id.'
+        )
+    },
+    name='Calculate EAF for many comparisons.',
+    description=(
+        'Filters, resamples, and calculates EAF for every comparison in a '
+        'metadata file. Each comparison, and each shard of its features, is '
+        'run as an independent action, so with --parallel the comparisons '
+        'run concurrently on a local thread or process executor, or on any '
+        'other configured parallel executor.'
+    ),
+    citations=[]
+)
+
+plugin.methods.register_function(
+    function=calculate_growth,
+    inputs={
+        'eaf_qsip_data': QSIP2Data[EAF],
+        'time_zero_table': FeatureTable[Frequency],
+    },
+    parameters={
+        'timepoint': Float % Range(0, None, inclusive_start=False),
+        'growth_model': Str % Choices('exponential', 'linear'),
+        'label_proportion': Float % Range(
+            0, 1, inclusive_start=False, inclusive_end=True
+        ),
+        'total_abundance_column': Str,
+        'labeled_sources': List[Str],
+    },
+    outputs=[
+        ('growth_rates', QSIP2GrowthRates)
+    ],
+    input_descriptions={
+        'eaf_qsip_data': 'Your qSIP2 data with EAF values calculated.',
+        'time_zero_table': (
+            'The absolute abundances (e.g. copies per gram) of the features '
+            'in the time-zero samples. Each feature\'s time-zero abundance is '
+            'its mean across these samples.'
+        ),
+    },
+    parameter_descriptions={
+        'timepoint': (
+            'The length of the incubation. Rates are expressed per unit of '
+            'this time.'
+        ),
+        'growth_model': (
+            'Whether to calculate per-capita rates under exponential growth '
+            'or absolute rates under linear growth.'
+        ),
+        'label_proportion': (
+            'The EAF of a copy built entirely from the labeled substrate, '
+            'i.e. the proportion of its atoms that can be derived from the '
+            'label.'
+        ),
+        'total_abundance_column': (
+            'The source-level metadata column holding the total absolute '
+            'abundance of each source, used to convert the relative '
+            'abundances of the labeled sources into absolute abundances.'
+        ),
+        'labeled_sources': (
+            'The ids of the labeled sources, whose abundances are averaged '
+            'at the end of the incubation. Each must be retained in the qSIP2 '
+            'data. By default, the retained sources labeled with 13C, 15N, or '
+            '18O in the source-level metadata are used.'
+        ),
+    },
+    output_descriptions={
+        'growth_rates': (
+            'Birth, death, and net growth rates, with one row per feature '
+            'for the observed EAF values (resample 0) and for each bootstrap '
+            'replicate.'
+        )
+    },
+    name='Calculate growth rates.',
+    description=(
+        'Calculates birth, death, and net growth rates for every feature '
+        'from its EAF values and its abundance at time zero and at the end '
+        'of the incubation, for the observed EAF values and all bootstrap '
+        'replicates at once.'
+    ),
+    citations=[]
+)
+
 plugin.visualizers.register_function(
     function=plot_weighted_average_densities,
     inputs={
@@ -240,6 +601,44 @@ plugin.visualizers.register_function(
     citations=[],
 )
 
+plugin.visualizers.register_function(
+    function=qc_report,
+    inputs={
+        'qsip_data': QSIP2Data[Unfiltered]
+    },
+    parameters={
+        'group': Str,
+        'groups': List[Str],
+        'n_jobs': Int % Range(1, None),
+    },
+    input_descriptions={
+        'qsip_data': 'The qsip data artifact.'
+    },
+    parameter_descriptions={
+        'group': (
+            'A source-level metadata column used to facet the plot of '
+            'weighted average densities.'
+        ),
+        'groups': (
+            'The names of one or more source-level metadata columns used to '
+            'group sources in the comparison groups table. The table is '
+            'omitted if not provided.'
+        ),
+        'n_jobs': (
+            'The number of worker processes used to render the figures. '
+            'Each worker starts its own R session, which is not covered by '
+            'R profiling.'
+        ),
+    },
+    name='Quality control report.',
+    description=(
+        'Renders the weighted average density, per-source density curve, '
+        'and density outlier plots, and optionally the comparison groups '
+        'table, as a single tabbed report from one load of the data.'
+    ),
+    citations=[],
+)
+
 plugin.visualizers.register_function(
     function=plot_filtered_features,
     inputs={
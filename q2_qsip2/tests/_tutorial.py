@@ -0,0 +1,56 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+import pandas as pd
+from rpy2.robjects.methods import RS4
+
+import importlib.resources
+
+import qiime2
+
+from q2_qsip2.workflow import create_qsip_data, subset_and_filter
+
+
+# the sources of the tutorial comparison
+UNLABELED_SOURCES = ['S149', 'S150', 'S151', 'S152']
+LABELED_SOURCES = ['S178', 'S179', 'S180']
+
+
+def tutorial_qsip_object(**kwargs) -> RS4:
+    '''
+    Builds the unfiltered "qsip_data" object of the tutorial data, passing
+    `kwargs` on to `create_qsip_data`.
+    '''
+    data_dir = importlib.resources.files('q2_qsip2.types.tests') / 'data'
+
+    source_md = qiime2.Metadata(
+        pd.read_csv(data_dir / 'source.tsv', sep='\t', index_col=0)
+    )
+    sample_md = qiime2.Metadata(
+        pd.read_csv(data_dir / 'sample.tsv', sep='\t', index_col=0)
+    )
+    table_df = pd.read_csv(data_dir / 'feature.tsv', sep='\t', index_col=0)
+    table = biom.Table(
+        table_df.values,
+        observation_ids=table_df.index,
+        sample_ids=table_df.columns,
+    )
+
+    return create_qsip_data(table, sample_md, source_md, **kwargs)
+
+
+def tutorial_filtered_qsip_object(**kwargs) -> RS4:
+    '''
+    Filters the tutorial data for the tutorial comparison.
+    '''
+    return subset_and_filter(
+        tutorial_qsip_object(**kwargs),
+        unlabeled_sources=UNLABELED_SOURCES,
+        labeled_sources=LABELED_SOURCES,
+    )
@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+from biom.util import biom_open
+import numpy as np
+
+from pathlib import Path
+import tempfile
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._biom_io import _consecutive_runs, _read_biom_samples
+
+
+class BiomIOTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def setUp(self):
+        super().setUp()
+
+        self.table = biom.Table(
+            np.array([
+                [1, 0, 0, 4, 0],
+                [0, 2, 0, 0, 0],
+                [0, 0, 3, 0, 5],
+                [0, 0, 0, 0, 0],
+            ]),
+            observation_ids=['f1', 'f2', 'f3', 'f4'],
+            sample_ids=['a', 'b', 'c', 'd', 'e'],
+        )
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.fp = Path(self.tempdir.name) / 'feature-table.biom'
+        with biom_open(str(self.fp), 'w') as fh:
+            self.table.to_hdf5(fh, 'test')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        super().tearDown()
+
+    def test_consecutive_runs(self):
+        positions = np.array([0, 1, 2, 5, 6, 9])
+
+        runs = _consecutive_runs(positions, 2)
+
+        self.assertEqual(
+            [list(positions[run]) for run in runs],
+            [[0, 1], [2], [5, 6], [9]]
+        )
+
+    def test_read_biom_samples(self):
+        for chunk_size in (1, 2, 1000):
+            obs = _read_biom_samples(self.fp, ['e', 'a', 'd'], chunk_size)
+
+            self.assertEqual(list(obs.ids('sample')), ['e', 'a', 'd'])
+            self.assertEqual(list(obs.ids('observation')), ['f1', 'f3'])
+            np.testing.assert_array_equal(
+                obs.matrix_data.toarray(),
+                np.array([
+                    [0, 1, 4],
+                    [5, 0, 0],
+                ])
+            )
+
+    def test_read_biom_samples_missing_sample(self):
+        with self.assertRaisesRegex(ValueError, 'not found.*x'):
+            _read_biom_samples(self.fp, ['a', 'x'])
@@ -0,0 +1,197 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import biom
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+import tempfile
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._compact import (
+    CompactFeatureTable, CompactTables, TableSubsets, _subset_rows
+)
+
+
+class CompactFeatureTableTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def table(self):
+        return biom.Table(
+            np.array([
+                [0, 3, 0],
+                [1, 0, 2],
+                [0, 0, 0],
+            ]),
+            observation_ids=['f1', 'f2', 'f3'],
+            sample_ids=['a', 'b', 'c'],
+        )
+
+    def test_from_biom(self):
+        compact = CompactFeatureTable.from_biom(self.table())
+
+        self.assertEqual(compact.shape, (3, 3))
+        self.assertEqual(len(compact.abundances), 3)
+        self.assertEqual(compact.abundances.dtype, np.float64)
+        np.testing.assert_array_equal(
+            compact.to_sparse().toarray(), self.table().matrix_data.toarray()
+        )
+
+    def test_to_wide_dataframe(self):
+        df = CompactFeatureTable.from_biom(self.table()).to_wide_dataframe()
+
+        exp = pd.DataFrame({
+            'feature_id': ['f1', 'f2', 'f3'],
+            'a': [0.0, 1.0, 0.0],
+            'b': [3.0, 0.0, 0.0],
+            'c': [0.0, 2.0, 0.0],
+        })
+        pd.testing.assert_frame_equal(df, exp, check_dtype=False)
+
+    def test_wide_dataframe_round_trip(self):
+        df = CompactFeatureTable.from_biom(self.table()).to_wide_dataframe(
+            'ASV'
+        )
+
+        round_tripped = CompactFeatureTable.from_wide_dataframe(
+            df, id_column='ASV'
+        ).to_wide_dataframe('ASV')
+
+        pd.testing.assert_frame_equal(df, round_tripped)
+
+    def test_abundances_are_exact(self):
+        # neither value is representable in single precision
+        df = pd.DataFrame({
+            'feature_id': ['f1', 'f2'],
+            'a': [16777217.0, 0.0],
+            'b': [0.0, 1 / 3],
+        })
+
+        round_tripped = CompactFeatureTable.from_wide_dataframe(
+            df
+        ).to_wide_dataframe()
+
+        pd.testing.assert_frame_equal(round_tripped, df)
+
+    def test_save_and_load(self):
+        compact = CompactFeatureTable.from_biom(self.table())
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'feature-data.npz'
+            compact.save(fp)
+            loaded = CompactFeatureTable.load(fp)
+
+        for name in CompactFeatureTable.ARRAYS:
+            np.testing.assert_array_equal(
+                getattr(loaded, name), getattr(compact, name)
+            )
+
+    def test_smaller_than_wide_layout(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.poisson(0.05, size=(500, 100))
+        table = biom.Table(
+            matrix,
+            observation_ids=[f'ASV{i}' for i in range(500)],
+            sample_ids=[f'sample{i}' for i in range(100)],
+        )
+
+        compact = CompactFeatureTable.from_biom(table)
+        wide_df = compact.to_wide_dataframe()
+
+        self.assertLess(
+            compact.nbytes, wide_df.memory_usage(deep=True).sum() / 4
+        )
+
+
+class TableSubsetsTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def upstream(self):
+        return pd.DataFrame({
+            'feature_id': ['f1', 'f1', 'f2', 'f3', 'f3'],
+            'sample_id': ['a', 'b', 'a', 'b', 'b'],
+            'abundance': [0.5, 0.25, 0.125, 1.0, 1.0],
+        })
+
+    def test_subset_rows(self):
+        upstream = self.upstream()
+        table = upstream.iloc[[3, 0, 4]][['abundance', 'feature_id']]
+
+        rows = _subset_rows(table.reset_index(drop=True), upstream)
+
+        # the repeated row is paired with each of its copies once
+        np.testing.assert_array_equal(rows, [3, 0, 4])
+
+    def test_subset_rows_not_a_subset(self):
+        upstream = self.upstream()
+
+        changed = upstream.iloc[[0, 2]].reset_index(drop=True)
+        changed.loc[1, 'abundance'] = 0.126
+        self.assertIsNone(_subset_rows(changed, upstream))
+
+        extra_column = upstream.assign(n_fractions=1)
+        self.assertIsNone(_subset_rows(extra_column, upstream))
+
+        repeated = upstream.iloc[[1, 1]].reset_index(drop=True)
+        self.assertIsNone(_subset_rows(repeated, upstream))
+
+    def test_save_and_load(self):
+        subsets = TableSubsets(
+            [('filtered_feature_data',), ('filter_results', 'kept')],
+            [('feature_data', 'data'), ('tube_rel_abundance',)],
+            [np.array([2, 0]), np.array([], dtype=int)],
+            [['feature_id', 'a'], ['feature_id']],
+        )
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'table-subsets.npz'
+            subsets.save(fp)
+            loaded = TableSubsets.load(fp)
+
+        self.assertEqual(loaded.paths, subsets.paths)
+        self.assertEqual(loaded.upstreams, subsets.upstreams)
+        for obs, exp in zip(loaded.rows, subsets.rows):
+            np.testing.assert_array_equal(obs, exp)
+        for obs, exp in zip(loaded.columns, subsets.columns):
+            np.testing.assert_array_equal(obs, exp)
+
+
+class CompactTablesTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_save_and_load(self):
+        tables = CompactTables(
+            [('tube_rel_abundance',), ('resamples', 'data')],
+            [['feature_id', 'tube_rel_abundance'], ['resample', 'keep']],
+            [['character', 'double'], ['integer', 'logical']],
+            [
+                [np.array([0, 0, 1, -1]), np.array([0.5, 0.25, 1.0, 0.0])],
+                [np.array([1, 2], dtype=np.int32), np.array([1, 0])],
+            ],
+            [[['f1', 'f2'], []], [[], []]],
+        )
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'compact-tables.npz'
+            tables.save(fp)
+            loaded = CompactTables.load(fp)
+
+        self.assertEqual(loaded.paths, tables.paths)
+        for name in ('names', 'kinds'):
+            for obs, exp in zip(getattr(loaded, name), getattr(tables, name)):
+                np.testing.assert_array_equal(obs, exp)
+        for name in ('values', 'dictionaries'):
+            for obs_table, exp_table in zip(
+                getattr(loaded, name), getattr(tables, name)
+            ):
+                self.assertEqual(len(obs_table), len(exp_table))
+                for obs, exp in zip(obs_table, exp_table):
+                    np.testing.assert_array_equal(obs, exp)
+                    self.assertEqual(obs.dtype, exp.dtype)
@@ -0,0 +1,182 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+import os
+from pathlib import Path
+import tempfile
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._comparisons import (
+    WORKER_DIED_ERROR, Comparison, ComparisonResult, _artifact_filename,
+    _check_artifact_filenames, _parse_comparisons, _parse_parameter,
+    _read_manifest, _run_all, _split_ids, _write_summary
+)
+
+
+def _initialize_nothing():
+    pass
+
+
+def _run_or_die(comparison, output_dir):
+    '''
+    Stands in for `_run_comparison` in worker processes: kills its worker
+    for comparisons whose id starts with "dies".
+    '''
+    if comparison.comparison_id.startswith('dies'):
+        os._exit(1)
+
+    return ComparisonResult(
+        comparison.comparison_id, Path(output_dir) / 'out.qza', None
+    )
+
+
+class ComparisonsTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_split_ids(self):
+        self.assertEqual(_split_ids('S1, S2,,S3 '), ['S1', 'S2', 'S3'])
+        self.assertEqual(_split_ids('S1'), ['S1'])
+        self.assertEqual(_split_ids(149.0), ['149'])
+
+    def test_parse_parameter_bool(self):
+        for value in ['true', ' Yes', '1', 1.0, True]:
+            self.assertIs(_parse_parameter(value, bool), True)
+        for value in ['FALSE', 'no', '0', 0.0, False]:
+            self.assertIs(_parse_parameter(value, bool), False)
+
+    def test_parse_parameter_bool_invalid(self):
+        for value in ['ture', '2', 'nan', '']:
+            with self.assertRaisesRegex(ValueError, '"deduplicate"'):
+                _parse_parameter(value, bool, 'deduplicate')
+
+    def test_read_manifest(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'comparisons.tsv'
+            fp.write_text(
+                '# comparisons\n'
+                'id\tunlabeled_sources\tlabeled_sources\tresamples\n'
+                '#q2:types\tcategorical\tcategorical\tnumeric\n'
+                'c1\t0149,150\t178\t100\n'
+                'c2\tS1\tS2\t\n'
+            )
+
+            comparisons = _parse_comparisons(_read_manifest(fp))
+
+        self.assertEqual(comparisons, [
+            Comparison('c1', ['0149', '150'], ['178'], {}, {'resamples': 100}),
+            Comparison('c2', ['S1'], ['S2'], {}, {}),
+        ])
+
+    def test_parse_comparisons(self):
+        manifest_df = pd.DataFrame(
+            {
+                'unlabeled-sources': ['S1,S2', 'S3'],
+                'labeled-sources': ['S4', 'S5,S6'],
+                'resamples': [100.0, np.nan],
+                'min_labeled_sources': ['2', ''],
+                'deduplicate': ['true', 'false'],
+            },
+            index=pd.Index(['c1', 'c2'], name='id'),
+        )
+
+        obs = _parse_comparisons(manifest_df)
+
+        exp = [
+            Comparison(
+                'c1', ['S1', 'S2'], ['S4'],
+                {'min_labeled_sources': 2},
+                {'resamples': 100, 'deduplicate': True},
+            ),
+            Comparison(
+                'c2', ['S3'], ['S5', 'S6'], {}, {'deduplicate': False},
+            ),
+        ]
+        self.assertEqual(obs, exp)
+        self.assertIsInstance(obs[0].eaf_parameters['resamples'], int)
+
+    def test_parse_comparisons_bad_columns(self):
+        manifest_df = pd.DataFrame(
+            {'labeled_sources': ['S4'], 'iterations': [10]},
+            index=['c1'],
+        )
+
+        with self.assertRaisesRegex(
+            ValueError, 'Missing columns: unlabeled_sources.*'
+            'Unrecognized columns: iterations'
+        ):
+            _parse_comparisons(manifest_df)
+
+    def test_parse_comparisons_empty_sources(self):
+        manifest_df = pd.DataFrame(
+            {'unlabeled_sources': ['S1'], 'labeled_sources': [' , ']},
+            index=['c1'],
+        )
+
+        with self.assertRaisesRegex(ValueError, '"c1".*one labeled source'):
+            _parse_comparisons(manifest_df)
+
+    def test_artifact_filename(self):
+        self.assertEqual(_artifact_filename('c1'), 'c1.qza')
+        self.assertEqual(_artifact_filename('soil/13C'), 'soil_13C.qza')
+        self.assertEqual(_artifact_filename('.hidden'), '_.hidden.qza')
+        self.assertEqual(_artifact_filename('a b:c'), 'a_b_c.qza')
+
+    def test_check_artifact_filenames(self):
+        comparisons = [
+            Comparison(id_, ['S1'], ['S2'], {}, {})
+            for id_ in ('a/b', 'a_b')
+        ]
+
+        with self.assertRaisesRegex(ValueError, '"a/b" and "a_b".*a_b.qza'):
+            _check_artifact_filenames(comparisons)
+
+    def test_run_all_survives_dead_workers(self):
+        comparisons = [
+            Comparison(id_, ['S1'], ['S2'], {}, {})
+            for id_ in ('c1', 'dies1', 'c2', 'c3', 'dies2')
+        ]
+        results = []
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            _run_all(
+                comparisons,
+                Path(tempdir),
+                2,
+                results.append,
+                initializer=_initialize_nothing,
+                run=_run_or_die,
+            )
+
+        errors = {result.comparison_id: result.error for result in results}
+        self.assertEqual(len(results), len(comparisons))
+        self.assertEqual(errors, {
+            'c1': None,
+            'c2': None,
+            'c3': None,
+            'dies1': WORKER_DIED_ERROR,
+            'dies2': WORKER_DIED_ERROR,
+        })
+
+    def test_write_summary(self):
+        results = [
+            ComparisonResult('c1', Path('c1.qza'), None),
+            ComparisonResult('c2', None, 'Traceback:\nValueError: bad\n'),
+        ]
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'comparisons.tsv'
+            _write_summary(results, fp)
+            obs = pd.read_csv(fp, sep='\t', keep_default_na=False)
+
+        self.assertEqual(list(obs['status']), ['succeeded', 'failed'])
+        self.assertEqual(list(obs['artifact']), ['c1.qza', ''])
+        self.assertEqual(list(obs['error']), ['', 'ValueError: bad'])
@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._engines import (
+    _compare_eaf, _compare_wads, _filtered_wads, _python_filtered_wads,
+    compare_engines
+)
+from q2_qsip2.tests._tutorial import (
+    LABELED_SOURCES, UNLABELED_SOURCES, tutorial_qsip_object
+)
+from q2_qsip2.workflow import subset_and_filter
+
+
+class EngineTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_compare_wads(self):
+        reference = pd.DataFrame({
+            'feature_id': ['f1', 'f1', 'f2'],
+            'source_mat_id': ['s1', 's2', 's1'],
+            'WAD': [1.70, 1.72, 1.74],
+        })
+        candidate = pd.DataFrame({
+            'feature_id': ['f2', 'f1', 'f1'],
+            'source_mat_id': ['s1', 's2', 's1'],
+            'WAD': [1.74, 1.72 * (1 + 1e-12), 1.70],
+        })
+
+        max_difference, agrees = _compare_wads(reference, candidate)
+        self.assertTrue(agrees)
+        self.assertLess(max_difference, 1e-11)
+
+        # a missing or an extra feature-source pair is a disagreement
+        self.assertEqual(
+            _compare_wads(reference, candidate.iloc[1:]), (np.inf, False)
+        )
+        extra = pd.concat([candidate, pd.DataFrame({
+            'feature_id': ['f3'], 'source_mat_id': ['s1'], 'WAD': [1.71],
+        })])
+        self.assertEqual(_compare_wads(reference, extra), (np.inf, False))
+        candidate.loc[0, 'WAD'] = 1.75
+        self.assertFalse(_compare_wads(reference, candidate)[1])
+
+    def eaf_df(self, rng, shift=0.0):
+        n = 200
+        return pd.DataFrame({
+            'feature_id': np.repeat(['f1', 'f2'], n),
+            'resample': np.tile(np.arange(1, n + 1), 2),
+            'EAF': np.concatenate([
+                rng.normal(0.2 + shift, 0.05, n),
+                rng.normal(0.0 + shift, 0.05, n),
+            ]),
+            'observed_EAF': np.repeat([0.2, 0.0], n),
+        })
+
+    def test_compare_eaf(self):
+        rng = np.random.default_rng(0)
+        reference = self.eaf_df(rng)
+
+        self.assertTrue(_compare_eaf(reference, self.eaf_df(rng))[1])
+        self.assertFalse(
+            _compare_eaf(reference, self.eaf_df(rng, shift=0.1))[1]
+        )
+
+        changed_observed = self.eaf_df(rng)
+        changed_observed['observed_EAF'] += 0.01
+        self.assertFalse(_compare_eaf(reference, changed_observed)[1])
+
+    def test_python_filter_matches_qsip2_filter(self):
+        qsip_object = tutorial_qsip_object()
+        parameters = {
+            'min_unlabeled_sources': 3,
+            'min_labeled_sources': 2,
+            'min_unlabeled_fractions': 3,
+            'min_labeled_fractions': 2,
+        }
+
+        reference = _filtered_wads(subset_and_filter(
+            qsip_object,
+            unlabeled_sources=UNLABELED_SOURCES,
+            labeled_sources=LABELED_SOURCES,
+            **parameters,
+        ))
+        candidate = _python_filtered_wads(
+            qsip_object, UNLABELED_SOURCES, LABELED_SOURCES, **parameters
+        )
+
+        self.assertFalse(reference.empty)
+        self.assertTrue(_compare_wads(reference, candidate)[1])
+
+    def test_engines_agree_on_tutorial_data(self):
+        results = compare_engines(
+            tutorial_qsip_object(),
+            unlabeled_sources=UNLABELED_SOURCES,
+            labeled_sources=LABELED_SOURCES,
+            resamples=50,
+        )
+
+        self.assertEqual(
+            set(results['stage']),
+            {'filter', 'resample_and_calculate_EAF'},
+        )
+        self.assertEqual(
+            list(results.loc[results['stage'] == 'filter', 'engine']),
+            ['qsip2', 'python'],
+        )
+        self.assertTrue(
+            results['agrees'].all(),
+            results[~results['agrees']].to_string(),
+        )
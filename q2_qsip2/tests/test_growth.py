@@ -0,0 +1,199 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+import tempfile
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._growth import (
+    _eaf_matrix, _growth_metadata, _growth_rates, _growth_table,
+    _labeled_abundances, _labeled_sources, _load_growth_table,
+    _save_growth_table
+)
+from q2_qsip2._wads import _tube_abundances
+
+
+class GrowthTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def setUp(self):
+        super().setUp()
+
+        self.eaf_df = pd.DataFrame({
+            'feature_id': ['f1', 'f1', 'f2', 'f2'],
+            'resample': [1, 2, 1, 2],
+            'EAF': [0.2, 0.3, 0.0, 0.1],
+            'observed_EAF': [0.25, 0.25, 0.05, 0.05],
+        })
+
+    def test_eaf_matrix(self):
+        feature_ids, eaf = _eaf_matrix(self.eaf_df)
+
+        self.assertEqual(list(feature_ids), ['f1', 'f2'])
+        np.testing.assert_allclose(eaf, [
+            [0.25, 0.2, 0.3],
+            [0.05, 0.0, 0.1],
+        ])
+
+    def test_eaf_matrix_missing_replicate(self):
+        feature_ids, eaf = _eaf_matrix(self.eaf_df.drop(index=3))
+
+        self.assertTrue(np.isnan(eaf[1, 2]))
+        self.assertEqual(eaf[1, 1], 0.0)
+
+    def test_eaf_matrix_sorts_resamples_numerically(self):
+        eaf_df = pd.DataFrame({
+            'feature_id': ['f1'] * 3,
+            'resample': ['10', '2', '1'],
+            'EAF': [0.10, 0.02, 0.01],
+            'observed_EAF': [0.5] * 3,
+        })
+
+        _, eaf = _eaf_matrix(eaf_df)
+
+        np.testing.assert_allclose(eaf, [[0.5, 0.01, 0.02, 0.10]])
+
+    def test_labeled_sources(self):
+        source_df = pd.DataFrame({
+            'source_mat_id': ['A', 'B', 'C', 'D'],
+            'isotope': ['13C', '12C', '18O', '13C'],
+        })
+        retained = pd.Index(['A', 'B', 'C'])
+
+        obs = _labeled_sources(source_df, retained)
+        self.assertEqual(list(obs['source_mat_id']), ['A', 'C'])
+
+        obs = _labeled_sources(source_df, retained, ['B'])
+        self.assertEqual(list(obs['source_mat_id']), ['B'])
+
+    def test_labeled_sources_not_retained(self):
+        source_df = pd.DataFrame({
+            'source_mat_id': ['A', 'B'], 'isotope': ['12C', '13C'],
+        })
+
+        with self.assertRaisesRegex(ValueError, 'not retained.*: B'):
+            _labeled_sources(source_df, pd.Index(['A']), ['A', 'B'])
+
+        with self.assertRaisesRegex(ValueError, 'None of the sources'):
+            _labeled_sources(source_df, pd.Index(['A']))
+
+    def test_exponential_growth_rates(self):
+        eaf = np.array([[0.25, 0.5], [0.0, 0.1]])
+        n_total_i0 = np.array([100.0, 50.0])
+        n_total_it = np.array([200.0, 40.0])
+
+        rates = _growth_rates(eaf, n_total_i0, n_total_it, timepoint=2.0)
+
+        n_light = n_total_it[:, np.newaxis] * (1 - eaf)
+        exp_birth = np.log(n_total_it[:, np.newaxis] / n_light) / 2.0
+        exp_death = np.log(n_light / n_total_i0[:, np.newaxis]) / 2.0
+
+        np.testing.assert_allclose(rates['N_light_it'], n_light)
+        np.testing.assert_allclose(rates['birth_rate'], exp_birth)
+        np.testing.assert_allclose(rates['death_rate'], exp_death)
+        np.testing.assert_allclose(
+            rates['net_growth_rate'],
+            np.log(n_total_it / n_total_i0)[:, np.newaxis] / 2.0
+            * np.ones_like(eaf),
+        )
+
+    def test_linear_growth_rates(self):
+        eaf = np.array([[0.3]])
+
+        rates = _growth_rates(
+            eaf, np.array([100.0]), np.array([200.0]), timepoint=4.0,
+            growth_model='linear', label_proportion=0.6,
+        )
+
+        np.testing.assert_allclose(rates['N_light_it'], [[100.0]])
+        np.testing.assert_allclose(rates['birth_rate'], [[25.0]])
+        np.testing.assert_allclose(rates['death_rate'], [[0.0]])
+        np.testing.assert_allclose(rates['net_growth_rate'], [[25.0]])
+
+    def test_undefined_growth_rates_are_nan(self):
+        rates = _growth_rates(
+            np.array([[0.1], [1.0]]), np.array([0.0, 10.0]),
+            np.array([10.0, 10.0]), timepoint=1.0,
+        )
+
+        self.assertTrue(np.isnan(rates['death_rate'][0, 0]))
+        self.assertTrue(np.isfinite(rates['birth_rate'][0, 0]))
+        self.assertTrue(np.isnan(rates['birth_rate'][1, 0]))
+
+    def test_labeled_abundances(self):
+        feature_df = pd.DataFrame({
+            'feature_id': ['f1', 'f2'],
+            'a1': [1, 3], 'a2': [1, 1],
+            'b1': [2, 2],
+            'c1': [5, 0],
+        })
+        sample_df = pd.DataFrame({
+            'sample_id': ['a1', 'a2', 'b1', 'c1'],
+            'source_mat_id': ['A', 'A', 'B', 'C'],
+            'gradient_pos_amt': [1.0, 3.0, 1.0, 1.0],
+        })
+        source_df = pd.DataFrame({
+            'source_mat_id': ['A', 'B'],
+            'total_abundance': [1000.0, 200.0],
+        })
+
+        feature_df.set_index('feature_id', inplace=True)
+        tube_abundances = _tube_abundances(
+            feature_df.to_numpy(), sample_df['gradient_pos_amt']
+        )
+
+        obs = _labeled_abundances(
+            tube_abundances, feature_df.index, feature_df.columns,
+            sample_df, source_df, 'total_abundance'
+        )
+
+        # A: f1 = (0.25 * 1 + 0.5 * 3) / 4, B: f1 = 0.5
+        exp = pd.Series(
+            [
+                (1000 * 1.75 / 4 + 200 * 0.5) / 2,
+                (1000 * 2.25 / 4 + 200 * 0.5) / 2,
+            ],
+            index=pd.Index(['f1', 'f2'], name='feature_id'),
+        )
+
+        pd.testing.assert_series_equal(obs, exp)
+
+    def test_growth_table_save_and_load(self):
+        feature_ids, eaf = _eaf_matrix(self.eaf_df)
+        n_total_i0 = np.array([100.0, 50.0])
+        n_total_it = np.array([200.0, 40.0])
+        rates = _growth_rates(eaf, n_total_i0, n_total_it, timepoint=1.0)
+
+        df = _growth_table(feature_ids, eaf, n_total_i0, n_total_it, rates)
+
+        self.assertEqual(len(df), 6)
+        self.assertEqual(list(df['resample']), [0, 1, 2, 0, 1, 2])
+        self.assertEqual(list(df['feature_id']), ['f1'] * 3 + ['f2'] * 3)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'growth-rates.npz'
+            _save_growth_table(df, fp)
+
+            pd.testing.assert_frame_equal(_load_growth_table(fp), df)
+
+    def test_growth_metadata(self):
+        df = pd.DataFrame({
+            'feature_id': ['f-1', 'f-1', 'f'],
+            'resample': [0, 1, 0],
+            'EAF': [0.1, 0.2, 0.3],
+        })
+
+        obs = _growth_metadata(df)
+
+        self.assertEqual(list(obs.index), ['f-1-0', 'f-1-1', 'f-0'])
+        self.assertEqual(obs.index.name, 'id')
+        pd.testing.assert_frame_equal(obs.reset_index(drop=True), df)
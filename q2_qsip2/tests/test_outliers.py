@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._outliers import _density_outliers
+
+
+class OutlierTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def sample_df(self):
+        positions = [1, 2, 3, 4, 5, 6] * 2
+        densities = [
+            1.780, 1.775, 1.771, 1.766, 1.760, 1.700,
+            1.790, 1.786, 1.779, 1.775, 1.771, 1.765,
+        ]
+
+        return pd.DataFrame({
+            'sample_id': [f'f{i}' for i in range(12)],
+            'source_mat_id': ['s1'] * 6 + ['s2'] * 6,
+            'gradient_position': positions,
+            'gradient_pos_density': densities,
+        })
+
+    def test_density_outliers_matches_per_source_fit(self):
+        sample_df = self.sample_df()
+
+        outlier_df = _density_outliers(sample_df)
+
+        for _, source_df in sample_df.groupby('source_mat_id'):
+            X = np.column_stack([
+                np.ones(len(source_df)), source_df['gradient_position']
+            ])
+            y = source_df['gradient_pos_density'].to_numpy()
+
+            hat = X @ np.linalg.inv(X.T @ X) @ X.T
+            residuals = y - hat @ y
+            mse = residuals @ residuals / (len(y) - 2)
+            leverages = np.diag(hat)
+            exp = (
+                residuals ** 2 / (2 * mse) * leverages / (1 - leverages) ** 2
+            )
+
+            obs = outlier_df.loc[source_df['sample_id'], 'cooks_distance']
+            np.testing.assert_allclose(obs, exp)
+
+    def test_density_outliers_flags_outlier(self):
+        outlier_df = _density_outliers(self.sample_df())
+
+        self.assertEqual(
+            list(outlier_df.index[outlier_df['outlier'] == 'True']), ['f5']
+        )
+
+    def test_density_outliers_small_source(self):
+        sample_df = self.sample_df().iloc[:8]
+
+        small_source_df = _density_outliers(sample_df).loc[['f6', 'f7']]
+
+        self.assertTrue(small_source_df['cooks_distance'].isna().all())
+        self.assertTrue((small_source_df['outlier'] == 'False').all())
@@ -0,0 +1,89 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from collections import Counter
+from pathlib import Path
+import tempfile
+from unittest import mock
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2 import _profiling
+from q2_qsip2._profiling import _parse_rprof, _rprof, _write_collapsed
+
+
+class ProfilingTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_parse_rprof(self):
+        lines = [
+            'memory profiling: sample.interval=10000\n',
+            ':1000:0:50:0:"mean" "run_resampling"\n',
+            ':1500:0:60:0:"mean" "run_resampling"\n',
+            ':1200:1000:60:0:"quantile" "run_EAF_calculations"\n',
+            ':1200:1000:60:0:\n',
+            ':3000:1000:60:0:"[.data.frame" "run_EAF_calculations"\n',
+        ]
+
+        samples, memory = _parse_rprof(lines)
+
+        self.assertEqual(samples, Counter({
+            'run_resampling;mean': 2,
+            'run_EAF_calculations;quantile': 1,
+            'run_EAF_calculations;[.data.frame': 1,
+        }))
+        self.assertEqual(memory, Counter({
+            'run_resampling;mean': 500,
+            'run_EAF_calculations;quantile': 700,
+            'run_EAF_calculations;[.data.frame': 1800,
+        }))
+
+    def test_parse_rprof_empty(self):
+        samples, memory = _parse_rprof(
+            ['memory profiling: sample.interval=10000\n']
+        )
+
+        self.assertEqual(samples, Counter())
+        self.assertEqual(memory, Counter())
+
+    def test_write_collapsed(self):
+        stacks = Counter({'a;b': 1, 'a;c': 3})
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'profile.collapsed'
+            _write_collapsed(stacks, fp)
+
+            self.assertEqual(fp.read_text(), 'a;c 3\na;b 1\n')
+
+    def test_rprof_nested_is_profiled_once(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            with mock.patch.object(_profiling, 'ro') as ro:
+                with _rprof('outer', tempdir):
+                    with _rprof('inner', tempdir):
+                        pass
+
+            # R's profiler is started and stopped once, by the outer block
+            self.assertEqual(ro.r['Rprof'].call_count, 2)
+            self.assertEqual(
+                [fp.suffix for fp in sorted(Path(tempdir).iterdir())],
+                ['.Rprof', '.collapsed', '.collapsed'],
+            )
+        self.assertFalse(_profiling._profiling_lock.locked())
+
+    def test_rprof_write_failure_is_logged(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            with mock.patch.object(_profiling, 'ro'), mock.patch.object(
+                _profiling, '_write_profiles', side_effect=OSError('full')
+            ):
+                with self.assertLogs('q2_qsip2', level='WARNING') as logs:
+                    with self.assertRaisesRegex(ValueError, 'action'):
+                        with _rprof('failing', tempdir):
+                            raise ValueError('action')
+
+        self.assertIn('full', logs.output[0])
+        self.assertFalse(_profiling._profiling_lock.locked())
@@ -0,0 +1,138 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import contextlib
+import io
+import os
+import signal
+from unittest import mock
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._progress import (
+    ProgressReport, _Progress, _cooperative_cancellation, _inform,
+    _run_as_single_chunk, logger
+)
+
+
+class ProgressTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_report_throughput_and_eta(self):
+        report = ProgressReport(
+            stage='Resampling',
+            features_done=100,
+            total_features=400,
+            replicates_done=100_000,
+            elapsed=10.0,
+        )
+
+        self.assertEqual(report.throughput, 10.0)
+        self.assertEqual(report.eta, 30.0)
+        self.assertIn('100/400 features', str(report))
+        self.assertIn('100000 replicates', str(report))
+        self.assertIn('ETA 0:00:30', str(report))
+
+    def test_report_eta_unknown_before_first_chunk(self):
+        report = ProgressReport('Resampling', 0, 400, 0, 1.0)
+
+        self.assertIsNone(report.eta)
+        self.assertIn('ETA unknown', str(report))
+
+    def test_progress_reports_first_and_last_chunks(self):
+        reports = []
+        progress = _Progress(
+            'Resampling', 30, 10, callback=reports.append, interval=3600
+        )
+
+        for _ in range(3):
+            progress.update(10)
+
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(reports[0].features_done, 10)
+        self.assertEqual(reports[-1].features_done, 30)
+        self.assertEqual(reports[-1].replicates_done, 300)
+
+    def test_progress_reports_every_chunk_without_interval(self):
+        reports = []
+        progress = _Progress('Resampling', 30, callback=reports.append,
+                             interval=0)
+
+        for _ in range(3):
+            progress.update(10)
+
+        self.assertEqual(
+            [report.features_done for report in reports], [10, 20, 30]
+        )
+
+    def test_interrupt_is_deferred_to_chunk_boundary(self):
+        chunks_completed = 0
+
+        with self.assertRaises(KeyboardInterrupt):
+            with _cooperative_cancellation() as token:
+                for _ in range(3):
+                    os.kill(os.getpid(), signal.SIGINT)
+                    chunks_completed += 1
+                    token.raise_if_cancelled()
+
+        self.assertEqual(chunks_completed, 1)
+
+    def test_signal_handler_restored(self):
+        previous_handler = signal.getsignal(signal.SIGINT)
+
+        with _cooperative_cancellation():
+            self.assertIsNot(signal.getsignal(signal.SIGINT), previous_handler)
+
+        self.assertIs(signal.getsignal(signal.SIGINT), previous_handler)
+
+    def test_run_as_single_chunk(self):
+        reports = []
+
+        result = _run_as_single_chunk(
+            'Filtering', 5, 1, lambda x, y: x + y, 2, y=3,
+            progress_callback=reports.append,
+        )
+
+        self.assertEqual(result, 5)
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0].features_done, 5)
+
+    def test_run_as_single_chunk_cancelled(self):
+        def _interrupted():
+            os.kill(os.getpid(), signal.SIGINT)
+            return 'finished'
+
+        with self.assertRaises(KeyboardInterrupt):
+            _run_as_single_chunk(
+                'Filtering', 5, 1, _interrupted,
+                progress_callback=lambda report: None,
+            )
+
+    def test_inform_without_logging_configured(self):
+        stderr = io.StringIO()
+
+        with mock.patch.object(logger, 'hasHandlers', return_value=False):
+            with contextlib.redirect_stderr(stderr):
+                _inform('Resampling: 1/2 features')
+
+        self.assertEqual(
+            stderr.getvalue(), '[q2-qsip2] Resampling: 1/2 features\n'
+        )
+
+    def test_inform_with_logging_configured(self):
+        stderr = io.StringIO()
+
+        with self.assertLogs('q2_qsip2', level='INFO') as logs:
+            with contextlib.redirect_stderr(stderr):
+                _inform('Resampling: 1/2 features')
+
+        self.assertEqual(stderr.getvalue(), '')
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(
+            logs.records[0].getMessage(), 'Resampling: 1/2 features'
+        )
@@ -0,0 +1,211 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+import tempfile
+from unittest import mock
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._resampling import (
+    MT_RNG_KIND, MT_STATE_SIZE, _block_seed, _feature_memory,
+    _feature_representatives, _feature_rng_state, _feature_seed,
+    _memory_block_size, _parse_memory, _prepare_checkpoint_dir,
+    _run_fingerprint, _shard_features, _shard_seed
+)
+
+
+class ResamplingTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def wad_df(self):
+        return pd.DataFrame({
+            'feature_id': ['f1', 'f2', 'f3', 'f4', 'f5'],
+            'S1': [1.70, 1.71, 1.70, np.nan, np.nan],
+            'S2': [1.72, 1.72, 1.72, 1.73, 1.73],
+            'S3': [np.nan, 1.74, np.nan, 1.75, 1.75],
+        })
+
+    def test_feature_representatives(self):
+        obs = _feature_representatives(self.wad_df())
+
+        exp = pd.Series(
+            ['f1', 'f2', 'f1', 'f4', 'f4'],
+            index=['f1', 'f2', 'f3', 'f4', 'f5'],
+            name='feature_id',
+        )
+
+        pd.testing.assert_series_equal(obs, exp, check_index_type=False)
+
+    def test_feature_representatives_all_unique(self):
+        wad_df = self.wad_df().iloc[[0, 1, 3]]
+
+        obs = _feature_representatives(wad_df)
+
+        self.assertEqual(list(obs), list(obs.index))
+
+    def test_block_seed_negative(self):
+        seeds = {_block_seed(seed, 0) for seed in (-2, -1, 0, 1)}
+
+        self.assertEqual(len(seeds), 4)
+        self.assertTrue(all(0 <= seed < 2 ** 31 - 1 for seed in seeds))
+
+        with self.assertRaisesRegex(ValueError, 'out of range'):
+            _block_seed(-2 ** 63 - 1, 0)
+
+    def test_block_seed(self):
+        seeds = [_block_seed(1, i) for i in range(5)]
+
+        self.assertEqual(seeds, [_block_seed(1, i) for i in range(5)])
+        self.assertEqual(len(set(seeds)), 5)
+        self.assertNotEqual(seeds[0], _block_seed(2, 0))
+        self.assertTrue(all(0 <= seed < 2 ** 31 - 1 for seed in seeds))
+
+    def test_shard_seed(self):
+        seeds = [_shard_seed(1, i, 3) for i in range(3)]
+
+        self.assertEqual(seeds, [_shard_seed(1, i, 3) for i in range(3)])
+        self.assertEqual(len(set(seeds)), 3)
+        self.assertNotEqual(seeds[0], _shard_seed(1, 0, 2))
+        self.assertNotEqual(seeds[0], _shard_seed(-1, 0, 3))
+        self.assertNotIn(seeds[0], [_block_seed(1, i) for i in range(3)])
+        self.assertTrue(all(0 <= seed < 2 ** 31 - 1 for seed in seeds))
+
+    def test_feature_rng_state(self):
+        states = [_feature_rng_state(1, f'f{i}') for i in range(5)]
+
+        self.assertEqual(states[0].dtype, np.int32)
+        self.assertEqual(len(states[0]), MT_STATE_SIZE + 2)
+        self.assertEqual(list(states[0][:2]), [MT_RNG_KIND, MT_STATE_SIZE])
+        self.assertFalse(
+            any((state == np.iinfo(np.int32).min).any() for state in states)
+        )
+
+        # a feature's stream depends only on the run's seed and its id
+        for i in (4, 2, 0):
+            np.testing.assert_array_equal(
+                states[i], _feature_rng_state(1, f'f{i}')
+            )
+        self.assertEqual(len({state.tobytes() for state in states}), 5)
+        self.assertFalse(
+            np.array_equal(states[0], _feature_rng_state(2, 'f0'))
+        )
+
+    def test_feature_seed(self):
+        seeds = [0, 1, -1, 2, -2, 2 ** 63 - 1, -2 ** 63]
+
+        self.assertEqual(
+            [_feature_seed(seed) for seed in seeds],
+            [0, 2, 1, 4, 3, 2 ** 64 - 2, 2 ** 64 - 1],
+        )
+        self.assertFalse(
+            np.array_equal(
+                _feature_rng_state(-1, 'f0'), _feature_rng_state(1, 'f0')
+            )
+        )
+
+    def test_feature_seed_out_of_range(self):
+        for seed in [2 ** 63, -2 ** 63 - 1, 2 ** 64 - 1]:
+            with self.assertRaisesRegex(ValueError, 'out of range'):
+                _feature_seed(seed)
+
+    def test_run_fingerprint(self):
+        wad_df = self.wad_df()
+        fingerprint = _run_fingerprint(wad_df, 1000, 1, 100)
+
+        self.assertEqual(fingerprint, _run_fingerprint(wad_df, 1000, 1, 100))
+        self.assertNotEqual(fingerprint, _run_fingerprint(wad_df, 1000, 2, 100))
+
+        self.assertNotEqual(
+            fingerprint, _run_fingerprint(wad_df, 1000, 1, 100, 'feature')
+        )
+
+        wad_df.loc[0, 'S1'] = 1.69
+        self.assertNotEqual(
+            fingerprint, _run_fingerprint(wad_df, 1000, 1, 100)
+        )
+
+    def test_prepare_checkpoint_dir(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            checkpoint_dir = Path(tempdir) / 'checkpoints'
+
+            _prepare_checkpoint_dir(checkpoint_dir, 'abc', [1, 2])
+            self.assertTrue((checkpoint_dir / 'manifest.json').exists())
+
+            # resuming the same run is allowed
+            _prepare_checkpoint_dir(checkpoint_dir, 'abc', [1, 2])
+
+            with self.assertRaisesRegex(ValueError, 'different inputs'):
+                _prepare_checkpoint_dir(checkpoint_dir, 'xyz', [1, 2])
+
+    def test_shard_features(self):
+        feature_ids = pd.Index(['f1', 'f2', 'f3', 'f4', 'f5'])
+
+        shards = [_shard_features(feature_ids, i, 3) for i in range(3)]
+
+        self.assertEqual(
+            [list(shard) for shard in shards],
+            [['f1', 'f2'], ['f3', 'f4'], ['f5']],
+        )
+        self.assertTrue(_shard_features(feature_ids, 6, 7).empty)
+
+    def test_shard_features_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'Shard 3.*only 3 shards'):
+            _shard_features(pd.Index(['f1']), 3, 3)
+
+    def test_parse_memory(self):
+        self.assertEqual(_parse_memory('1024'), 1024)
+        self.assertEqual(_parse_memory('512M'), 512 * 1024 ** 2)
+        self.assertEqual(_parse_memory('4G'), 4 * 1024 ** 3)
+        self.assertEqual(_parse_memory(' 1.5 GiB '), int(1.5 * 1024 ** 3))
+        self.assertEqual(_parse_memory('2kb'), 2048)
+
+    def test_parse_memory_invalid(self):
+        for memory in ['', 'lots', '-1G', '0', 'G', 'inf', '1e400G', 'nan']:
+            with self.assertRaisesRegex(ValueError, 'memory size'):
+                _parse_memory(memory)
+
+    def test_feature_memory(self):
+        self.assertEqual(
+            _feature_memory(10, 1000), 2 * _feature_memory(5, 1000)
+        )
+        self.assertEqual(
+            _feature_memory(10, 1000), 10 * _feature_memory(10, 100)
+        )
+
+    def _memory_block_size(self, max_memory, resident_memory):
+        with mock.patch(
+            'q2_qsip2._resampling._property_to_dataframe',
+            return_value=self.wad_df(),
+        ), mock.patch(
+            'q2_qsip2._resampling._object_memory',
+            return_value=resident_memory,
+        ):
+            return _memory_block_size(None, 100, max_memory)
+
+    def test_memory_block_size(self):
+        feature_memory = _feature_memory(3, 100)
+
+        self.assertEqual(self._memory_block_size(2 * feature_memory, 0), 2)
+        self.assertEqual(
+            self._memory_block_size(3 * feature_memory, feature_memory), 2
+        )
+        self.assertEqual(self._memory_block_size(100 * feature_memory, 0), 5)
+
+    def test_memory_block_size_over_budget(self):
+        feature_memory = _feature_memory(3, 100)
+
+        with self.assertLogs('q2_qsip2', level='WARNING'):
+            block_size = self._memory_block_size(
+                feature_memory, 2 * feature_memory
+            )
+
+        self.assertEqual(block_size, 1)
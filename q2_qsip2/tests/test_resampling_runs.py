@@ -0,0 +1,232 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import pandas as pd
+import rpy2.robjects as ro
+from rpy2.robjects import pandas2ri
+
+from pathlib import Path
+import tempfile
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._qsip_object import _property_to_dataframe
+from q2_qsip2._resampling import _resample_in_blocks, _shard_features
+from q2_qsip2.tests._tutorial import tutorial_filtered_qsip_object
+from q2_qsip2.workflow import merge_eaf_shards, resample_and_calculate_EAF
+
+
+_resamples_data_R = ro.r('''
+    function(qsip_data_object) S7::prop(qsip_data_object, "resamples")$data
+''')
+
+_random_seed_R = ro.r('''
+    function() {
+        if (exists(".Random.seed", envir = globalenv(), inherits = FALSE)) {
+            get(".Random.seed", envir = globalenv(), inherits = FALSE)
+        } else {
+            NULL
+        }
+    }
+''')
+
+
+def _results(qsip_object, feature_ids=None):
+    '''
+    The EAF values and resampled WADs of an EAF-calculated object, sorted by
+    feature, optionally restricted to `feature_ids`.
+    '''
+    with (ro.default_converter + pandas2ri.converter).context():
+        resamples_df = ro.conversion.get_conversion().rpy2py(
+            _resamples_data_R(qsip_object)
+        )
+
+    results = []
+    for df in (_property_to_dataframe(qsip_object, 'EAF'), resamples_df):
+        if feature_ids is not None:
+            df = df[df['feature_id'].isin(feature_ids)]
+        results.append(
+            df.sort_values('feature_id', kind='stable').reset_index(drop=True)
+        )
+
+    return results
+
+
+class ResamplingRunTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.filtered_qsip_object = tutorial_filtered_qsip_object()
+        cls.feature_ids = list(_property_to_dataframe(
+            cls.filtered_qsip_object, 'filtered_wad_data'
+        )['feature_id'])
+
+    def assert_same_results(self, obs, exp, feature_ids=None):
+        for obs_df, exp_df in zip(
+            _results(obs, feature_ids), _results(exp, feature_ids)
+        ):
+            self.assertFalse(obs_df.empty)
+            pd.testing.assert_frame_equal(obs_df, exp_df)
+
+    def test_resumed_run_matches_uninterrupted_run(self):
+        parameters = {'resamples': 20, 'random_seed': -7, 'block_size': 3}
+
+        def interrupt(report):
+            if report.features_done < report.total_features:
+                raise KeyboardInterrupt
+
+        exp = _resample_in_blocks(self.filtered_qsip_object, **parameters)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            with self.assertRaises(KeyboardInterrupt):
+                _resample_in_blocks(
+                    self.filtered_qsip_object,
+                    checkpoint_dir=tempdir,
+                    progress_callback=interrupt,
+                    **parameters,
+                )
+            self.assertEqual(
+                [fp.name for fp in Path(tempdir).glob('block-*.rds')],
+                ['block-000000.rds'],
+            )
+
+            obs = _resample_in_blocks(
+                self.filtered_qsip_object, checkpoint_dir=tempdir,
+                **parameters
+            )
+
+        self.assert_same_results(obs, exp)
+
+    def test_feature_seeding_subset_matches_full_run(self):
+        parameters = {'resamples': 20, 'random_seed': 3, 'seeding': 'feature'}
+        # every third feature, in reverse order
+        feature_ids = self.feature_ids[::-3]
+
+        full = resample_and_calculate_EAF(
+            self.filtered_qsip_object, **parameters
+        )
+        subset = resample_and_calculate_EAF(
+            self.filtered_qsip_object,
+            feature_ids=feature_ids,
+            block_size=2,
+            **parameters,
+        )
+
+        self.assertEqual(
+            set(_results(subset)[0]['feature_id']), set(feature_ids)
+        )
+        self.assert_same_results(subset, full, feature_ids)
+
+    def test_feature_seeding_restores_random_state(self):
+        parameters = {
+            'resamples': 5, 'random_seed': 3, 'block_size': 4,
+            'seeding': 'feature',
+        }
+
+        ro.r['set.seed'](42)
+        exp = list(_random_seed_R())
+        _resample_in_blocks(self.filtered_qsip_object, **parameters)
+        self.assertEqual(list(_random_seed_R()), exp)
+
+        ro.r('rm(".Random.seed", envir = globalenv())')
+        _resample_in_blocks(self.filtered_qsip_object, **parameters)
+        self.assertTrue(ro.r['is.null'](_random_seed_R())[0])
+
+    def test_feature_stream_independent_of_companions(self):
+        parameters = {'resamples': 10, 'random_seed': -5, 'seeding': 'feature'}
+        feature_id = self.feature_ids[len(self.feature_ids) // 2]
+        shard_index = next(
+            i for i in range(3)
+            if feature_id in _shard_features(
+                pd.Index(self.feature_ids), i, 3
+            )
+        )
+
+        alone = resample_and_calculate_EAF(
+            self.filtered_qsip_object, feature_ids=[feature_id], **parameters
+        )
+        shard = resample_and_calculate_EAF(
+            self.filtered_qsip_object,
+            shard_index=shard_index,
+            shard_count=3,
+            **parameters,
+        )
+        full = resample_and_calculate_EAF(
+            self.filtered_qsip_object, block_size=5, **parameters
+        )
+
+        self.assert_same_results(alone, full, [feature_id])
+        self.assert_same_results(shard, full, [feature_id])
+
+    def test_feature_streams_differ_between_seeds(self):
+        feature_ids = self.feature_ids[:2]
+        resamples = {}
+        for random_seed in (1, -1, 2, -2):
+            _, resamples_df = _results(resample_and_calculate_EAF(
+                self.filtered_qsip_object,
+                resamples=10,
+                random_seed=random_seed,
+                feature_ids=feature_ids,
+                seeding='feature',
+            ))
+            resamples[random_seed] = resamples_df
+
+        for seed, other_seed in [(1, -1), (1, 2), (-1, -2), (2, -2)]:
+            self.assertFalse(
+                resamples[seed].equals(resamples[other_seed]),
+                f'seeds {seed} and {other_seed} share their streams',
+            )
+
+    def test_run_seeded_shards_are_reproducible(self):
+        parameters = {'resamples': 10, 'random_seed': 4, 'shard_count': 3}
+
+        shards = [
+            resample_and_calculate_EAF(
+                self.filtered_qsip_object, shard_index=i, **parameters
+            )
+            for i in range(3)
+        ]
+        merged = merge_eaf_shards(shards)
+
+        self.assert_same_results(
+            merged,
+            merge_eaf_shards([
+                resample_and_calculate_EAF(
+                    self.filtered_qsip_object, shard_index=i, **parameters
+                )
+                for i in range(3)
+            ]),
+        )
+        self.assertEqual(
+            sorted(_results(merged)[0]['feature_id'].unique()),
+            sorted(self.feature_ids),
+        )
+
+    def test_empty_shard_has_empty_eaf_tables(self):
+        shard_count = len(self.feature_ids) + 1
+
+        empty_shard = resample_and_calculate_EAF(
+            self.filtered_qsip_object,
+            resamples=5,
+            shard_index=shard_count - 1,
+            shard_count=shard_count,
+        )
+        full_run = resample_and_calculate_EAF(
+            self.filtered_qsip_object, resamples=5
+        )
+
+        for obs, exp in zip(_results(empty_shard), _results(full_run)):
+            self.assertTrue(obs.empty)
+            self.assertEqual(list(obs.columns), list(exp.columns))
+        for name in ('filtered_feature_data', 'filtered_wad_data'):
+            self.assertEqual(
+                _property_to_dataframe(empty_shard, name).shape[0], 0
+            )
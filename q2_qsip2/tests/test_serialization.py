@@ -0,0 +1,77 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import rpy2.robjects as ro
+
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._serialization import (
+    COMPRESSION_ENV, COMPRESSION_LEVEL_ENV, SERIALIZATION_ENV,
+    SerializationSettings, _load_rds, _save_rds, _serialization_settings,
+    zstandard
+)
+
+
+class SerializationTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def test_default_settings(self):
+        with mock.patch.dict(os.environ, clear=True):
+            settings = _serialization_settings()
+
+        self.assertEqual(settings, SerializationSettings('pickle', 'gzip', 6))
+
+    def test_settings_from_environment(self):
+        environment = {
+            SERIALIZATION_ENV: 'rds',
+            COMPRESSION_ENV: 'xz',
+            COMPRESSION_LEVEL_ENV: '9',
+        }
+        with mock.patch.dict(os.environ, environment, clear=True):
+            settings = _serialization_settings()
+
+        self.assertEqual(settings, SerializationSettings('rds', 'xz', 9))
+
+    def test_invalid_settings(self):
+        invalid_environments = [
+            ({SERIALIZATION_ENV: 'json'}, 'serialization backend'),
+            ({COMPRESSION_ENV: 'lz4'}, 'compression method'),
+            (
+                {COMPRESSION_ENV: 'gzip', COMPRESSION_LEVEL_ENV: '12'},
+                'between 1 and 9'
+            ),
+        ]
+
+        for environment, message in invalid_environments:
+            with mock.patch.dict(os.environ, environment, clear=True):
+                with self.assertRaisesRegex(ValueError, message):
+                    _serialization_settings()
+
+    def round_trip(self, compression, level):
+        r_object = ro.r('list(a = 1:3, b = "qsip")')
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'object.rds'
+            _save_rds(r_object, fp, compression, level)
+            loaded = _load_rds(fp)
+
+        self.assertTrue(ro.r['identical'](r_object, loaded)[0])
+
+    def test_rds_round_trip(self):
+        for compression, level in [('none', 0), ('gzip', 6), ('xz', 6)]:
+            self.round_trip(compression, level)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_rds_round_trip_zstd(self):
+        self.round_trip('zstd', 3)
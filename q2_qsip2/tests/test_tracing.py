@@ -0,0 +1,124 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import json
+from pathlib import Path
+import tempfile
+from unittest import mock
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2 import _tracing
+from q2_qsip2._tracing import (
+    TRACE_ENV, _file_nbytes, _nbytes, _trace, _trace_summary, _traced,
+    _write_trace_summary
+)
+
+
+class TracingTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def setUp(self):
+        super().setUp()
+
+        patcher = mock.patch.dict(_tracing._traces, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nbytes(self):
+        df = pd.DataFrame({'a': np.zeros(4), 'b': np.zeros(4, dtype=np.int32)})
+        matrix = sparse.csr_array(np.eye(3))
+
+        self.assertEqual(_nbytes(df), 48)
+        self.assertEqual(_nbytes(np.zeros(5)), 40)
+        self.assertEqual(_nbytes(matrix), 3 * 8 + 3 * 4 + 4 * 4)
+        self.assertEqual(_nbytes(b'abc'), 3)
+        self.assertEqual(_nbytes((np.zeros(1), b'ab')), 10)
+        self.assertEqual(_nbytes(None), 0)
+
+    def test_traced(self):
+        @_traced()
+        def convert(n):
+            return np.zeros(n)
+
+        convert(2)
+        convert(3)
+
+        stats = _tracing._traces['convert']
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.nbytes, 40)
+        self.assertGreaterEqual(stats.seconds, stats.max_seconds)
+        self.assertEqual(convert.__name__, 'convert')
+
+    def test_traced_measure(self):
+        @_traced('load', measure=lambda result, fp: len(fp))
+        def load(fp):
+            return None
+
+        load('abcd')
+
+        self.assertEqual(_tracing._traces['load'].nbytes, 4)
+
+    def test_trace_records_failures(self):
+        with self.assertRaises(ValueError):
+            with _trace('R: failing', 10):
+                raise ValueError
+
+        self.assertEqual(_tracing._traces['R: failing'].calls, 1)
+        self.assertEqual(_tracing._traces['R: failing'].nbytes, 10)
+
+    def test_file_nbytes(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            fp = Path(tempdir) / 'data.bin'
+            fp.write_bytes(b'12345')
+
+            measure = _file_nbytes(1)
+            self.assertEqual(measure(None, object(), fp), 5)
+            self.assertEqual(measure(None, object(), fp / 'missing'), 0)
+            self.assertEqual(measure(None), 0)
+
+    def test_trace_summary(self):
+        _tracing._record('fast', 0.5, 1)
+        _tracing._record('slow', 2.0, 2)
+        _tracing._record('slow', 1.0, 2)
+
+        summary = _trace_summary()
+
+        self.assertEqual(list(summary['traces']), ['slow', 'fast'])
+        self.assertEqual(summary['traces']['slow'], {
+            'calls': 2,
+            'seconds': 3.0,
+            'mean_seconds': 1.5,
+            'max_seconds': 2.0,
+            'bytes': 4,
+        })
+
+    def test_write_trace_summary(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            with mock.patch.dict('os.environ', {TRACE_ENV: tempdir}):
+                self.assertIsNone(_write_trace_summary())
+
+                _tracing._record('convert', 1.0, 8)
+                fp = _write_trace_summary()
+
+            self.assertEqual(fp.parent, Path(tempdir))
+            with open(fp) as fh:
+                summary = json.load(fh)
+
+        self.assertEqual(summary['traces']['convert']['bytes'], 8)
+        self.assertIn('wall_seconds', summary)
+
+    def test_write_trace_summary_disabled(self):
+        _tracing._record('convert', 1.0, 8)
+
+        with mock.patch.dict('os.environ', clear=True):
+            self.assertIsNone(_write_trace_summary())
@@ -0,0 +1,138 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_qsip2._wads import (
+    _feature_wads, _source_relative_abundances, _source_wads,
+    _tube_abundances
+)
+
+
+class WADTests(TestPluginBase):
+    package = 'q2_qsip2.tests'
+
+    def setUp(self):
+        super().setUp()
+
+        self.abundances = np.array([
+            [10, 0, 5, 0, 0],
+            [0, 0, 0, 3, 1],
+            [2, 2, 2, 2, 2],
+        ])
+        self.feature_ids = np.array(['f1', 'f2', 'f3'])
+        self.sources = np.array(['s1', 's1', 's1', 's2', 's2'])
+        self.densities = np.array([1.70, 1.72, 1.74, 1.71, 1.73])
+        self.amounts = np.array([10.0, 30.0, 20.0, 5.0, 15.0])
+
+    def test_source_wads(self):
+        obs = _source_wads(self.sources, self.densities, self.amounts)
+
+        exp = pd.DataFrame({
+            'source_mat_id': ['s1', 's2'],
+            'WAD': [
+                (1.70 * 10 + 1.72 * 30 + 1.74 * 20) / 60,
+                (1.71 * 5 + 1.73 * 15) / 20,
+            ],
+        })
+
+        pd.testing.assert_frame_equal(obs, exp)
+
+    def test_feature_wads(self):
+        obs = _feature_wads(
+            self.abundances, self.feature_ids, self.sources,
+            self.densities, self.amounts
+        )
+
+        relative_abundances = self.abundances / self.abundances.sum(axis=0)
+        exp = []
+        for i, feature_id in enumerate(self.feature_ids):
+            for source_id in ['s1', 's2']:
+                in_source = self.sources == source_id
+                amounts = self.amounts[in_source]
+                weights = (
+                    relative_abundances[i, in_source] *
+                    amounts / amounts.sum()
+                )
+                if weights.sum() > 0:
+                    wad = (
+                        (weights * self.densities[in_source]).sum() /
+                        weights.sum()
+                    )
+                    exp.append((feature_id, source_id, wad))
+        exp = pd.DataFrame(exp, columns=['feature_id', 'source_mat_id', 'WAD'])
+
+        pd.testing.assert_frame_equal(obs, exp)
+
+    def test_feature_wads_sparse_input(self):
+        dense = _feature_wads(
+            self.abundances, self.feature_ids, self.sources,
+            self.densities, self.amounts
+        )
+        from_sparse = _feature_wads(
+            sparse.csr_matrix(self.abundances), self.feature_ids,
+            self.sources, self.densities, self.amounts
+        )
+
+        pd.testing.assert_frame_equal(dense, from_sparse)
+
+    def test_source_relative_abundances(self):
+        obs, source_ids = _source_relative_abundances(
+            self.abundances, self.sources, self.amounts
+        )
+
+        self.assertEqual(list(source_ids), ['s1', 's2'])
+
+        relative_abundances = self.abundances / self.abundances.sum(axis=0)
+        exp = np.zeros((3, 2))
+        for j, source_id in enumerate(source_ids):
+            in_source = self.sources == source_id
+            amounts = self.amounts[in_source]
+            exp[:, j] = (
+                relative_abundances[:, in_source] @ amounts / amounts.sum()
+            )
+
+        np.testing.assert_allclose(obs.toarray(), exp)
+        np.testing.assert_allclose(obs.toarray().sum(axis=0), [1, 1])
+
+    def test_tube_abundances(self):
+        obs = _tube_abundances(self.abundances, self.amounts)
+
+        relative_abundances = self.abundances / self.abundances.sum(axis=0)
+        exp = relative_abundances * self.amounts[np.newaxis, :]
+
+        self.assertEqual(obs.format, 'csc')
+        self.assertEqual(obs.nnz, np.count_nonzero(self.abundances))
+        np.testing.assert_allclose(obs.toarray(), exp)
+
+    def test_feature_wads_from_tube_abundances(self):
+        exp = _feature_wads(
+            self.abundances, self.feature_ids, self.sources,
+            self.densities, self.amounts
+        )
+        obs = _feature_wads(
+            _tube_abundances(self.abundances, self.amounts),
+            self.feature_ids, self.sources, self.densities, None
+        )
+
+        pd.testing.assert_frame_equal(obs, exp)
+
+    def test_source_relative_abundances_from_tube_abundances(self):
+        exp, _ = _source_relative_abundances(
+            self.abundances, self.sources, self.amounts
+        )
+        obs, _ = _source_relative_abundances(
+            _tube_abundances(self.abundances, self.amounts),
+            self.sources, None
+        )
+
+        np.testing.assert_allclose(obs.toarray(), exp.toarray())
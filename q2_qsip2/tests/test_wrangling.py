@@ -6,13 +6,17 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import biom
+import numpy as np
 import pandas as pd
 
 import qiime2
 from qiime2.plugin.testing import TestPluginBase
 
 from q2_qsip2._wrangling import (
-    _extract_source_metadata, _validate_metadata_columns
+    _collapse_table, _comparison_groups, _extract_source_metadata,
+    _merge_metadata, _reconcile_ids, _select_features,
+    _validate_metadata_columns
 )
 
 
@@ -113,3 +117,224 @@ class WranglingTests(TestPluginBase):
 
         with self.assertRaisesRegex(ValueError, exp_error):
             _validate_metadata_columns(metadata, columns_mapping, 'source')
+
+    def source_dfs_to_merge(self):
+        first = pd.DataFrame({
+            'source_mat_id': ['s1', 's2'],
+            'isotope': ['12C', '13C'],
+            'moisture': ['normal', 'drought'],
+        })
+        second = pd.DataFrame({
+            'source_mat_id': ['s2', 's3'],
+            'isotope': ['13C', '12C'],
+            'site': ['a', 'b'],
+        })
+
+        return first, second
+
+    def test_merge_metadata(self):
+        first, second = self.source_dfs_to_merge()
+
+        merged = _merge_metadata([first, second], 'source_mat_id', 'source')
+
+        # shared ids are collapsed and columns are unioned
+        exp = pd.DataFrame({
+            'source_mat_id': ['s1', 's2', 's3'],
+            'isotope': ['12C', '13C', '12C'],
+            'moisture': ['normal', 'drought', None],
+            'site': [None, 'a', 'b'],
+        })
+
+        pd.testing.assert_frame_equal(
+            merged, exp, check_dtype=False, check_index_type=False
+        )
+
+    def test_merge_metadata_conflicting(self):
+        first, second = self.source_dfs_to_merge()
+        second.loc[0, 'isotope'] = '12C'
+
+        exp_error = 'following source ids have conflicting.*: s2\\.'
+        with self.assertRaisesRegex(ValueError, exp_error):
+            _merge_metadata([first, second], 'source_mat_id', 'source')
+
+    def table_to_collapse(self):
+        return biom.Table(
+            np.array([[1, 0, 2], [3, 1, 0], [0, 0, 5], [1, 1, 1]]),
+            observation_ids=['a', 'b', 'c', 'd'],
+            sample_ids=['s1', 's2', 's3'],
+        )
+
+    def taxonomy(self):
+        return pd.DataFrame(
+            {
+                'Taxon': [
+                    'k__B; p__X; g__Y', 'k__B;p__X;g__Z', 'k__B; p__W', 'k__A'
+                ]
+            },
+            index=pd.Index(['a', 'b', 'c', 'd'], name='Feature ID'),
+        )
+
+    def test_collapse_table(self):
+        collapsed = _collapse_table(
+            self.table_to_collapse(), self.taxonomy(), 2
+        )
+
+        exp = pd.DataFrame(
+            [[4.0, 1.0, 2.0], [0.0, 0.0, 5.0], [1.0, 1.0, 1.0]],
+            index=['k__B;p__X', 'k__B;p__W', 'k__A'],
+            columns=['s1', 's2', 's3'],
+        )
+
+        pd.testing.assert_frame_equal(
+            collapsed.to_dataframe(dense=True), exp, check_names=False
+        )
+
+    def test_collapse_table_missing_taxonomy(self):
+        taxonomy = self.taxonomy().drop('c')
+
+        with self.assertRaisesRegex(ValueError, 'not found in the taxonomy: c'):
+            _collapse_table(self.table_to_collapse(), taxonomy, 2)
+
+    def feature_metadata(self):
+        df = pd.DataFrame({
+            'feature-id': ['f1', 'f2', 'f3', 'f9'],
+            'Genus': ['g__A', 'g__B', 'g__A', 'g__A'],
+        })
+        df.set_index('feature-id', inplace=True)
+
+        return qiime2.Metadata(df)
+
+    def test_select_features_no_selection(self):
+        available_ids = pd.Index(['f1', 'f2', 'f3', 'f4'])
+
+        self.assertIsNone(_select_features(available_ids))
+
+    def test_select_features_by_id(self):
+        available_ids = pd.Index(['f1', 'f2', 'f3', 'f4'])
+
+        selected = _select_features(available_ids, feature_ids=['f3', 'f1'])
+
+        self.assertEqual(list(selected), ['f1', 'f3'])
+
+    def test_select_features_unavailable_id(self):
+        available_ids = pd.Index(['f1', 'f2', 'f3', 'f4'])
+
+        with self.assertRaisesRegex(ValueError, 'f5'):
+            _select_features(available_ids, feature_ids=['f1', 'f5'])
+
+    def test_select_features_by_metadata(self):
+        available_ids = pd.Index(['f1', 'f2', 'f3', 'f4'])
+
+        selected = _select_features(
+            available_ids,
+            feature_metadata=self.feature_metadata(),
+            feature_metadata_where="[Genus]='g__A'",
+        )
+        self.assertEqual(list(selected), ['f1', 'f3'])
+
+        selected = _select_features(
+            available_ids,
+            feature_ids=['f4'],
+            feature_metadata=self.feature_metadata(),
+            feature_metadata_where="[Genus]='g__B'",
+        )
+        self.assertEqual(list(selected), ['f2', 'f4'])
+
+    def test_select_features_where_without_metadata(self):
+        available_ids = pd.Index(['f1', 'f2'])
+
+        with self.assertRaisesRegex(ValueError, 'without feature metadata'):
+            _select_features(
+                available_ids, feature_metadata_where="[Genus]='g__A'"
+            )
+
+    def test_select_features_empty(self):
+        available_ids = pd.Index(['f4'])
+
+        with self.assertRaisesRegex(ValueError, 'None of the selected'):
+            _select_features(
+                available_ids, feature_metadata=self.feature_metadata()
+            )
+
+    def reconcile_inputs(self):
+        table_sample_ids = pd.Index(['a', 'b', 'c', 'x'])
+        sample_sources = pd.Series(
+            ['s1', 's1', 's2', 's3'], index=pd.Index(['a', 'b', 'c', 'd'])
+        )
+        source_ids = pd.Index(['s1', 's2', 's4'])
+
+        return table_sample_ids, sample_sources, source_ids
+
+    def test_reconcile_ids_matching(self):
+        sample_ids, source_ids = _reconcile_ids(
+            pd.Index(['b', 'a', 'c']),
+            pd.Series(['s1', 's1', 's2'], index=pd.Index(['a', 'b', 'c'])),
+            pd.Index(['s1', 's2']),
+        )
+
+        self.assertEqual(list(sample_ids), ['a', 'b', 'c'])
+        self.assertEqual(list(source_ids), ['s1', 's2'])
+
+    def test_reconcile_ids_reports_every_mismatch(self):
+        with self.assertRaises(ValueError) as cm:
+            _reconcile_ids(*self.reconcile_inputs())
+
+        error_msg = str(cm.exception)
+        self.assertIn('sample metadata are missing from the feature table: d',
+                      error_msg)
+        self.assertIn('feature table are missing from the sample metadata: x',
+                      error_msg)
+        self.assertIn('missing from the source metadata: s3', error_msg)
+        self.assertIn('have no samples: s4', error_msg)
+
+    def test_reconcile_ids_ignore_extra_table_samples(self):
+        table_sample_ids, sample_sources, source_ids = self.reconcile_inputs()
+
+        with self.assertRaises(ValueError) as cm:
+            _reconcile_ids(
+                table_sample_ids, sample_sources, source_ids,
+                ignore_extra_table_samples=True,
+            )
+
+        self.assertNotIn('missing from the sample metadata', str(cm.exception))
+
+    def test_reconcile_ids_auto_subset(self):
+        sample_ids, source_ids = _reconcile_ids(
+            *self.reconcile_inputs(), auto_subset=True
+        )
+
+        self.assertEqual(list(sample_ids), ['a', 'b', 'c'])
+        self.assertEqual(list(source_ids), ['s1', 's2'])
+
+    def test_reconcile_ids_nothing_shared(self):
+        with self.assertRaisesRegex(ValueError, 'No samples are shared'):
+            _reconcile_ids(
+                pd.Index(['x']),
+                pd.Series(['s1'], index=pd.Index(['a'])),
+                pd.Index(['s1']),
+                auto_subset=True,
+            )
+
+    def test_comparison_groups(self):
+        source_df = pd.DataFrame({
+            'source_mat_id': ['s1', 's2', 's3', 's4', 's5'],
+            'isotope': ['12C', '13C', '12C', '13C', '12C'],
+            'moisture': ['wet', 'wet', 'dry', 'dry', 'wet'],
+        })
+
+        obs = _comparison_groups(source_df, ['moisture'])
+
+        exp = pd.DataFrame({
+            'moisture': ['wet', 'dry'],
+            '12C': ['s1, s5', 's3'],
+            '13C': ['s2', 's4'],
+        })
+        pd.testing.assert_frame_equal(obs, exp)
+
+    def test_comparison_groups_missing_column(self):
+        source_df = pd.DataFrame({
+            'source_mat_id': ['s1'], 'isotope': ['12C'],
+        })
+
+        with self.assertRaisesRegex(ValueError, 'not found.*moisture'):
+            _comparison_groups(source_df, ['moisture'])
@@ -1,13 +1,25 @@
 from q2_qsip2.types._formats import (
     QSIP2DataUnfilteredFormat, QSIP2DataUnfilteredDirectoryFormat,
     QSIP2DataFilteredFormat, QSIP2DataFilteredDirectoryFormat,
-    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat
+    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat,
+    QSIP2DataTableFormat, QSIP2DataMetadataDirectoryFormat,
+    QSIP2DataFeatureTableFormat, QSIP2DataTableSubsetsFormat,
+    QSIP2DataCompactTablesFormat, QSIP2DataRDSFormat,
+    QSIP2GrowthFormat, QSIP2GrowthDirectoryFormat
 )
-from q2_qsip2.types._types import QSIP2Data, Unfiltered, Filtered, EAF
+from q2_qsip2.types._types import (
+    QSIP2Data, Unfiltered, Filtered, EAF, QSIP2GrowthRates
+)
+from q2_qsip2.types._views import QSIP2DataMetadataView
 
 __all__ = [
     'QSIP2Data', 'Unfiltered', 'Filtered', 'EAF',
     'QSIP2DataUnfilteredFormat', 'QSIP2DataUnfilteredDirectoryFormat',
     'QSIP2DataFilteredFormat', 'QSIP2DataFilteredDirectoryFormat',
-    'QSIP2DataEAFFormat', 'QSIP2DataEAFDirectoryFormat'
+    'QSIP2DataEAFFormat', 'QSIP2DataEAFDirectoryFormat',
+    'QSIP2DataTableFormat', 'QSIP2DataMetadataDirectoryFormat',
+    'QSIP2DataFeatureTableFormat', 'QSIP2DataTableSubsetsFormat',
+    'QSIP2DataCompactTablesFormat', 'QSIP2DataRDSFormat',
+    'QSIP2GrowthRates', 'QSIP2GrowthFormat', 'QSIP2GrowthDirectoryFormat',
+    'QSIP2DataMetadataView'
 ]
@@ -10,21 +10,31 @@ import importlib
 
 from q2_qsip2.plugin_setup import plugin
 from q2_qsip2.types._types import (
-    QSIP2Data, Unfiltered, Filtered, EAF
+    QSIP2Data, Unfiltered, Filtered, EAF, QSIP2GrowthRates
 )
 from q2_qsip2.types._formats import (
     QSIP2DataUnfilteredFormat, QSIP2DataUnfilteredDirectoryFormat,
     QSIP2DataFilteredFormat, QSIP2DataFilteredDirectoryFormat,
-    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat
+    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat,
+    QSIP2DataTableFormat, QSIP2DataMetadataDirectoryFormat,
+    QSIP2DataFeatureTableFormat, QSIP2DataTableSubsetsFormat,
+    QSIP2DataCompactTablesFormat, QSIP2DataRDSFormat,
+    QSIP2GrowthFormat, QSIP2GrowthDirectoryFormat
 )
 
 
-plugin.register_semantic_types(QSIP2Data, Unfiltered, Filtered, EAF)
+plugin.register_semantic_types(
+    QSIP2Data, Unfiltered, Filtered, EAF, QSIP2GrowthRates
+)
 
 plugin.register_formats(
     QSIP2DataUnfilteredFormat, QSIP2DataUnfilteredDirectoryFormat,
     QSIP2DataFilteredFormat, QSIP2DataFilteredDirectoryFormat,
-    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat
+    QSIP2DataEAFFormat, QSIP2DataEAFDirectoryFormat,
+    QSIP2DataTableFormat, QSIP2DataMetadataDirectoryFormat,
+    QSIP2DataFeatureTableFormat, QSIP2DataTableSubsetsFormat,
+    QSIP2DataCompactTablesFormat, QSIP2DataRDSFormat,
+    QSIP2GrowthFormat, QSIP2GrowthDirectoryFormat
 )
 
 plugin.register_artifact_class(
@@ -54,4 +64,14 @@ plugin.register_artifact_class(
     )
 )
 
+plugin.register_artifact_class(
+    QSIP2GrowthRates,
+    directory_format=QSIP2GrowthDirectoryFormat,
+    description=(
+        'Represents per-feature birth, death, and net growth rates '
+        'calculated from EAF values, stored column by column with one row '
+        'per feature and bootstrap replicate.'
+    )
+)
+
 importlib.import_module('._transformers', __name__)
@@ -6,16 +6,39 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import pandas as pd
 from rpy2.robjects.methods import RS4
 
 import pickle
 
+import qiime2
+
+from q2_qsip2._compact import (
+    CompactFeatureTable, CompactTables, TableSubsets
+)
+from q2_qsip2._growth import (
+    _growth_metadata, _load_growth_table, _save_growth_table
+)
+from q2_qsip2._serialization import (
+    _load_rds, _save_rds, _serialization_settings
+)
+from q2_qsip2._qsip_object import (
+    _attach_tube_abundances, _attached_tube_abundances, _find_compact_tables,
+    _find_table_subsets, _property_to_dataframe, _replace_feature_data,
+    _with_compact_tables, _with_table_subsets, _without_feature_data,
+    _without_tables, _without_tube_abundances
+)
+from q2_qsip2._tracing import _file_nbytes, _traced
 from q2_qsip2.plugin_setup import plugin
 from q2_qsip2.types import (
-    QSIP2DataUnfilteredFormat, QSIP2DataFilteredFormat, QSIP2DataEAFFormat
+    QSIP2DataUnfilteredFormat, QSIP2DataFilteredFormat, QSIP2DataEAFFormat,
+    QSIP2DataUnfilteredDirectoryFormat, QSIP2DataFilteredDirectoryFormat,
+    QSIP2DataEAFDirectoryFormat, QSIP2DataMetadataDirectoryFormat,
+    QSIP2DataMetadataView, QSIP2DataRDSFormat, QSIP2GrowthFormat
 )
 
 
+@_traced(measure=_file_nbytes(0))
 def _format_to_qsip_object(ff):
     with ff.open() as fh:
         qsip_object = pickle.load(fh)
@@ -23,6 +46,7 @@ def _format_to_qsip_object(ff):
     return qsip_object
 
 
+@_traced(measure=_file_nbytes(1))
 def _qsip_object_to_format(qsip_object, ff):
     with ff.open() as fh:
         pickle.dump(qsip_object, fh)
@@ -30,6 +54,126 @@ def _qsip_object_to_format(qsip_object, ff):
     return ff
 
 
+def _write_metadata_tables(qsip_object, df):
+    source_df = _property_to_dataframe(qsip_object, 'source_data', 'data')
+    source_df.to_csv(df.path / 'source-data.tsv', sep='\t', index=False)
+
+    sample_df = _property_to_dataframe(qsip_object, 'sample_data', 'data')
+    sample_df.to_csv(df.path / 'sample-data.tsv', sep='\t', index=False)
+
+    return df
+
+
+@_traced()
+def _qsip_object_to_directory_format(
+    qsip_object, df, format_class, metadata_tables=True
+):
+    # tables that are subsets of the feature data or tube relative
+    # abundances, such as the filtered feature data, are stored as the rows
+    # and columns they keep, and the other tables, such as the tube relative
+    # abundances, WADs, and EAF values, column by column with integer-coded
+    # ids. Both are found before the feature data is replaced
+    table_subsets = _find_table_subsets(qsip_object)
+    compact_tables = _find_compact_tables(
+        qsip_object, exclude=table_subsets.paths
+    )
+
+    # the input feature table is stored compactly, so the serialized object
+    # holds a placeholder in its place
+    feature_df = _property_to_dataframe(qsip_object, 'feature_data', 'data')
+    CompactFeatureTable.from_wide_dataframe(feature_df).save(
+        df.path / 'feature-data.npz'
+    )
+
+    stripped_qsip_object = _without_feature_data(qsip_object)
+
+    if len(table_subsets):
+        table_subsets.save(df.path / 'table-subsets.npz')
+    if len(compact_tables):
+        compact_tables.save(df.path / 'compact-tables.npz')
+    stripped_qsip_object = _without_tables(
+        stripped_qsip_object, table_subsets.paths + compact_tables.paths
+    )
+
+    # a precomputed tube abundance matrix is stored once, compactly, rather
+    # than as an R attribute of the serialized object
+    tube_abundances = _attached_tube_abundances(qsip_object)
+    if tube_abundances is not None:
+        CompactFeatureTable.from_sparse(*tube_abundances).save(
+            df.path / 'tube-abundances.npz'
+        )
+        stripped_qsip_object = _without_tube_abundances(stripped_qsip_object)
+
+    settings = _serialization_settings()
+    if settings.backend == 'rds':
+        _save_rds(
+            stripped_qsip_object,
+            df.path / 'qsip-data.rds',
+            settings.compression,
+            settings.level,
+        )
+    else:
+        ff = _qsip_object_to_format(stripped_qsip_object, format_class())
+        df.qsip_data.write_data(ff, format_class)
+
+    # the metadata tables let the metadata view skip loading the object; no
+    # view reads them from filtered or EAF data, so they are not duplicated
+    # there
+    if metadata_tables:
+        df = _write_metadata_tables(qsip_object, df)
+
+    return df
+
+
+@_traced()
+def _directory_format_to_qsip_object(df, format_class):
+    if (df.path / 'qsip-data.rds').exists():
+        qsip_object = _load_rds(df.path / 'qsip-data.rds')
+    else:
+        qsip_object = _format_to_qsip_object(df.qsip_data.view(format_class))
+
+    # artifacts written before the feature data was stored separately hold
+    # it in the pickled object
+    feature_data_fp = df.path / 'feature-data.npz'
+    if feature_data_fp.exists():
+        feature_table = CompactFeatureTable.load(feature_data_fp)
+        qsip_object = _replace_feature_data(
+            qsip_object, feature_table.to_wide_dataframe()
+        )
+
+    # compact tables are rebuilt first, as tables stored as subsets may be
+    # subsets of them
+    compact_tables_fp = df.path / 'compact-tables.npz'
+    if compact_tables_fp.exists():
+        qsip_object = _with_compact_tables(
+            qsip_object, CompactTables.load(compact_tables_fp)
+        )
+
+    table_subsets_fp = df.path / 'table-subsets.npz'
+    if table_subsets_fp.exists():
+        qsip_object = _with_table_subsets(
+            qsip_object, TableSubsets.load(table_subsets_fp)
+        )
+
+    tube_abundances_fp = df.path / 'tube-abundances.npz'
+    if tube_abundances_fp.exists():
+        tube_table = CompactFeatureTable.load(tube_abundances_fp)
+        qsip_object = _attach_tube_abundances(
+            qsip_object,
+            tube_table.to_sparse(),
+            pd.Index(tube_table.feature_ids),
+            pd.Index(tube_table.sample_ids),
+        )
+
+    return qsip_object
+
+
+def _metadata_directory_format_to_view(df):
+    return QSIP2DataMetadataView(
+        df.path / 'source-data.tsv', df.path / 'sample-data.tsv'
+    )
+
+
 @plugin.register_transformer
 def _1(qsip_object: RS4) -> QSIP2DataUnfilteredFormat:
     ff = QSIP2DataUnfilteredFormat()
@@ -61,3 +205,97 @@ def _5(qsip_object: RS4) -> QSIP2DataEAFFormat:
 @plugin.register_transformer
 def _6(ff: QSIP2DataEAFFormat) -> RS4:
     return _format_to_qsip_object(ff)
+
+
+@plugin.register_transformer
+def _7(qsip_object: RS4) -> QSIP2DataUnfilteredDirectoryFormat:
+    return _qsip_object_to_directory_format(
+        qsip_object,
+        QSIP2DataUnfilteredDirectoryFormat(),
+        QSIP2DataUnfilteredFormat,
+    )
+
+
+@plugin.register_transformer
+def _8(df: QSIP2DataUnfilteredDirectoryFormat) -> RS4:
+    return _directory_format_to_qsip_object(df, QSIP2DataUnfilteredFormat)
+
+
+@plugin.register_transformer
+def _9(df: QSIP2DataUnfilteredDirectoryFormat) -> QSIP2DataMetadataView:
+    # artifacts written before the metadata tables were stored separately
+    # must be loaded in full once to extract them
+    if not (df.path / 'source-data.tsv').exists():
+        qsip_object = _8(df)
+        df = _write_metadata_tables(
+            qsip_object, QSIP2DataMetadataDirectoryFormat()
+        )
+
+    return _metadata_directory_format_to_view(df)
+
+
+@plugin.register_transformer
+def _10(df: QSIP2DataMetadataDirectoryFormat) -> QSIP2DataMetadataView:
+    return _metadata_directory_format_to_view(df)
+
+
+@plugin.register_transformer
+def _11(qsip_object: RS4) -> QSIP2DataFilteredDirectoryFormat:
+    return _qsip_object_to_directory_format(
+        qsip_object,
+        QSIP2DataFilteredDirectoryFormat(),
+        QSIP2DataFilteredFormat,
+        metadata_tables=False,
+    )
+
+
+@plugin.register_transformer
+def _12(df: QSIP2DataFilteredDirectoryFormat) -> RS4:
+    return _directory_format_to_qsip_object(df, QSIP2DataFilteredFormat)
+
+
+@plugin.register_transformer
+def _13(qsip_object: RS4) -> QSIP2DataEAFDirectoryFormat:
+    return _qsip_object_to_directory_format(
+        qsip_object,
+        QSIP2DataEAFDirectoryFormat(),
+        QSIP2DataEAFFormat,
+        metadata_tables=False,
+    )
+
+
+@plugin.register_transformer
+def _14(df: QSIP2DataEAFDirectoryFormat) -> RS4:
+    return _directory_format_to_qsip_object(df, QSIP2DataEAFFormat)
+
+
+@plugin.register_transformer
+def _15(qsip_object: RS4) -> QSIP2DataRDSFormat:
+    ff = QSIP2DataRDSFormat()
+    settings = _serialization_settings()
+    _save_rds(qsip_object, str(ff), settings.compression, settings.level)
+
+    return ff
+
+
+@plugin.register_transformer
+def _16(ff: QSIP2DataRDSFormat) -> RS4:
+    return _load_rds(str(ff))
+
+
+@plugin.register_transformer
+def _17(growth_df: pd.DataFrame) -> QSIP2GrowthFormat:
+    ff = QSIP2GrowthFormat()
+    _save_growth_table(growth_df, str(ff))
+
+    return ff
+
+
+@plugin.register_transformer
+def _18(ff: QSIP2GrowthFormat) -> pd.DataFrame:
+    return _load_growth_table(str(ff))
+
+
+@plugin.register_transformer
+def _19(ff: QSIP2GrowthFormat) -> qiime2.Metadata:
+    return qiime2.Metadata(_growth_metadata(_load_growth_table(str(ff))))
@@ -6,6 +6,7 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import numpy as np
 import rpy2.robjects as ro
 
 import pickle
@@ -13,6 +14,10 @@ import pickle
 from qiime2.plugin import ValidationError
 import qiime2.plugin.model as model
 
+from q2_qsip2._compact import CompactFeatureTable
+from q2_qsip2._growth import GROWTH_COLUMNS
+from q2_qsip2._serialization import _load_rds
+
 
 # TODO: communicate warning about using pickled data
 class QSIP2DataFormatBase(model.BinaryFileFormat):
@@ -36,17 +41,187 @@ class QSIP2DataFormatBase(model.BinaryFileFormat):
             raise ValidationError(msg)
 
 
+class QSIP2DataRDSFormat(model.BinaryFileFormat):
+    '''
+    A qSIP data object written with R's native serialization (RDS), with
+    gzip, xz, zstd, or no compression. Unlike the pickled formats, loading it
+    never unpickles arbitrary python objects.
+    '''
+    def _validate_(self, level):
+        try:
+            qsip_data_obj = _load_rds(str(self))
+            ro.r['validate'](qsip_data_obj)
+        except Exception as e:
+            msg = (
+                'There was a problem loading your qSIP2 data. See the below '
+                f'error message for more detail.\n{str(e)}\n'
+            )
+            raise ValidationError(msg)
+
+
+class QSIP2DataTableFormat(model.TextFileFormat):
+    '''
+    A tab-separated table with a header row, used to store the source- and
+    sample-level data of a qSIP data object outside of the object itself.
+    '''
+    def _validate_(self, level):
+        with self.open() as fh:
+            header = fh.readline().rstrip('\n')
+
+        if not header or '\t' not in header:
+            raise ValidationError(
+                'Expected a tab-separated table with a header row.'
+            )
+
+
+class QSIP2DataFeatureTableFormat(model.BinaryFileFormat):
+    '''
+    A compressed numpy archive holding a `CompactFeatureTable`, used to store
+    the feature data of a qSIP data object outside of the object itself.
+    '''
+    def _validate_(self, level):
+        try:
+            with np.load(str(self), allow_pickle=False) as arrays:
+                missing = set(CompactFeatureTable.ARRAYS) - set(arrays.files)
+        except Exception as e:
+            raise ValidationError(
+                f'Expected a numpy archive of feature data.\n{str(e)}'
+            )
+
+        if missing:
+            raise ValidationError(
+                'The feature data archive is missing the following arrays: '
+                f'{", ".join(sorted(missing))}.'
+            )
+
+
+class QSIP2DataTableSubsetsFormat(model.BinaryFileFormat):
+    '''
+    A compressed numpy archive holding `TableSubsets`: the tables of a qSIP
+    data object that are stored as the rows and columns they keep of another
+    of its tables.
+    '''
+    def _validate_(self, level):
+        try:
+            with np.load(str(self), allow_pickle=False) as arrays:
+                files = set(arrays.files)
+                n_tables = len(arrays['paths'])
+        except Exception as e:
+            raise ValidationError(
+                f'Expected a numpy archive of table subsets.\n{str(e)}'
+            )
+
+        expected = {'paths', 'upstreams'} | {
+            f'{name}_{index}'
+            for name in ('rows', 'columns') for index in range(n_tables)
+        }
+        missing = expected - files
+        if missing:
+            raise ValidationError(
+                'The table subsets archive is missing the following arrays: '
+                f'{", ".join(sorted(missing))}.'
+            )
+
+
+class QSIP2DataCompactTablesFormat(model.BinaryFileFormat):
+    '''
+    A compressed numpy archive holding `CompactTables`: tables of a qSIP data
+    object stored column by column, with integer-coded ids.
+    '''
+    def _validate_(self, level):
+        try:
+            with np.load(str(self), allow_pickle=False) as arrays:
+                files = set(arrays.files)
+                n_tables = len(arrays['paths'])
+                expected = {'paths'}
+                for index in range(n_tables):
+                    n_columns = len(arrays[f'names_{index}'])
+                    expected |= {f'names_{index}', f'kinds_{index}'} | {
+                        f'{name}_{index}_{column}'
+                        for name in ('values', 'dictionary')
+                        for column in range(n_columns)
+                    }
+        except Exception as e:
+            raise ValidationError(
+                f'Expected a numpy archive of compact tables.\n{str(e)}'
+            )
+
+        missing = expected - files
+        if missing:
+            raise ValidationError(
+                'The compact tables archive is missing the following arrays: '
+                f'{", ".join(sorted(missing))}.'
+            )
+
+
+class QSIP2DataMetadataDirectoryFormat(model.DirectoryFormat):
+    source_data = model.File('source-data.tsv', format=QSIP2DataTableFormat)
+    sample_data = model.File('sample-data.tsv', format=QSIP2DataTableFormat)
+
+
+def _validate_single_qsip_data_file(directory_format):
+    written = [
+        filename for filename in ('qsip-data.pickle', 'qsip-data.rds')
+        if (directory_format.path / filename).exists()
+    ]
+
+    if len(written) != 1:
+        raise ValidationError(
+            'Expected exactly one of qsip-data.pickle and qsip-data.rds, '
+            f'found {len(written)}.'
+        )
+
+
 class QSIP2DataUnfilteredFormat(QSIP2DataFormatBase):
     def stage_specific_validation_method(self, qsip_data_obj):
         # TODO: update once implemented in R
         pass
 
 
-QSIP2DataUnfilteredDirectoryFormat = model.SingleFileDirectoryFormat(
-    'QSIP2DataUnfilteredDirectoryFormat',
-    'qsip-data.pickle',
-    QSIP2DataUnfilteredFormat
-)
+class QSIP2DataUnfilteredDirectoryFormat(model.DirectoryFormat):
+    # the object is either pickled or, with the RDS backend, written with R's
+    # native serialization
+    qsip_data = model.File(
+        'qsip-data.pickle', format=QSIP2DataUnfilteredFormat, optional=True
+    )
+    qsip_data_rds = model.File(
+        'qsip-data.rds', format=QSIP2DataRDSFormat, optional=True
+    )
+
+    # the metadata tables are written alongside the qSIP data object so that
+    # they can be read without loading the object; older artifacts lack them
+    source_data = model.File(
+        'source-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+    sample_data = model.File(
+        'sample-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+
+    # if present, the input feature table (the object's `feature_data`) is
+    # stored compactly here and the object holds only a placeholder feature.
+    # The tube abundance matrix precomputed by `create_qsip_data`, if any, is
+    # likewise stored compactly. Tables of the object that are subsets of its
+    # feature data or tube relative abundances are stored as the rows and
+    # columns they keep (see `TableSubsets`), and its other tables, such as
+    # the tube relative abundances, column by column with integer-coded ids
+    # (see `CompactTables`); the object holds them emptied
+    feature_data = model.File(
+        'feature-data.npz', format=QSIP2DataFeatureTableFormat, optional=True
+    )
+    tube_abundances = model.File(
+        'tube-abundances.npz', format=QSIP2DataFeatureTableFormat,
+        optional=True
+    )
+    table_subsets = model.File(
+        'table-subsets.npz', format=QSIP2DataTableSubsetsFormat, optional=True
+    )
+    compact_tables = model.File(
+        'compact-tables.npz', format=QSIP2DataCompactTablesFormat,
+        optional=True
+    )
+
+    def _validate_(self, level):
+        _validate_single_qsip_data_file(self)
 
 
 class QSIP2DataFilteredFormat(QSIP2DataFormatBase):
@@ -55,11 +230,44 @@ class QSIP2DataFilteredFormat(QSIP2DataFormatBase):
         pass
 
 
-QSIP2DataFilteredDirectoryFormat = model.SingleFileDirectoryFormat(
-    'QSIP2DataFilteredDirectoryFormat',
-    'qsip-data.pickle',
-    QSIP2DataFilteredFormat
-)
+class QSIP2DataFilteredDirectoryFormat(model.DirectoryFormat):
+    qsip_data = model.File(
+        'qsip-data.pickle', format=QSIP2DataFilteredFormat, optional=True
+    )
+    qsip_data_rds = model.File(
+        'qsip-data.rds', format=QSIP2DataRDSFormat, optional=True
+    )
+
+    # see QSIP2DataUnfilteredDirectoryFormat. The filtered feature data is
+    # stored as the features and samples it keeps of the feature data, while
+    # tables that are not subsets of another, such as the filtered WADs and
+    # (for EAF data) resamples and EAF values, are stored as compact tables.
+    # The source- and sample-level data is only stored in the object:
+    # the metadata tables are written for unfiltered data alone, and only
+    # older artifacts hold them here
+    source_data = model.File(
+        'source-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+    sample_data = model.File(
+        'sample-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+    feature_data = model.File(
+        'feature-data.npz', format=QSIP2DataFeatureTableFormat, optional=True
+    )
+    tube_abundances = model.File(
+        'tube-abundances.npz', format=QSIP2DataFeatureTableFormat,
+        optional=True
+    )
+    table_subsets = model.File(
+        'table-subsets.npz', format=QSIP2DataTableSubsetsFormat, optional=True
+    )
+    compact_tables = model.File(
+        'compact-tables.npz', format=QSIP2DataCompactTablesFormat,
+        optional=True
+    )
+
+    def _validate_(self, level):
+        _validate_single_qsip_data_file(self)
 
 
 class QSIP2DataEAFFormat(QSIP2DataFormatBase):
@@ -68,8 +276,69 @@ class QSIP2DataEAFFormat(QSIP2DataFormatBase):
         pass
 
 
-QSIP2DataEAFDirectoryFormat = model.SingleFileDirectoryFormat(
-    'QSIP2DataEAFDirectoryFormat',
-    'qsip-data.pickle',
-    QSIP2DataEAFFormat
+class QSIP2DataEAFDirectoryFormat(model.DirectoryFormat):
+    qsip_data = model.File(
+        'qsip-data.pickle', format=QSIP2DataEAFFormat, optional=True
+    )
+    qsip_data_rds = model.File(
+        'qsip-data.rds', format=QSIP2DataRDSFormat, optional=True
+    )
+
+    # see QSIP2DataUnfilteredDirectoryFormat. The filtered feature data is
+    # stored as the features and samples it keeps of the feature data, while
+    # tables that are not subsets of another, such as the filtered WADs and
+    # (for EAF data) resamples and EAF values, are stored as compact tables.
+    # The source- and sample-level data is only stored in the object:
+    # the metadata tables are written for unfiltered data alone, and only
+    # older artifacts hold them here
+    source_data = model.File(
+        'source-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+    sample_data = model.File(
+        'sample-data.tsv', format=QSIP2DataTableFormat, optional=True
+    )
+    feature_data = model.File(
+        'feature-data.npz', format=QSIP2DataFeatureTableFormat, optional=True
+    )
+    tube_abundances = model.File(
+        'tube-abundances.npz', format=QSIP2DataFeatureTableFormat,
+        optional=True
+    )
+    table_subsets = model.File(
+        'table-subsets.npz', format=QSIP2DataTableSubsetsFormat, optional=True
+    )
+    compact_tables = model.File(
+        'compact-tables.npz', format=QSIP2DataCompactTablesFormat,
+        optional=True
+    )
+
+    def _validate_(self, level):
+        _validate_single_qsip_data_file(self)
+
+
+class QSIP2GrowthFormat(model.BinaryFileFormat):
+    '''
+    A compressed numpy archive holding a growth table column by column, with
+    one row per feature and bootstrap replicate.
+    '''
+    ARRAYS = ('feature_ids', 'feature_codes') + GROWTH_COLUMNS
+
+    def _validate_(self, level):
+        try:
+            with np.load(str(self), allow_pickle=False) as arrays:
+                missing = set(self.ARRAYS) - set(arrays.files)
+        except Exception as e:
+            raise ValidationError(
+                f'Expected a numpy archive of growth rates.\n{str(e)}'
+            )
+
+        if missing:
+            raise ValidationError(
+                'The growth rate archive is missing the following arrays: '
+                f'{", ".join(sorted(missing))}.'
+            )
+
+
+QSIP2GrowthDirectoryFormat = model.SingleFileDirectoryFormat(
+    'QSIP2GrowthDirectoryFormat', 'growth-rates.npz', QSIP2GrowthFormat
 )
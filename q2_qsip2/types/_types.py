@@ -16,3 +16,5 @@ Unfiltered = SemanticType('Unfiltered', variant_of=QSIP2Data.field['stage'])
 Filtered = SemanticType('Filtered', variant_of=QSIP2Data.field['stage'])
 
 EAF = SemanticType('EAF', variant_of=QSIP2Data.field['stage'])
+
+QSIP2GrowthRates = SemanticType('QSIP2GrowthRates')
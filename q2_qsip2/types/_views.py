@@ -0,0 +1,51 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import pandas as pd
+
+from functools import cached_property
+from pathlib import Path
+
+
+class QSIP2DataMetadataView:
+    '''
+    A lazily loaded view of only the source- and sample-level data of a qSIP
+    data artifact. Nothing is read from disk until one of the tables is first
+    accessed, and the feature data is never read, so the cost of the view
+    does not depend on the number of features.
+
+    Parameters
+    ----------
+    source_data_fp : Path
+        The path to the tab-separated source-level data.
+    sample_data_fp : Path
+        The path to the tab-separated sample-level data.
+    '''
+    def __init__(self, source_data_fp: Path, sample_data_fp: Path):
+        self.source_data_fp = Path(source_data_fp)
+        self.sample_data_fp = Path(sample_data_fp)
+
+    @cached_property
+    def source_data(self) -> pd.DataFrame:
+        '''
+        The source-level data, with a 'source_mat_id' column.
+        '''
+        return pd.read_csv(
+            self.source_data_fp, sep='\t', dtype={'source_mat_id': str}
+        )
+
+    @cached_property
+    def sample_data(self) -> pd.DataFrame:
+        '''
+        The sample-level data, with 'sample_id' and 'source_mat_id' columns.
+        '''
+        return pd.read_csv(
+            self.sample_data_fp,
+            sep='\t',
+            dtype={'sample_id': str, 'source_mat_id': str},
+        )
@@ -6,15 +6,29 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import biom
+import numpy as np
+import pandas as pd
 import rpy2.robjects as ro
 from rpy2.robjects.methods import RS4
 
 import importlib.resources
 import pickle
 
+import qiime2
 from qiime2.plugin.testing import TestPluginBase
 
-from q2_qsip2.types import QSIP2DataUnfilteredFormat
+from q2_qsip2._compact import CompactTables
+from q2_qsip2._qsip_object import (
+    _attached_tube_abundances, _find_table_subsets, _get_table_R,
+    _get_tube_abundances, _property_to_dataframe, _r_to_dataframe,
+    _table_paths, _without_tube_abundances
+)
+from q2_qsip2.types import (
+    QSIP2DataUnfilteredFormat, QSIP2DataUnfilteredDirectoryFormat,
+    QSIP2DataFilteredDirectoryFormat, QSIP2DataMetadataView, QSIP2GrowthFormat
+)
+from q2_qsip2.workflow import create_qsip_data, subset_and_filter
 
 
 class TestTransformers(TestPluginBase):
@@ -49,3 +63,306 @@ class TestTransformers(TestPluginBase):
         self.assertEqual(
             pickle.dumps(qsip_object), pickle.dumps(round_tripped_qsip_object)
         )
+
+    def create_qsip_object(self, **kwargs):
+        data_dir = importlib.resources.files(__package__) / 'data'
+
+        source_md = qiime2.Metadata(
+            pd.read_csv(data_dir / 'source.tsv', sep='\t', index_col=0)
+        )
+        sample_md = qiime2.Metadata(
+            pd.read_csv(data_dir / 'sample.tsv', sep='\t', index_col=0)
+        )
+        table_df = pd.read_csv(data_dir / 'feature.tsv', sep='\t', index_col=0)
+        table = biom.Table(
+            table_df.values,
+            observation_ids=table_df.index,
+            sample_ids=table_df.columns
+        )
+
+        return create_qsip_data(table, sample_md, source_md, **kwargs)
+
+    def test_object_to_directory_format_writes_metadata(self):
+        transformer = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+
+        df = transformer(self.create_qsip_object())
+        df.validate()
+
+        self.assertTrue((df.path / 'source-data.tsv').exists())
+        self.assertTrue((df.path / 'sample-data.tsv').exists())
+
+    def test_directory_format_to_metadata_view(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+        to_view = self.get_transformer(
+            QSIP2DataUnfilteredDirectoryFormat, QSIP2DataMetadataView
+        )
+
+        view = to_view(to_format(self.create_qsip_object()))
+
+        data_dir = importlib.resources.files(__package__) / 'data'
+        source_df = pd.read_csv(data_dir / 'source.tsv', sep='\t')
+        sample_df = pd.read_csv(data_dir / 'sample.tsv', sep='\t')
+
+        self.assertEqual(len(view.source_data), len(source_df))
+        self.assertEqual(len(view.sample_data), len(sample_df))
+        self.assertIn('S149', set(view.source_data['source_mat_id']))
+
+    def test_directory_format_stores_compact_feature_data(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataUnfilteredDirectoryFormat, RS4
+        )
+
+        qsip_object = self.create_qsip_object()
+        df = to_format(qsip_object)
+        df.validate()
+
+        self.assertTrue((df.path / 'feature-data.npz').exists())
+
+        round_tripped = to_object(df)
+        ro.r['validate'](round_tripped)
+
+        exp = _property_to_dataframe(qsip_object, 'feature_data', 'data')
+        obs = _property_to_dataframe(round_tripped, 'feature_data', 'data')
+        pd.testing.assert_frame_equal(obs, exp, check_dtype=False)
+
+    def test_filtered_directory_format_stores_compact_feature_data(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataFilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataFilteredDirectoryFormat, RS4
+        )
+
+        filtered_qsip_object = subset_and_filter(
+            self.create_qsip_object(),
+            unlabeled_sources=['S149', 'S150', 'S151', 'S152'],
+            labeled_sources=['S178', 'S179', 'S180'],
+        )
+        df = to_format(filtered_qsip_object)
+        df.validate()
+
+        self.assertTrue((df.path / 'feature-data.npz').exists())
+
+        round_tripped = to_object(df)
+        ro.r['validate'](round_tripped)
+
+        for path in (('feature_data', 'data'), ('filtered_wad_data',)):
+            pd.testing.assert_frame_equal(
+                _property_to_dataframe(round_tripped, *path),
+                _property_to_dataframe(filtered_qsip_object, *path),
+                check_dtype=False,
+            )
+
+    def assert_tables_equal(self, obs, exp, paths):
+        for path in paths:
+            pd.testing.assert_frame_equal(
+                _r_to_dataframe(_get_table_R(obs, ro.StrVector(path))),
+                _r_to_dataframe(_get_table_R(exp, ro.StrVector(path))),
+                check_dtype=False,
+            )
+
+    def test_filtered_directory_format_stores_only_filtered_tables(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataFilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataFilteredDirectoryFormat, RS4
+        )
+
+        filtered_qsip_object = subset_and_filter(
+            self.create_qsip_object(),
+            unlabeled_sources=['S149', 'S150', 'S151', 'S152'],
+            labeled_sources=['S178', 'S179', 'S180'],
+        )
+        df = to_format(filtered_qsip_object)
+        df.validate()
+
+        # the source- and sample-level data is only stored in the object
+        self.assertFalse((df.path / 'source-data.tsv').exists())
+        self.assertFalse((df.path / 'sample-data.tsv').exists())
+
+        round_tripped = to_object(df)
+        ro.r['validate'](round_tripped)
+        self.assert_tables_equal(
+            round_tripped, filtered_qsip_object,
+            _table_paths(filtered_qsip_object)
+        )
+
+    def test_directory_format_stores_long_tables_compactly(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataUnfilteredDirectoryFormat, RS4
+        )
+
+        qsip_object = self.create_qsip_object()
+        df = to_format(qsip_object)
+        df.validate()
+
+        compact_tables = CompactTables.load(df.path / 'compact-tables.npz')
+        self.assertIn(('tube_rel_abundance',), compact_tables.paths)
+
+        index = compact_tables.paths.index(('tube_rel_abundance',))
+        tube_df = _property_to_dataframe(qsip_object, 'tube_rel_abundance')
+        table_nbytes = sum(
+            array.nbytes for array in
+            compact_tables.values[index] + compact_tables.dictionaries[index]
+        )
+        self.assertLess(
+            table_nbytes, tube_df.memory_usage(deep=True, index=False).sum()
+        )
+
+        # the serialized object holds the table emptied
+        with open(df.path / 'qsip-data.pickle', 'rb') as fh:
+            stripped_qsip_object = pickle.load(fh)
+        self.assertEqual(
+            len(_property_to_dataframe(
+                stripped_qsip_object, 'tube_rel_abundance'
+            )),
+            0,
+        )
+
+        round_tripped = to_object(df)
+        ro.r['validate'](round_tripped)
+        self.assert_tables_equal(
+            round_tripped, qsip_object, _table_paths(qsip_object)
+        )
+        for path in _table_paths(qsip_object):
+            self.assertEqual(
+                list(ro.r['class'](
+                    _get_table_R(round_tripped, ro.StrVector(path))
+                )),
+                list(ro.r['class'](
+                    _get_table_R(qsip_object, ro.StrVector(path))
+                )),
+            )
+
+    def test_table_subsets_are_rebuilt_from_feature_data(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataUnfilteredDirectoryFormat, RS4
+        )
+        with_feature_subset = ro.r('''
+            function(qsip_data_object) {
+                feature_df <- S7::prop(
+                    S7::prop(qsip_data_object, "feature_data"), "data"
+                )
+                S7::prop(
+                    qsip_data_object, "filtered_feature_data", check = FALSE
+                ) <- feature_df[c(3, 1), c(names(feature_df)[2], "feature_id")]
+                qsip_data_object
+            }
+        ''')
+
+        qsip_object = with_feature_subset(self.create_qsip_object())
+        subsets = _find_table_subsets(qsip_object)
+
+        index = subsets.paths.index(('filtered_feature_data',))
+        self.assertEqual(subsets.upstreams[index], ('feature_data', 'data'))
+        np.testing.assert_array_equal(subsets.rows[index], [2, 0])
+        self.assertEqual(subsets.columns[index][1], 'feature_id')
+
+        df = to_format(qsip_object)
+        df.validate()
+        self.assertTrue((df.path / 'table-subsets.npz').exists())
+
+        self.assert_tables_equal(
+            to_object(df), qsip_object, [('filtered_feature_data',)]
+        )
+
+    def assert_tube_abundances_equal(self, obs, exp):
+        self.assertEqual(obs[0].shape, exp[0].shape)
+        self.assertEqual((obs[0] != exp[0]).nnz, 0)
+        pd.testing.assert_index_equal(obs[1], exp[1])
+        pd.testing.assert_index_equal(obs[2], exp[2])
+
+    def test_precomputed_tube_abundances_match_computed(self):
+        qsip_object = self.create_qsip_object(
+            precompute_tube_abundances=True
+        )
+        attached = _attached_tube_abundances(qsip_object)
+        self.assertIsNotNone(attached)
+
+        computed = _get_tube_abundances(_without_tube_abundances(qsip_object))
+        order = [computed[1].get_loc(id_) for id_ in attached[1]]
+        columns = [computed[2].get_loc(id_) for id_ in attached[2]]
+        self.assertTrue(np.allclose(
+            attached[0].toarray(),
+            computed[0].toarray()[np.ix_(order, columns)],
+        ))
+
+    def test_tube_abundances_survive_filtering_and_round_trip(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataFilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataFilteredDirectoryFormat, RS4
+        )
+
+        qsip_object = self.create_qsip_object(
+            precompute_tube_abundances=True
+        )
+        filtered_qsip_object = subset_and_filter(
+            qsip_object,
+            unlabeled_sources=['S149', 'S150', 'S151', 'S152'],
+            labeled_sources=['S178', 'S179', 'S180'],
+        )
+        exp = _attached_tube_abundances(qsip_object)
+        self.assert_tube_abundances_equal(
+            _attached_tube_abundances(filtered_qsip_object), exp
+        )
+
+        df = to_format(filtered_qsip_object)
+        df.validate()
+        self.assertTrue((df.path / 'tube-abundances.npz').exists())
+
+        round_tripped = to_object(df)
+        ro.r['validate'](round_tripped)
+        self.assert_tube_abundances_equal(
+            _attached_tube_abundances(round_tripped), exp
+        )
+
+    def test_directory_format_without_tube_abundances(self):
+        to_format = self.get_transformer(
+            RS4, QSIP2DataUnfilteredDirectoryFormat
+        )
+        to_object = self.get_transformer(
+            QSIP2DataUnfilteredDirectoryFormat, RS4
+        )
+
+        df = to_format(self.create_qsip_object())
+
+        self.assertFalse((df.path / 'tube-abundances.npz').exists())
+        self.assertIsNone(_attached_tube_abundances(to_object(df)))
+
+    def test_growth_format_to_metadata(self):
+        growth_df = pd.DataFrame({
+            'feature_id': ['f1', 'f1'],
+            'resample': [0, 1],
+            'EAF': [0.1, 0.2],
+            'N_total_i0': [10.0, 10.0],
+            'N_total_it': [20.0, 20.0],
+            'N_light_it': [18.0, 16.0],
+            'birth_rate': [0.1, 0.2],
+            'death_rate': [0.5, 0.4],
+            'net_growth_rate': [0.6, 0.6],
+        })
+        ff = self.get_transformer(pd.DataFrame, QSIP2GrowthFormat)(growth_df)
+
+        transformer = self.get_transformer(QSIP2GrowthFormat, qiime2.Metadata)
+        metadata = transformer(ff)
+
+        self.assertEqual(metadata.ids, ('f1-0', 'f1-1'))
+        self.assertEqual(
+            list(metadata.get_column('birth_rate').to_series()), [0.1, 0.2]
+        )
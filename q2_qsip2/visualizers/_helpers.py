@@ -6,27 +6,116 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import pandas as pd
 from rpy2.robjects.packages import importr
 
+import html
 import importlib.resources
+import json
 from pathlib import Path
 import shutil
 
 ggplot2 = importr('ggplot2')
 
 
-def _ggplot2_object_to_visualization(
-    ggplot2_obj: object, output_dir: Path, width: int, height: int
+def _save_ggplot2_figure(
+    ggplot2_obj: object, fp: Path, width: int, height: int
 ) -> None:
     '''
+    Saves a ggplot2 plot as an SVG figure.
     '''
-    index = importlib.resources.files('q2_qsip2') / 'assets' / 'index.html'
-    shutil.copy(index, output_dir)
-
     ggplot2.ggsave(
-        filename=str(output_dir / 'figure.svg'),
+        filename=str(fp),
         plot=ggplot2_obj,
         device='svg',
         width=width,
         height=height,
     )
+
+
+def _ggplot2_object_to_visualization(
+    ggplot2_obj: object, output_dir: Path, width: int, height: int
+) -> None:
+    '''
+    '''
+    index = importlib.resources.files('q2_qsip2') / 'assets' / 'index.html'
+    shutil.copy(index, output_dir)
+
+    _save_ggplot2_figure(
+        ggplot2_obj, output_dir / 'figure.svg', width=width, height=height
+    )
+
+
+def _dataframe_to_table_visualization(
+    df: pd.DataFrame,
+    output_dir: Path,
+    tsv_filename: str,
+    html_filename: str = 'index.html',
+) -> None:
+    '''
+    Writes `df` as a TSV file and as a searchable, paginated HTML table. The
+    rows are embedded in the page and rendered one page at a time in the
+    browser, so the page opens instantly regardless of the size of `df`.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The table to display. The index is not displayed.
+    output_dir : Path
+        The root directory of the visualization loaded into the browser.
+    tsv_filename : str
+        The name of the TSV file offered for download.
+    html_filename : str
+        The name of the HTML page.
+    '''
+    df.to_csv(output_dir / tsv_filename, sep='\t', index=False)
+
+    rows = df.astype(object).where(df.notna(), None).to_numpy().tolist()
+    table_data = json.dumps(
+        {'columns': [str(column) for column in df.columns], 'rows': rows}
+    ).replace('</', '<\\/')
+
+    template = (
+        importlib.resources.files('q2_qsip2') / 'assets' / 'table.html'
+    ).read_text()
+    page = (
+        template
+        .replace('@@TSV_FILENAME@@', tsv_filename)
+        .replace('@@TABLE_DATA@@', table_data)
+    )
+
+    with open(output_dir / html_filename, 'w') as fh:
+        fh.write(page)
+
+
+def _tabbed_report(output_dir: Path, tabs: list[tuple[str, str, str]]) -> None:
+    '''
+    Writes an index.html with one tab per report section.
+
+    Parameters
+    ----------
+    output_dir : Path
+        The root directory of the visualization loaded into the browser.
+    tabs : list[tuple[str, str, str]]
+        The id, title, and HTML content of each tab, in display order.
+    '''
+    buttons = '\n'.join(
+        f'            <button data-tab="{tab_id}">{html.escape(title)}</button>'
+        for tab_id, title, _ in tabs
+    )
+    panels = '\n'.join(
+        f'        <div class="panel" id="{tab_id}">{content}</div>'
+        for tab_id, _, content in tabs
+    )
+
+    template = (
+        importlib.resources.files('q2_qsip2') / 'assets' / 'report.html'
+    ).read_text()
+    report = (
+        template
+        .replace('@@TAB_BUTTONS@@', buttons)
+        .replace('@@TAB_PANELS@@', panels)
+    )
+
+    with open(output_dir / 'index.html', 'w') as fh:
+        fh.write(report)
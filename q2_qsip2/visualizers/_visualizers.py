@@ -6,21 +6,41 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
-import rpy2.robjects as ro
 from rpy2.robjects.methods import RS4
 from rpy2.robjects.packages import importr
-from rpy2.robjects import pandas2ri
 
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from typing import Optional
 from pathlib import Path
 
-from q2_qsip2.visualizers._helpers import _ggplot2_object_to_visualization
+from q2_qsip2._profiling import _r_profiled
+from q2_qsip2._qsip_object import _metadata_only_qsip_object
+from q2_qsip2._wrangling import _comparison_groups
+from q2_qsip2.types import QSIP2DataMetadataView
+from q2_qsip2.visualizers._helpers import (
+    _dataframe_to_table_visualization, _ggplot2_object_to_visualization,
+    _save_ggplot2_figure, _tabbed_report
+)
 
 qsip2 = importr('qSIP2')
 
+# the figures of the QC report: tab id -> (title, qSIP2 function, width,
+# height)
+QC_FIGURES = {
+    'weighted-average-densities': (
+        'Weighted average densities', 'plot_source_wads', 10, 4
+    ),
+    'sample-curves': ('Sample curves', 'plot_sample_curves', 10, 10),
+    'density-outliers': ('Density outliers', 'plot_density_outliers', 10, 10),
+}
 
+
+@_r_profiled
 def plot_weighted_average_densities(
-    output_dir: str, qsip_data: RS4, group: Optional[str] = None
+    output_dir: str,
+    qsip_data: QSIP2DataMetadataView,
+    group: Optional[str] = None
 ) -> None:
     '''
     Plots the per-source weighted average density, colored by isotope and
@@ -30,23 +50,30 @@ def plot_weighted_average_densities(
     ----------
     output_dir : str
         The root directory of the visualization loaded into the browser.
-    qsip_data : RS4
-        The "qsip_data" object.
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
     group : str | None
         An optional source-level metadata column used to facet the plot of
         weighted average densities.
     '''
+    qsip_object = _metadata_only_qsip_object(
+        qsip_data.source_data, qsip_data.sample_data
+    )
+
     if group:
-        plot = qsip2.plot_source_wads(qsip_data, group=group)
+        plot = qsip2.plot_source_wads(qsip_object, group=group)
     else:
-        plot = qsip2.plot_source_wads(qsip_data)
+        plot = qsip2.plot_source_wads(qsip_object)
 
     _ggplot2_object_to_visualization(
         plot, Path(output_dir), width=10, height=4
     )
 
 
-def plot_sample_curves(output_dir: str, qsip_data: RS4) -> None:
+@_r_profiled
+def plot_sample_curves(
+    output_dir: str, qsip_data: QSIP2DataMetadataView
+) -> None:
     '''
     Plots gradient position by relative amount of DNA, faceted by source.
 
@@ -54,17 +81,24 @@ def plot_sample_curves(output_dir: str, qsip_data: RS4) -> None:
     ----------
     output_dir : str
         The root directory of the visualization loaded into the browser.
-    qsip_data : RS4
-        The "qsip_data" object.
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
     '''
-    plot = qsip2.plot_sample_curves(qsip_data)
+    qsip_object = _metadata_only_qsip_object(
+        qsip_data.source_data, qsip_data.sample_data
+    )
+
+    plot = qsip2.plot_sample_curves(qsip_object)
 
     _ggplot2_object_to_visualization(
         plot, Path(output_dir), width=10, height=10
     )
 
 
-def plot_density_outliers(output_dir: str, qsip_data: RS4) -> None:
+@_r_profiled
+def plot_density_outliers(
+    output_dir: str, qsip_data: QSIP2DataMetadataView
+) -> None:
     '''
     Plots gradient position by density, faceted by source, and performs
     Cook's outlier detection.
@@ -73,10 +107,14 @@ def plot_density_outliers(output_dir: str, qsip_data: RS4) -> None:
     ----------
     output_dir : str
         The root directory of the visualization loaded into the browser.
-    qsip_data : RS4
-        The "qsip_data" object.
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
     '''
-    plot = qsip2.plot_density_outliers(qsip_data)
+    qsip_object = _metadata_only_qsip_object(
+        qsip_data.source_data, qsip_data.sample_data
+    )
+
+    plot = qsip2.plot_density_outliers(qsip_object)
 
     _ggplot2_object_to_visualization(
         plot, Path(output_dir), width=10, height=10
@@ -84,30 +122,32 @@ def plot_density_outliers(output_dir: str, qsip_data: RS4) -> None:
 
 
 def show_comparison_groups(
-    output_dir: str, qsip_data: RS4, groups: list
+    output_dir: str, qsip_data: QSIP2DataMetadataView, groups: list
 ) -> None:
     '''
     Displays a table of ids grouped in columns by isotope, and in rows by the
-    given groups.
+    given groups. The grouping is computed from the source-level data alone,
+    and the table is rendered as a searchable, paginated page with a TSV
+    download.
 
     Parameters
     ----------
     output_dir : str
         The root directory of the visualization loaded into the browser.
-    qsip_data : RS4
-        The "qsip_data" object.
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
     groups : list[str]
         The names of one or more source-level metadata columns used to further
         subdivide the labeled and unlabeled samples.
     '''
-    groups_vector = ro.vectors.StrVector(groups)
+    comparison_df = _comparison_groups(qsip_data.source_data, groups)
 
-    with (ro.default_converter + pandas2ri.converter).context():
-        df = qsip2.show_comparison_groups(qsip_data, groups_vector)
-
-    df.to_html(Path(output_dir) / 'index.html')
+    _dataframe_to_table_visualization(
+        comparison_df, Path(output_dir), 'comparison-groups.tsv'
+    )
 
 
+@_r_profiled
 def plot_filtered_features(output_dir: str, filtered_qsip_data: RS4) -> None:
     '''
     Displays per-source stacked bar charts showing the retention of features.
@@ -126,6 +166,7 @@ def plot_filtered_features(output_dir: str, filtered_qsip_data: RS4) -> None:
     )
 
 
+@_r_profiled
 def plot_excess_atom_fractions(
     output_dir: str,
     eaf_qsip_data: RS4,
@@ -155,3 +196,126 @@ def plot_excess_atom_fractions(
     _ggplot2_object_to_visualization(
         plot, Path(output_dir), width=10, height=10
     )
+
+
+def _render_qc_figure(
+    qsip_object: RS4, name: str, output_dir: Path, group: Optional[str]
+) -> str:
+    '''
+    Renders one figure of the QC report to `output_dir`/`name`.svg.
+    '''
+    _, function_name, width, height = QC_FIGURES[name]
+    plot_function = getattr(qsip2, function_name)
+
+    if function_name == 'plot_source_wads' and group:
+        plot = plot_function(qsip_object, group=group)
+    else:
+        plot = plot_function(qsip_object)
+
+    _save_ggplot2_figure(
+        plot, output_dir / f'{name}.svg', width=width, height=height
+    )
+
+    return name
+
+
+def _render_qc_figure_in_worker(
+    source_data_fp: Path,
+    sample_data_fp: Path,
+    name: str,
+    output_dir: Path,
+    group: Optional[str],
+) -> str:
+    '''
+    Renders one figure of the QC report in a worker process, which has its
+    own embedded R session and so builds its own (metadata-only) object.
+    '''
+    qsip_data = QSIP2DataMetadataView(source_data_fp, sample_data_fp)
+    qsip_object = _metadata_only_qsip_object(
+        qsip_data.source_data, qsip_data.sample_data
+    )
+
+    return _render_qc_figure(qsip_object, name, output_dir, group)
+
+
+@_r_profiled
+def qc_report(
+    output_dir: str,
+    qsip_data: QSIP2DataMetadataView,
+    group: Optional[str] = None,
+    groups: Optional[list] = None,
+    n_jobs: int = 1,
+) -> None:
+    '''
+    Renders the weighted average density, sample curve, and density outlier
+    figures, and optionally the comparison groups table, as one tabbed
+    report. The data is loaded once and shared by every figure, or, with
+    `n_jobs` greater than one, the figures are rendered in parallel worker
+    processes.
+
+    Parameters
+    ----------
+    output_dir : str
+        The root directory of the visualization loaded into the browser.
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
+    group : str | None
+        An optional source-level metadata column used to facet the plot of
+        weighted average densities.
+    groups : list[str] | None
+        If given, the source-level metadata columns used to group sources in
+        the comparison groups table. The table is omitted otherwise.
+    n_jobs : int
+        The number of worker processes used to render figures. R profiling
+        (see `_rprof`) only covers this process, so figures rendered by
+        workers are not profiled.
+    '''
+    output_dir = Path(output_dir)
+
+    if n_jobs > 1:
+        # workers are spawned rather than forked, as a forked embedded R
+        # session is not safe to use
+        with ProcessPoolExecutor(
+            max_workers=min(n_jobs, len(QC_FIGURES)),
+            mp_context=multiprocessing.get_context('spawn'),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _render_qc_figure_in_worker,
+                    qsip_data.source_data_fp,
+                    qsip_data.sample_data_fp,
+                    name,
+                    output_dir,
+                    group,
+                )
+                for name in QC_FIGURES
+            ]
+            for future in futures:
+                future.result()
+    else:
+        qsip_object = _metadata_only_qsip_object(
+            qsip_data.source_data, qsip_data.sample_data
+        )
+        for name in QC_FIGURES:
+            _render_qc_figure(qsip_object, name, output_dir, group)
+
+    tabs = [
+        (name, title, f'<img src="{name}.svg" />')
+        for name, (title, *_) in QC_FIGURES.items()
+    ]
+
+    if groups:
+        comparison_df = _comparison_groups(qsip_data.source_data, groups)
+        _dataframe_to_table_visualization(
+            comparison_df,
+            output_dir,
+            'comparison-groups.tsv',
+            html_filename='comparison-groups.html',
+        )
+        tabs.append((
+            'comparison-groups',
+            'Comparison groups',
+            '<iframe src="comparison-groups.html"></iframe>',
+        ))
+
+    _tabbed_report(output_dir, tabs)
@@ -6,11 +6,73 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import pandas as pd
+
+import json
+from pathlib import Path
+import re
+import tempfile
+
 from qiime2.plugin.testing import TestPluginBase
 
+from q2_qsip2.visualizers._helpers import (
+    _dataframe_to_table_visualization, _tabbed_report
+)
+
 
 class VisualizerTests(TestPluginBase):
     package = 'q2_qsip2.visualizers.tests'
 
     def test_weighted_average_density_visualizer(self):
         pass
+
+    def test_dataframe_to_table_visualization(self):
+        df = pd.DataFrame({
+            'moisture': ['wet', 'dry'],
+            '12C': ['s1, s5', None],
+            '13C': ['</script>', 's4'],
+        })
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            _dataframe_to_table_visualization(df, output_dir, 'groups.tsv')
+
+            tsv_df = pd.read_csv(output_dir / 'groups.tsv', sep='\t')
+            html = (output_dir / 'index.html').read_text()
+
+        pd.testing.assert_frame_equal(tsv_df, df.fillna(float('nan')))
+        self.assertIn('href="groups.tsv"', html)
+
+        table_data = re.search(
+            r'<script type="application/json" id="table-data">(.*?)</script>',
+            html,
+            re.DOTALL,
+        ).group(1)
+        self.assertEqual(
+            json.loads(table_data),
+            {
+                'columns': ['moisture', '12C', '13C'],
+                'rows': [
+                    ['wet', 's1, s5', '</script>'],
+                    ['dry', None, 's4'],
+                ],
+            }
+        )
+
+    def test_tabbed_report(self):
+        tabs = [
+            ('sample-curves', 'Sample curves', '<img src="a.svg" />'),
+            ('groups', 'Groups & sources', '<iframe src="b.html"></iframe>'),
+        ]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            _tabbed_report(output_dir, tabs)
+            html = (output_dir / 'index.html').read_text()
+
+        self.assertIn('<button data-tab="sample-curves">Sample curves', html)
+        self.assertIn('Groups &amp; sources</button>', html)
+        self.assertIn(
+            '<div class="panel" id="groups"><iframe src="b.html">', html
+        )
+        self.assertNotIn('@@', html)
@@ -7,6 +7,7 @@
 # ----------------------------------------------------------------------------
 
 import biom
+import pandas as pd
 import rpy2.robjects as ro
 from rpy2.robjects.packages import importr
 from rpy2.robjects.methods import RS4
@@ -15,15 +16,53 @@ from rpy2.robjects import pandas2ri
 from typing import Optional
 
 import qiime2
+from q2_types.feature_table import BIOMV210Format
 
+from q2_qsip2._biom_io import _biom_sample_ids, _read_biom_samples
+from q2_qsip2._comparisons import _parse_comparisons
+from q2_qsip2._compact import CompactFeatureTable
+from q2_qsip2._growth import (
+    _eaf_matrix, _growth_rates, _growth_table, _labeled_abundances,
+    _labeled_sources
+)
+from q2_qsip2._outliers import _density_outliers
+from q2_qsip2._profiling import _r_profiled
+from q2_qsip2._progress import _run_as_single_chunk, logger
+from q2_qsip2._qsip_object import (
+    _attach_tube_abundances, _build_qsip_object, _get_property,
+    _get_tube_abundances, _property_nrow, _property_to_dataframe
+)
+from q2_qsip2._tracing import _nbytes, _trace, _traced
+from q2_qsip2._resampling import (
+    DEFAULT_BLOCK_SIZE, _deduplicated_features, _empty_shard, _expand_features,
+    _memory_block_size, _merge_shards, _parse_memory, _resample_in_blocks,
+    _shard_features, _shard_seed, _subset_features
+)
+from q2_qsip2._wads import _tube_abundances
+from q2_qsip2.types import QSIP2DataMetadataView
 from q2_qsip2._wrangling import (
+    _collapse_table,
     _construct_column_mapping,
     _handle_metadata,
+    _merge_metadata,
+    _reconcile_ids,
+    _select_features,
 )
 
 qsip2 = importr('qSIP2')
 importr('S7')
 
+_merge_feature_data_R = ro.r('''
+    function(feature_dfs) {
+        merge_two <- function(x, y) {
+            merge(x, y, by = "feature_id", all = TRUE, sort = FALSE)
+        }
+        merged <- Reduce(merge_two, feature_dfs)
+        merged[is.na(merged)] <- 0
+        merged
+    }
+''')
+
 
 def standard_workflow(
     table: biom.Table,
@@ -33,16 +72,23 @@ def standard_workflow(
     return table
 
 
+@_traced()
+@_r_profiled
 def create_qsip_data(
-    table: biom.Table,
+    table: BIOMV210Format,
     sample_metadata: qiime2.Metadata,
     source_metadata: Optional[qiime2.Metadata] = None,
+    taxonomy: Optional[pd.DataFrame] = None,
     source_mat_id_column: str = 'source_mat_id',
     isotope_column: str = 'isotope',
     isotopolog_column: str = 'isotopolog',
     gradient_position_column: str = 'gradient_position',
     gradient_pos_density_column: str = 'gradient_pos_density',
     gradient_pos_amt_column: str = 'gradient_pos_amt',
+    precompute_tube_abundances: bool = False,
+    collapse_level: Optional[int] = None,
+    subset_samples: bool = False,
+    auto_subset: bool = False,
 ) -> RS4:
     '''
     Validates and combines the sample-level and source-level metadata files.
@@ -51,13 +97,15 @@ def create_qsip_data(
 
     Parameters
     ----------
-    table : biom.Table
+    table : BIOMV210Format or biom.Table
         The feature table containing sample ids on one axis and feature ids
         on the other.
     sample_metadata : qiime2.Metadata
         The sample-level metadata file.
     source_metadata : qiime2.Metadata
         The source-level metadata file.
+    taxonomy : pd.DataFrame
+        The feature taxonomy. Required if `collapse_level` is given.
     source_mat_id_column : str
         The name of the source material id column in the sample-level metadata.
     isotope_column : str
@@ -72,12 +120,38 @@ def create_qsip_data(
     gradient_pos_amt_column : str
         The name of the gradient position amount column in the sample-level
         metadata.
+    precompute_tube_abundances : bool
+        Whether to scale the relative abundances of every sample by its DNA
+        amount now, as a sparse matrix, and store the result with the qSIP
+        data object, so that later python-side WAD and growth calculations
+        read it (see `_get_tube_abundances`) rather than rebuilding it from
+        the feature data. The matrix is kept by `subset_and_filter` and
+        `resample_and_calculate_EAF`.
+    collapse_level : int
+        If given, features are collapsed to this taxonomic level (e.g. 6 for
+        genus in a seven-rank taxonomy) before the qSIP data object is built.
+    subset_samples : bool
+        Whether to read only the samples in `sample_metadata`, and only the
+        features observed in them, from the BIOM file in chunks, instead of
+        loading the whole table. Peak memory then scales with the qSIP
+        samples rather than with the full table.
+    auto_subset : bool
+        Whether to keep only the samples and sources that match across the
+        feature table, sample metadata, and source metadata, instead of
+        raising an error when they do not.
 
     Returns
     -------
     RObject
         The qSIP data object as created by the qSIP2 R package. This wraps the
         sample metadata, the source metadata, and the feature table.
+
+    Raises
+    ------
+    ValueError
+        If only one of `taxonomy` and `collapse_level` is given, or if the
+        sample and source ids do not agree across the inputs and
+        `auto_subset` is False.
     '''
 
     # generate source-level metadata if necessary, and validate both it and
@@ -91,39 +165,185 @@ def create_qsip_data(
         column_mapping
     )
 
+    if (taxonomy is None) != (collapse_level is None):
+        error_msg = (
+            'A taxonomy and a collapse level must be provided together in '
+            'order to collapse the feature table.'
+        )
+        raise ValueError(error_msg)
+
+    # reconcile ids before anything expensive happens; only the sample ids of
+    # a BIOM file are read at this point
+    if isinstance(table, BIOMV210Format):
+        table_sample_ids = _biom_sample_ids(str(table))
+    else:
+        table_sample_ids = pd.Index(table.ids('sample'))
+
+    sample_ids, source_ids = _reconcile_ids(
+        table_sample_ids,
+        sample_metadata.get_column('source_mat_id').to_series(),
+        pd.Index(source_metadata.ids),
+        ignore_extra_table_samples=subset_samples,
+        auto_subset=auto_subset,
+    )
+    if len(sample_ids) < sample_metadata.id_count:
+        sample_metadata = sample_metadata.filter_ids(sample_ids)
+    if len(source_ids) < source_metadata.id_count:
+        source_metadata = source_metadata.filter_ids(source_ids)
+
+    if isinstance(table, BIOMV210Format) and subset_samples:
+        table = _read_biom_samples(str(table), list(sample_ids))
+    else:
+        if isinstance(table, BIOMV210Format):
+            table = biom.load_table(str(table))
+
+        if len(table.ids('sample')) > len(sample_ids):
+            table = table.filter(
+                list(sample_ids), axis='sample', inplace=False
+            )
+            if subset_samples:
+                table.remove_empty(axis='observation', inplace=True)
+
+    if collapse_level is not None:
+        table = _collapse_table(table, taxonomy, collapse_level)
+
     # convert to dataframes
-    sample_df = sample_metadata.to_dataframe()
+    with _trace('Metadata.to_dataframe'):
+        sample_df = sample_metadata.to_dataframe()
+        source_df = source_metadata.to_dataframe()
+
     sample_index_name = sample_df.index.name
     sample_df.reset_index(inplace=True)
 
-    source_df = source_metadata.to_dataframe()
     source_index_name = source_df.index.name
     source_df.reset_index(inplace=True)
 
-    table_df = table.to_dataframe(dense=True)
-    table_df.index.name = 'ASV'
-    table_df.reset_index(inplace=True)
+    # the table is only expanded to the wide layout expected by qSIP2 here,
+    # at the R boundary
+    table_df = CompactFeatureTable.from_biom(table).to_wide_dataframe('ASV')
 
-    # construct qsip object
-    with (ro.default_converter + pandas2ri.converter).context():
-        R_source_obj = qsip2.qsip_source_data(
-            source_df, source_mat_id=source_index_name
-        )
-        R_sample_obj = qsip2.qsip_sample_data(
-            sample_df, sample_id=sample_index_name,
-        )
-        R_feature_obj = qsip2.qsip_feature_data(
-           table_df, feature_id='ASV'
-        )
-        R_qsip_obj = qsip2.qsip_data(
-            source_data=R_source_obj,
-            sample_data=R_sample_obj,
-            feature_data=R_feature_obj
+    # construct qsip object, converting the dataframes to R
+    converted_nbytes = (
+        _nbytes(source_df) + _nbytes(sample_df) + _nbytes(table_df)
+    )
+    with _trace('R: Constructing qsip_data', converted_nbytes):
+        with (ro.default_converter + pandas2ri.converter).context():
+            R_source_obj = qsip2.qsip_source_data(
+                source_df, source_mat_id=source_index_name
+            )
+            R_sample_obj = qsip2.qsip_sample_data(
+                sample_df, sample_id=sample_index_name,
+            )
+            R_feature_obj = qsip2.qsip_feature_data(
+               table_df, feature_id='ASV'
+            )
+            R_qsip_obj = qsip2.qsip_data(
+                source_data=R_source_obj,
+                sample_data=R_sample_obj,
+                feature_data=R_feature_obj
+            )
+
+    if precompute_tube_abundances:
+        sample_amounts = sample_df.set_index(sample_index_name).loc[
+            table.ids('sample'), 'gradient_pos_amt'
+        ]
+        R_qsip_obj = _attach_tube_abundances(
+            R_qsip_obj,
+            _tube_abundances(table.matrix_data, sample_amounts),
+            pd.Index(table.ids('observation')),
+            pd.Index(table.ids('sample')),
         )
 
     return R_qsip_obj
 
 
+@_traced()
+@_r_profiled
+def merge_qsip_data(qsip_data: RS4) -> RS4:
+    '''
+    Merges several unfiltered "qsip_data" objects, e.g. those created from
+    different sequencing runs, into one. Sources, samples, and features are
+    unioned. A source may be shared between inputs as long as its metadata
+    agree, but each sample must belong to exactly one input.
+
+    The already-ingested feature data are joined on the R side, so they are
+    not converted back to pandas or re-read from a feature table.
+
+    Parameters
+    ----------
+    qsip_data : list[RS4]
+        The "qsip_data" objects to merge.
+
+    Returns
+    -------
+    RS4
+        The merged "qsip_data" object.
+
+    Raises
+    ------
+    ValueError
+        If a sample is present in more than one input, or if a shared source
+        has conflicting metadata.
+    '''
+    source_dfs = [
+        _property_to_dataframe(obj, 'source_data', 'data') for obj in qsip_data
+    ]
+    sample_dfs = [
+        _property_to_dataframe(obj, 'sample_data', 'data') for obj in qsip_data
+    ]
+
+    sample_ids = pd.concat([df['sample_id'] for df in sample_dfs])
+    duplicated_ids = sample_ids[sample_ids.duplicated()].unique()
+    if len(duplicated_ids):
+        error_msg = (
+            'The following sample ids are present in more than one of the '
+            f'qSIP2 data being merged: {", ".join(map(str, duplicated_ids))}. '
+            'Each sample (fraction) must belong to exactly one input.'
+        )
+        raise ValueError(error_msg)
+
+    source_df = _merge_metadata(source_dfs, 'source_mat_id', 'source')
+    sample_df = _merge_metadata(sample_dfs, 'sample_id', 'sample')
+
+    feature_dfs = ro.r['list'](*[
+        _get_property(obj, 'feature_data', 'data') for obj in qsip_data
+    ])
+    merged_feature_df = _merge_feature_data_R(feature_dfs)
+
+    return _build_qsip_object(source_df, sample_df, merged_feature_df)
+
+
+def detect_density_outliers(
+    qsip_data: QSIP2DataMetadataView, sensitivity: float = 4.0
+) -> qiime2.Metadata:
+    '''
+    Detects per-sample density outliers by fitting a linear model of density
+    on gradient position for each source and calculating Cook's distances.
+    This performs the same outlier detection as the `plot_density_outliers`
+    visualizer without rendering a plot.
+
+    Parameters
+    ----------
+    qsip_data : QSIP2DataMetadataView
+        The source- and sample-level data of the "qsip_data" object.
+    sensitivity : float
+        Scales the Cook's distance threshold above which a sample is
+        considered an outlier. The threshold is `sensitivity` divided by the
+        number of samples in the source.
+
+    Returns
+    -------
+    qiime2.Metadata
+        A per-sample table of fitted densities, Cook's distances, and outlier
+        calls.
+    '''
+    return qiime2.Metadata(
+        _density_outliers(qsip_data.sample_data, sensitivity)
+    )
+
+
+@_traced()
+@_r_profiled
 def subset_and_filter(
     qsip_data: RS4,
     unlabeled_sources: list[str],
@@ -162,7 +382,11 @@ def subset_and_filter(
     unlabeled_sources_vector = ro.vectors.StrVector(unlabeled_sources)
     labeled_sources_vector = ro.vectors.StrVector(labeled_sources)
 
-    filtered_qsip_data = qsip2.run_feature_filter(
+    filtered_qsip_data = _run_as_single_chunk(
+        'Filtering features',
+        _property_nrow(qsip_data, 'feature_data', 'data'),
+        1,
+        qsip2.run_feature_filter,
         qsip_data,
         unlabeled_source_mat_ids=unlabeled_sources_vector,
         labeled_source_mat_ids=labeled_sources_vector,
@@ -175,10 +399,22 @@ def subset_and_filter(
     return filtered_qsip_data
 
 
+@_traced()
+@_r_profiled
 def resample_and_calculate_EAF(
     filtered_qsip_data: RS4,
     resamples: int = 1000,
     random_seed: int = 1,
+    deduplicate: bool = False,
+    block_size: Optional[int] = None,
+    max_memory: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    feature_ids: Optional[list[str]] = None,
+    feature_metadata: Optional[qiime2.Metadata] = None,
+    feature_metadata_where: Optional[str] = None,
+    seeding: str = 'run',
+    shard_index: int = 0,
+    shard_count: int = 1,
 ) -> RS4:
     '''
     Reseample and calculate excess atom fraction (EAF) for each feature.
@@ -191,13 +427,379 @@ def resample_and_calculate_EAF(
         The number of bootstrap resamplings to perform.
     random_seed : int
         The random seed to use during resampling. Exposed for reproducibility.
+    deduplicate : bool
+        Whether to resample and calculate EAF only once for each group of
+        features with identical weighted average density profiles, and copy
+        the results to the rest of the group. Features in a group then share
+        the same bootstrap replicates.
+    block_size : int or None
+        Features are processed in blocks of this size, by default
+        `DEFAULT_BLOCK_SIZE`, each seeded independently from `random_seed`.
+        Progress is reported after every block, and Ctrl-C stops the run
+        cleanly once the current block completes.
+    max_memory : str or None
+        If given, e.g. '4G', the block size is chosen automatically so that
+        the estimated peak memory of each block, which grows with the number
+        of features, sources, and resamples, stays under this budget once
+        the memory held by the filtered data itself is accounted for. The
+        estimates and the chosen block size are logged. With 'run' seeding
+        each block is seeded by its position, so the bootstrap replicates
+        (and the EAF values) depend on the block size chosen, and hence on
+        this budget; use 'feature' seeding for results that do not depend on
+        the budget. Can not be combined with `block_size`.
+    checkpoint_dir : str or None
+        A directory in which to persist each completed block. Rerunning with
+        the same inputs and parameters resumes from the completed blocks and
+        gives results identical to an uninterrupted run.
+    feature_ids : list[str] or None
+        If given, only these features are resampled and have EAF calculated.
+    feature_metadata : qiime2.Metadata or None
+        If given, only the features in this metadata (and in `feature_ids`,
+        if also given) are resampled and have EAF calculated.
+    feature_metadata_where : str or None
+        A SQLite WHERE clause restricting the features taken from
+        `feature_metadata`.
+    seeding : str
+        With 'run', one seed is used per block of features (and shard), so
+        each feature's replicates depend on the other features resampled,
+        and on the block size and number of shards.
+        With 'feature', each feature's replicates are drawn from a random
+        stream keyed by `random_seed` and its id through a counter-based
+        generator (see `_feature_rng_state`), so a subset of features, in any
+        order, blocks, or shards, gives exactly the results those features
+        get in a full run. Each feature is then resampled and has EAF
+        calculated by its own qSIP2 calls, whose fixed overhead is paid once
+        per feature rather than once per run or block, so 'feature' seeding
+        is markedly slower for many features (see the 'feature-seeded'
+        engine of `compare_engines`).
+    shard_index : int
+        The zero-based position of the shard of the selected features to
+        resample, see `shard_count`.
+    shard_count : int
+        The number of contiguous, near-equal shards the selected features
+        are split into, in the order of the filtered WAD data. Only the
+        features of shard `shard_index` are resampled, so that shards can be
+        resampled independently and combined with `merge_eaf_shards`. With
+        'run' seeding each shard is seeded from `random_seed` and its
+        position (see `_shard_seed`), so merged results are reproducible for
+        a given number of shards; with 'feature' seeding they do not depend
+        on the number of shards at all. A shard past the number of features
+        is returned with empty filtered data, resamples, and EAF tables.
+
+    Raises
+    ------
+    ValueError
+        If both `block_size` and `max_memory` are given, if the feature
+        selection or shard is invalid, or if a sharded run is deduplicated.
     '''
-    resampled_qsip_data = qsip2.run_resampling(
-        filtered_qsip_data,
+    if block_size is not None and max_memory is not None:
+        error_msg = (
+            'A block size and a memory budget can not be provided together, '
+            'as the block size is derived from the memory budget.'
+        )
+        raise ValueError(error_msg)
+
+    if deduplicate and shard_count > 1:
+        error_msg = (
+            'Sharded runs can not be deduplicated: each shard would pick its '
+            'own representative for a group of identical features split '
+            'across shards, so results would depend on the number of shards.'
+        )
+        raise ValueError(error_msg)
+
+    available_ids = pd.Index(
+        _property_to_dataframe(filtered_qsip_data, 'filtered_wad_data')[
+            'feature_id'
+        ]
+    )
+    selected_ids = _select_features(
+        available_ids,
+        feature_ids,
+        feature_metadata,
+        feature_metadata_where,
+    )
+    if shard_count > 1 or shard_index > 0:
+        if selected_ids is not None:
+            available_ids = available_ids[available_ids.isin(selected_ids)]
+        selected_ids = _shard_features(
+            available_ids, shard_index, shard_count
+        )
+        if selected_ids.empty and not available_ids.empty:
+            return _empty_shard(filtered_qsip_data, resamples, random_seed)
+        if seeding == 'run':
+            random_seed = _shard_seed(random_seed, shard_index, shard_count)
+    if selected_ids is not None:
+        filtered_qsip_data = _subset_features(filtered_qsip_data, selected_ids)
+
+    if deduplicate:
+        representatives = _deduplicated_features(filtered_qsip_data)
+        qsip_data_to_resample = _subset_features(
+            filtered_qsip_data, representatives.unique()
+        )
+    else:
+        qsip_data_to_resample = filtered_qsip_data
+
+    if max_memory is not None:
+        block_size = _memory_block_size(
+            qsip_data_to_resample, resamples, _parse_memory(max_memory)
+        )
+        if seeding == 'run':
+            logger.warning(
+                'With "run" seeding the bootstrap replicates depend on the '
+                'block size, which was derived from the memory budget. Use '
+                '"feature" seeding for results that do not depend on the '
+                'budget.'
+            )
+
+    if block_size is None:
+        block_size = DEFAULT_BLOCK_SIZE
+
+    eaf_qsip_data = _resample_in_blocks(
+        qsip_data_to_resample,
         resamples=resamples,
-        with_seed=random_seed
+        random_seed=random_seed,
+        block_size=block_size,
+        checkpoint_dir=checkpoint_dir,
+        seeding=seeding,
     )
 
-    eaf_qsip_data = qsip2.run_EAF_calculations(resampled_qsip_data)
+    if deduplicate:
+        eaf_qsip_data = _expand_features(
+            filtered_qsip_data, eaf_qsip_data, representatives
+        )
 
     return eaf_qsip_data
+
+
+@_traced()
+@_r_profiled
+def merge_eaf_shards(eaf_qsip_data: RS4) -> RS4:
+    '''
+    Merges EAF-calculated qSIP2 data that were resampled separately for
+    disjoint subsets (shards) of the features of one filtered object, e.g.
+    with the `shard_index` and `shard_count` parameters of
+    `resample_and_calculate_EAF`. Shards without features are skipped.
+
+    Parameters
+    ----------
+    eaf_qsip_data : list[RS4]
+        The EAF-calculated "qsip_data" objects of each shard.
+
+    Returns
+    -------
+    RS4
+        The EAF-calculated "qsip_data" object holding every shard's features.
+
+    Raises
+    ------
+    ValueError
+        If a feature is present in more than one shard, or if the shards
+        were not resampled from the same filtered object.
+    '''
+    return _merge_shards(eaf_qsip_data)
+
+
+def run_comparisons(
+    ctx,
+    qsip_data,
+    comparisons,
+    resamples=1000,
+    random_seed=1,
+    shards=1,
+):
+    '''
+    Runs `subset_and_filter` followed by `resample_and_calculate_EAF` for
+    every comparison in `comparisons`. Every action is called independently,
+    so under QIIME 2's parallel configuration the comparisons, and the
+    shards of each comparison's features, run concurrently.
+
+    Parameters
+    ----------
+    ctx : qiime2.sdk.Context
+        The pipeline context.
+    qsip_data : Artifact
+        The unfiltered qSIP2 data.
+    comparisons : qiime2.Metadata
+        One row per comparison, with 'unlabeled_sources' and
+        'labeled_sources' columns of comma-separated source ids and optional
+        parameter columns (see `_parse_comparisons`).
+    resamples : int
+        The number of bootstrap resamplings, unless a comparison sets its
+        own.
+    random_seed : int
+        The random seed, unless a comparison sets its own.
+    shards : int
+        The number of independent resampling actions each comparison's
+        features are split across. Sharded comparisons can not be
+        deduplicated. With the default 'run' seeding each shard gets its own
+        seed, so results are reproducible for a given number of shards;
+        comparisons that set 'feature' seeding get results that do not
+        depend on the number of shards, at the per-feature cost described
+        in `resample_and_calculate_EAF`.
+
+    Returns
+    -------
+    dict[str, Artifact]
+        The EAF-calculated qSIP2 data of each comparison, keyed by comparison
+        id.
+
+    Raises
+    ------
+    ValueError
+        If a comparison is sharded but requests deduplication.
+    '''
+    subset_and_filter = ctx.get_action('qsip2', 'subset_and_filter')
+    resample_and_calculate_EAF = ctx.get_action(
+        'qsip2', 'resample_and_calculate_EAF'
+    )
+    merge_eaf_shards = ctx.get_action('qsip2', 'merge_eaf_shards')
+
+    parsed_comparisons = _parse_comparisons(comparisons.to_dataframe())
+
+    # every filter is started before any of their results are needed
+    filtered_qsip_data = {
+        comparison.comparison_id: subset_and_filter(
+            qsip_data,
+            unlabeled_sources=comparison.unlabeled_sources,
+            labeled_sources=comparison.labeled_sources,
+            **comparison.filter_parameters,
+        ).filtered_qsip_data
+        for comparison in parsed_comparisons
+    }
+
+    eaf_qsip_data = {}
+    for comparison in parsed_comparisons:
+        comparison_id = comparison.comparison_id
+        eaf_parameters = {
+            'resamples': resamples,
+            'random_seed': random_seed,
+            **comparison.eaf_parameters,
+        }
+
+        if shards == 1:
+            eaf_qsip_data[comparison_id], = resample_and_calculate_EAF(
+                filtered_qsip_data[comparison_id], **eaf_parameters
+            )
+            continue
+
+        if eaf_parameters.get('deduplicate'):
+            error_msg = (
+                f'Comparison "{comparison_id}" requests deduplication, but '
+                'sharded comparisons can not be deduplicated, as a group of '
+                'identical features split across shards would get a '
+                'different representative in each shard.'
+            )
+            raise ValueError(error_msg)
+
+        # each shard selects its own features, so shards are scheduled
+        # without waiting for the filtered data
+        eaf_shards = [
+            resample_and_calculate_EAF(
+                filtered_qsip_data[comparison_id],
+                shard_index=shard_index,
+                shard_count=shards,
+                **eaf_parameters,
+            ).eaf_qsip_data
+            for shard_index in range(shards)
+        ]
+        eaf_qsip_data[comparison_id], = merge_eaf_shards(eaf_shards)
+
+    return eaf_qsip_data
+
+
+@_traced()
+@_r_profiled
+def calculate_growth(
+    eaf_qsip_data: RS4,
+    time_zero_table: biom.Table,
+    timepoint: float,
+    growth_model: str = 'exponential',
+    label_proportion: float = 1.0,
+    total_abundance_column: str = 'total_abundance',
+    labeled_sources: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    '''
+    Calculates birth, death, and net growth rates for every feature from its
+    excess atom fraction (EAF) and its abundance at time zero and at the end
+    of the incubation. The observed EAF values and every bootstrap replicate
+    are calculated together in one vectorised pass.
+
+    Parameters
+    ----------
+    eaf_qsip_data : RS4
+        The EAF-calculated "qsip_data" object.
+    time_zero_table : biom.Table
+        The absolute abundance (e.g. copies per gram) of each feature in the
+        time-zero samples. A feature's time-zero abundance is its mean across
+        these samples.
+    timepoint : float
+        The length of the incubation, in the time unit the rates should be
+        expressed in.
+    growth_model : str
+        Either 'exponential', for per-capita rates, or 'linear', for
+        absolute rates.
+    label_proportion : float
+        The EAF of a copy built entirely from the labeled substrate, i.e. the
+        proportion of its atoms that can come from the label.
+    total_abundance_column : str
+        The source-level data column holding each source's total absolute
+        abundance, used to convert relative abundances at the end of the
+        incubation into absolute abundances.
+    labeled_sources : list[str] or None
+        The ids of the labeled sources, whose abundances are averaged at the
+        end of the incubation. If None, the retained sources labeled with
+        13C, 15N, or 18O according to the source-level data are used.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per feature and replicate, with 'feature_id', 'resample',
+        'EAF', 'N_total_i0', 'N_total_it', 'N_light_it', 'birth_rate',
+        'death_rate', and 'net_growth_rate' columns. Replicate 0 holds the
+        rates calculated from the observed EAF values.
+
+    Raises
+    ------
+    ValueError
+        If the source-level data lack `total_abundance_column`, if any of
+        `labeled_sources` was not retained, or if none of the retained
+        sources are labeled.
+    '''
+    source_df = _property_to_dataframe(eaf_qsip_data, 'source_data', 'data')
+    if total_abundance_column not in source_df.columns:
+        error_msg = (
+            f'The column "{total_abundance_column}" was not found in the '
+            'source-level data. The total abundance of each source is '
+            'needed to calculate growth rates.'
+        )
+        raise ValueError(error_msg)
+
+    retained_sources = _property_to_dataframe(
+        eaf_qsip_data, 'filtered_wad_data'
+    ).columns.drop('feature_id')
+    labeled_source_df = _labeled_sources(
+        source_df, retained_sources, labeled_sources
+    )
+
+    feature_ids, eaf = _eaf_matrix(
+        _property_to_dataframe(eaf_qsip_data, 'EAF')
+    )
+
+    n_total_it = _labeled_abundances(
+        *_get_tube_abundances(eaf_qsip_data),
+        _property_to_dataframe(eaf_qsip_data, 'sample_data', 'data'),
+        labeled_source_df,
+        total_abundance_column,
+    ).reindex(feature_ids, fill_value=0).to_numpy()
+
+    time_zero = pd.Series(
+        time_zero_table.matrix_data.mean(axis=1).A1,
+        index=time_zero_table.ids('observation'),
+    )
+    n_total_i0 = time_zero.reindex(feature_ids, fill_value=0).to_numpy()
+
+    rates = _growth_rates(
+        eaf, n_total_i0, n_total_it, timepoint, growth_model, label_proportion
+    )
+
+    return _growth_table(feature_ids, eaf, n_total_i0, n_total_it, rates)
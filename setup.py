@@ -26,10 +26,16 @@ setup(
         "qiime2.plugins": [
             "q2_qsip2="
             "q2_qsip2"
-            ".plugin_setup:plugin"]
+            ".plugin_setup:plugin"],
+        "console_scripts": [
+            "qsip2-compare=q2_qsip2._comparisons:main"
+        ],
     },
     package_data={
-        "q2_qsip2": ["citations.bib", "assets/index.html"],
+        "q2_qsip2": [
+            "citations.bib", "assets/index.html", "assets/table.html",
+            "assets/report.html"
+        ],
         "q2_qsip2.tests": ["data/*"],
     },
     zip_safe=False,